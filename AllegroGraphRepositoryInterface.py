@@ -1,18 +1,25 @@
 import logging
+import os
 import pickle
 import shutil
-import sys
 import warnings
-from typing import List, Callable, Dict, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import List, Callable, Dict, Iterable, Iterator, Set, Tuple
 import networkx as nx
 
-from franz.openrdf.connect import ag_connect
 from franz.openrdf.model import Literal, Statement, Value
 from franz.openrdf.model import URI
 from franz.openrdf.repository.repositoryconnection import RepositoryConnection
 from franz.openrdf.vocabulary import RDF, RDFS, OWL
 
+from EquivalentClasses import EquivalentClasses
+from Instrumentation import Statistics
+from Journal import Journal
+from CompactMOPs import CompactMOPs
 from MOPs import MOPs
+from StatementCache import SQLiteStatementCache, LRUStatementCache, LabelCache, QueryResultCache
+from TripleStore import ONCLASS, TripleStore, AllegroGraphStore
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -24,6 +31,87 @@ class InstanceAndSuperClassesException(Warning):
     pass
 
 
+# Passed to a mopification frame that has no child result to receive yet
+PENDING = object()
+
+
+class MopFrame:
+    """
+    Mopification work left for a node that has been added as a mop: its parents and slot fillers still have to be
+    mopified, in order, before their abstractions and slots can be added
+    """
+    __slots__ = ("node", "mop_label", "parents", "slots", "equivalent_class", "depth", "index", "role_label")
+
+    def __init__(self, node: Value, mop_label: str, parents: List[Value], slots: List[Tuple[Value, Value]],
+                 equivalent_class: Value, depth: int):
+        self.node = node
+        self.mop_label = mop_label
+        self.parents = parents
+        self.slots = slots
+        self.equivalent_class = equivalent_class
+        self.depth = depth
+        self.index = 0
+        self.role_label = None
+
+    def next_child(self, interface, value) -> Tuple[Value, int] or None:
+        """
+        :param interface: The mopifying interface
+        :param value: Result of mopifying the previous child or PENDING if no child has been mopified yet
+        :return: The next child to mopify and its depth, or None if the node is done
+        """
+        number_of_parents = len(self.parents)
+        if value is not PENDING:
+            if self.index <= number_of_parents:
+                interface.mops.add_abstraction(self.equivalent_class, value)
+            else:
+                interface.mops.add_slot(self.equivalent_class, self.slots[self.index - number_of_parents - 1][0],
+                                        self.role_label, value)
+
+        i = self.index
+        self.index += 1
+        if i < number_of_parents:
+            return self.parents[i], self.depth + 1
+        elif i - number_of_parents < len(self.slots):
+            role, filler = self.slots[i - number_of_parents]
+            self.role_label = interface.get_label(role)
+            return filler, self.depth + 1
+
+    def finish(self, interface) -> Value:
+        interface.log.debug("\t" * self.depth + "< " + self.mop_label)
+        return self.equivalent_class
+
+
+class ListFrame:
+    """
+    Mopification work left for an RDF list: the remaining cells' first elements still have to be mopified
+    """
+    __slots__ = ("node", "depth", "rest", "items")
+
+    def __init__(self, node: Value, depth: int):
+        self.node = node
+        self.depth = depth
+        self.rest = None
+        self.items = []
+
+    def next_child(self, interface, value) -> Tuple[Value, int] or None:
+        if value is not PENDING:
+            self.items.append(value)
+            if self.rest is None or self.rest == RDF.NIL:
+                return None
+            self.node = self.rest
+            self.depth += 1
+
+        first = interface.get_object(s=self.node, p=RDF.FIRST)
+        self.rest = interface.get_object(s=self.node, p=RDF.REST)
+        if first is not None:
+            return first, self.depth + 1
+        else:
+            interface.log.warning("\t" * self.depth + "List has no first: %s" % self.node)
+
+    def finish(self, interface) -> List[Value]:
+        return self.items
+
+
 class Interface:
     log = logging.getLogger('Interface')
 
@@ -35,35 +123,71 @@ class Interface:
     RELEASE = "RELEASE"
     INSTANCE_RELEASE = "INSTANCE_RELEASE"
 
-    ONCLASS = None
+    ONCLASS = ONCLASS
 
-    def __init__(self, credentials_file: str, max_depth=1000, cache_dir=None):
+    # Bounds on the in-memory statement cache
+    statement_cache_entries = 100000
+    statement_cache_statements = 2000000
+
+    def __init__(self, credentials_file: str or None, max_depth=1000, cache_dir=None, store: TripleStore = None,
+                 connections: int = 1, compact_mops: bool = False):
         """
         :param credentials_file: File containing the settings for accessing KaBOB
-        :param max_depth: Maximum depth to mopify to. Maximum value is the systems set recursion limit
+        :param max_depth: Maximum depth to mopify trivial nodes to
         :param cache_dir: Directory to save results to. Some methods cache results as they go
+        :param store: Triple store to read from instead of connecting to the AllegroGraph server in credentials_file
+        :param connections: Number of connections to open and of batched requests to run concurrently
+        :param compact_mops: Store mops in interned, array-backed CompactMOPs instead of networkx graphs
         :return: Self
         """
         self.NOT_A_SLOT = [RDF.TYPE, RDFS.SUBCLASSOF, RDFS.LABEL, OWL.EQUIVALENTCLASS]
         self.credentials_file = credentials_file
-        self.mops = MOPs()
+        self.mops: MOPs or CompactMOPs = CompactMOPs() if compact_mops else MOPs()
 
+        self.store: TripleStore = store
         self.conn: RepositoryConnection = None
-        self.max_depth = min(max_depth, sys.getrecursionlimit())
-        self.equivalent_classes: Dict[Value, Set(Value)] = dict()
+        self.connections = max(1, connections)
+        self.executor: ThreadPoolExecutor = None
+        self.max_depth = max_depth
+        self.equivalent_classes = EquivalentClasses()
+
+        self.restrictions: Dict[Value, Tuple[Value, Value]] = dict()
+        # Whether restrictions holds every restriction in the store, so that nodes missing from it aren't restrictions
+        self.restrictions_complete = False
 
         self.cache_dir = cache_dir
-        self.cached_statements = {}
+        self.cached_statements = LRUStatementCache(max_entries=self.statement_cache_entries,
+                                                   max_statements=self.statement_cache_statements)
+        self.labels = LabelCache("%s/labels.sqlite" % self.cache_dir if self.cache_dir else None)
+        self.query_results = QueryResultCache("%s/query_results.sqlite" % self.cache_dir if self.cache_dir else None)
+        # KaBOB release the store holds. Results cached for one release aren't reused for another
+        self.release: str = None
+        # Round trips and cache lookups
+        self.stats = Statistics()
+
+        # Additions since the last snapshot and the last node committed to them
+        self.journal: Journal = None
+        self.last_commit: Tuple[int, Value] = None
 
         # Attempt to load cached statements and mops
         if self.cache_dir:
+            # Statements are looked up in the persistent cache on demand instead of being read in all at once
+            self.cached_statements.backing = SQLiteStatementCache("%s/statements.sqlite" % self.cache_dir)
+            if self.cached_statements.backing.is_empty():
+                self.import_pickled_statements()
+
             try:
-                print("Reading cached statements")
-                self.cached_statements = pickle.load(open("%s/statements.pickle" % self.cache_dir, "rb"))
-                self.equivalent_classes: Dict = pickle.load(open("%s/equivalent_classes.pickle" % self.cache_dir, "rb"))
+                self.equivalent_classes = EquivalentClasses.from_dict(
+                    pickle.load(open("%s/equivalent_classes.pickle" % self.cache_dir, "rb")))
 
                 print("Reading cached mops")
-                self.mops: MOPs = pickle.load(open("%s/mops.pickle" % self.cache_dir, "rb"))
+                mops = pickle.load(open("%s/mops.pickle" % self.cache_dir, "rb"))
+                # Snapshots taken by a session with the other storage are converted to the one asked for
+                if compact_mops and not isinstance(mops, CompactMOPs):
+                    mops = CompactMOPs.from_mops(mops)
+                elif not compact_mops and isinstance(mops, CompactMOPs):
+                    mops = mops.to_mops()
+                self.mops = mops
                 print()
                 # abstractions: nx.DiGraph = pickle.load(open("%s/abstractions.pickle" % self.cache_dir, "rb"))
                 # self.mops.abstractions.add_nodes_from(abstractions.nodes(data=True))
@@ -75,6 +199,136 @@ class Interface:
             except FileNotFoundError:
                 pass
 
+            self.open_journal()
+
+    def open_journal(self) -> None:
+        """
+        Bring the mops and equivalent classes from the last snapshot up to the last commit in the journal, then record
+        further additions to it
+        :return: None
+        """
+        try:
+            with open("%s/checkpoint.pickle" % self.cache_dir, "rb") as f:
+                self.last_commit = pickle.load(f)
+        except FileNotFoundError:
+            pass
+
+        self.journal = Journal("%s/journal.pickle" % self.cache_dir)
+        last_commit = self.journal.replay({"mops": self.mops, "equivalent_classes": self.equivalent_classes})
+        if last_commit is not None:
+            self.log.debug("Replayed journal up to node %d" % last_commit[0])
+            self.last_commit = last_commit
+
+        self.mops.journal = self.journal.recorder("mops")
+        self.equivalent_classes.journal = self.journal.recorder("equivalent_classes")
+
+    def save_snapshot(self, copy_number: int = None) -> None:
+        """
+        Compact the journal into snapshots of the mops and equivalent classes
+        :param copy_number: If set, the mops snapshot is also copied to mops_<copy_number>.pickle
+        :return: None
+        """
+        self.log.debug("Caching results")
+        self.dump_atomically(self.mops, "%s/mops.pickle" % self.cache_dir)
+        self.dump_atomically(self.equivalent_classes.to_dict(), "%s/equivalent_classes.pickle" % self.cache_dir)
+        self.dump_atomically(self.last_commit, "%s/checkpoint.pickle" % self.cache_dir)
+        if self.journal is not None:
+            self.journal.truncate()
+
+        if copy_number is not None:
+            shutil.copyfile("%s/mops.pickle" % self.cache_dir, "%s/mops_%d.pickle" % (self.cache_dir, copy_number))
+
+    @staticmethod
+    def dump_atomically(obj, path: str) -> None:
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(obj, f)
+        os.replace(path + ".tmp", path)
+
+    def commit(self, index: int, node: Value) -> None:
+        """
+        Mark node, at index in the input list, as fully mopified
+        :return: None
+        """
+        self.last_commit = (index, node)
+        if self.journal is not None:
+            self.journal.commit(index, node)
+
+    def skip_committed(self, nodes: Iterator[Value]) -> Tuple[Iterator[Value], int]:
+        """
+        :param nodes: Nodes about to be mopified
+        :return: The nodes after the last committed node and the position of the first of them. If the last commit
+        wasn't for these nodes, all of the nodes and 0
+        """
+        if self.last_commit is None:
+            return nodes, 0
+
+        index, node = self.last_commit
+        skipped = list(islice(nodes, index + 1))
+        if len(skipped) == index + 1 and skipped[-1] == node:
+            return nodes, index + 1
+        self.log.warning("Last committed node %s isn't at position %d. Starting from the beginning" % (node, index))
+        return chain(skipped, nodes), 0
+
+    def load_restriction_index(self, restrictions: Dict[Value, Tuple[Value, Value]] = None) -> None:
+        """
+        Collect every owl:Restriction with one bulk query so that check_restriction doesn't need a round trip for each
+        superclass. The index is saved in the cache directory and reused by later sessions.
+        :param restrictions: A complete index collected by another interface, to use instead of querying
+        :return: None
+        """
+        if restrictions is None and self.restrictions_complete:
+            return
+        if restrictions is None:
+            self.log.debug("Collecting all restrictions")
+            with self.stats.timer("get_restrictions") as call:
+                restrictions = self.store.get_restrictions()
+                call.statements = len(restrictions)
+        self.restrictions = restrictions
+        self.restrictions_complete = True
+        self.save_release_cache("restrictions.pickle", self.restrictions)
+
+    def load_release_cache(self, name: str):
+        """
+        Read an object saved with save_release_cache
+        :param name: File name in the cache directory
+        :return: The object, or None if it wasn't saved for the current KaBOB release
+        """
+        if not self.cache_dir or self.release is None:
+            return None
+        try:
+            with open("%s/%s" % (self.cache_dir, name), "rb") as f:
+                cached = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        if not isinstance(cached, tuple) or len(cached) != 2 or cached[0] != self.release:
+            self.log.warning("Ignoring %s since it wasn't saved for release %s" % (name, self.release))
+            return None
+        return cached[1]
+
+    def save_release_cache(self, name: str, obj) -> None:
+        """
+        Save obj in the cache directory along with the KaBOB release it was read from. Nothing is saved if the release
+        isn't known, since there would be no telling whether it is still current.
+        :param name: File name in the cache directory
+        :param obj: Object to pickle
+        :return: None
+        """
+        if self.cache_dir and self.release is not None:
+            self.dump_atomically((self.release, obj), "%s/%s" % (self.cache_dir, name))
+
+    def import_pickled_statements(self) -> None:
+        """
+        Move statements cached by older versions in statements.pickle into the statement cache
+        :return: None
+        """
+        try:
+            with open("%s/statements.pickle" % self.cache_dir, "rb") as f:
+                self.log.info("Importing cached statements")
+                self.cached_statements.backing.update(pickle.load(f))
+                self.cached_statements.commit()
+        except FileNotFoundError:
+            pass
+
     def __enter__(self):
         """
         Called when initialized using a "with" statement. Loads cached items if available, and opens a connection to
@@ -99,45 +353,61 @@ class Interface:
         return credentials
 
     def connect_to_repository(self):
-        credentials = self.get_credentials()
-
-        # Open connection to KaBOB using provided credentials
-        self.log.debug("Connecting to repository --" +
-                       "host:'%s' port:%s" % (credentials[self.HOST], credentials[self.PORT]))
-        self.conn = ag_connect(credentials[self.RELEASE],
-                               host=credentials[self.HOST],
-                               port=int(credentials[self.PORT]),
-                               user=credentials[self.USER],
-                               password=credentials[self.PASSWORD],
-                               create=False,
-                               clear=False)
+        if self.store is None:
+            credentials = self.get_credentials()
+
+            # Open connection to KaBOB using provided credentials
+            self.log.debug("Connecting to repository --" +
+                           "host:'%s' port:%s" % (credentials[self.HOST], credentials[self.PORT]))
+            self.store = AllegroGraphStore.connect(credentials[self.RELEASE],
+                                                   host=credentials[self.HOST],
+                                                   port=int(credentials[self.PORT]),
+                                                   user=credentials[self.USER],
+                                                   password=credentials[self.PASSWORD],
+                                                   pool_size=self.connections)
+        self.conn = getattr(self.store, "conn", None)
+        self.store.stats = self.stats
+        self.release = self.store.release
+
+        self.load_release_caches()
 
         self.initialize_namespaces()
         self.initialize_relations()
         self.initialize_nodes()
 
+    def load_release_caches(self) -> None:
+        """
+        Load the caches that are only valid for the KaBOB release they were read from, once the release is known
+        :return: None
+        """
+        self.labels.set_release(self.release)
+        restrictions = self.load_release_cache("restrictions.pickle")
+        if restrictions is not None:
+            self.restrictions = restrictions
+            self.restrictions_complete = True
+
     def initialize_namespaces(self):
         pass
 
     def initialize_relations(self):
-        self.ONCLASS = self.conn.createURI(namespace=OWL.NAMESPACE, localname="onClass")
         pass
 
     def initialize_nodes(self):
         pass
 
     def close(self):
-        self.conn.close()
+        if self.executor:
+            self.executor.shutdown()
+        self.store.close()
 
         self.log.debug("Closed KaBOB")
 
+        self.cached_statements.close()
+        self.labels.close()
+        self.query_results.close()
         if self.cache_dir:
-            pickle.dump(self.cached_statements,
-                        open("%s/statements.pickle" % self.cache_dir, "wb"))
-            pickle.dump(self.equivalent_classes,
-                        open("%s/equivalent_classes.pickle" % self.cache_dir, "wb"))
-            pickle.dump(self.mops,
-                        open("%s/mops.pickle" % self.cache_dir, "wb"))
+            self.save_snapshot()
+            self.journal.close()
 
     def __exit__(self, t, value, traceback):
         """
@@ -160,9 +430,6 @@ class Interface:
         :param max_depth:
         :return: None
         """
-        if max_depth > sys.getrecursionlimit():
-            self.log.warning("Can't set max depth deeper than the system's maximum recursion limit."
-                             "Please increase system's maximum recursion depth first (sys.setrecursionlimit(n))")
         self.max_depth = max_depth
 
     """
@@ -184,68 +451,193 @@ class Interface:
     MOPIFICATION
     """
 
-    def mopify_and_cache(self, nodes: List[str or URI], cache_every_iter: int = None, number_of_nodes_to_mopify=None,
-                         separate_caches: bool = False):
+    def mopify_and_cache(self, nodes: Iterable[Value], cache_every_iter: int = None, number_of_nodes_to_mopify=None,
+                         separate_caches: bool = False, batch_size: int = None, report_every_iter: int = None):
         """
-        Begin mopifying and caching results. Results are cached after each mop in mops has finished mopifying
-        :param cache_every_iter:
+        Begin mopifying and caching results. Results are journaled and committed after each node has finished
+        mopifying, and a run over the same nodes resumes after the last committed node.
+        :param cache_every_iter: Number of nodes between snapshots. If None, a snapshot is only saved at the end
         :param separate_caches: Specify whether cached mops should be saved separately
-        :param nodes: List of nodes to mopify
-        :param number_of_nodes_to_mopify: Number of nodes in mops to mopify
+        :param nodes: Nodes to mopify. May be an iterator, such as one streaming nodes from KaBOB, which is consumed as
+        mopification goes
+        :param number_of_nodes_to_mopify: Position in nodes to stop mopifying at
+        :param batch_size: If set, statements for this many nodes are prefetched level by level before they are mopified.
+        Defaults to the store's batch size when the interface has more than one connection
+        :param report_every_iter: Number of nodes between logged summaries of the interface's statistics. Defaults to
+        cache_every_iter. A summary is also logged at the end
         :return: None
         """
-        if self.cache_dir:
-            count = 0
-            for node in nodes:
-                self.log.debug("**************************** Mopify %d ****************************" % count)
-                if node not in self.mops.abstractions:
-                    self.mopify(node, depth=0)
+        report_every_iter = report_every_iter or cache_every_iter
+        if batch_size is None and self.connections > 1:
+            batch_size = self.store.statement_batch_size
 
+        if self.cache_dir:
+            nodes, count = self.skip_committed(iter(nodes))
+            if count:
+                self.log.debug("Resuming from node %d" % count)
+            if number_of_nodes_to_mopify is not None:
+                nodes = islice(nodes, max(0, number_of_nodes_to_mopify - count))
+
+            for batch in self.iterate_batches(nodes, batch_size or 1):
+                if batch_size:
+                    self.prefetch_statements(batch)
+                for node in batch:
+                    self.log.debug("**************************** Mopify %d ****************************" % count)
+                    if node not in self.mops:
+                        self.mopify(node, depth=0)
+                    self.commit(count, node)
+
+                    count += 1
                     if cache_every_iter and count % cache_every_iter == 0:
-                        self.log.debug("Caching results")
-                        pickle.dump(self.mops, open("%s/mops.pickle" % self.cache_dir, "wb"))
-                        if separate_caches:
-                            shutil.copyfile("%s/mops.pickle" % self.cache_dir,
-                                            "%s/mops_%d.pickle" % (self.cache_dir, count))
-
-                count += 1
-                if count > number_of_nodes_to_mopify:
-                    break
+                        self.save_snapshot(count if separate_caches else None)
+                    if report_every_iter and count % report_every_iter == 0:
+                        self.log.info("Statistics after %d nodes:\n%s" % (count, self.stats.summary()))
             if not cache_every_iter:
-                self.log.debug("Caching results")
-                pickle.dump(self.mops, open("%s/mops.pickle" % self.cache_dir, "wb"))
-                if separate_caches:
-                    shutil.copyfile("%s/mops.pickle" % self.cache_dir,
-                                    "%s/mops_%d.pickle" % (self.cache_dir, count))
+                self.save_snapshot(count if separate_caches else None)
+            self.log.info("Statistics after %d nodes:\n%s" % (count, self.stats.summary()))
 
         else:
             self.log.warning("Cache directory not set")
 
+    @staticmethod
+    def iterate_batches(nodes: Iterable[Value], batch_size: int) -> Iterator[List[Value]]:
+        nodes = iter(nodes)
+        batch = list(islice(nodes, batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(nodes, batch_size))
+
+    def mopify_batched(self, nodes: List[Value]) -> List[Value or List[Value]]:
+        """
+        Mopify nodes after prefetching, one level at a time, all of the statements mopification will need. Each level is
+        fetched concurrently over the interface's connections, while the mops themselves are built on this thread.
+        :param nodes: KaBOB nodes to mopify
+        :return: The result of mopifying each node
+        """
+        self.prefetch_statements(nodes)
+        return [self.mopify(node, depth=0) for node in nodes]
+
+    def prefetch_statements(self, nodes: List[Value]) -> None:
+        """
+        Expand the mopification frontier breadth first, fetching the statements of every unvisited node in a level with
+        batched queries instead of one round trip per node. The statements are cached so that mopify can be run
+        afterwards without touching the server for the nodes that were reached.
+        :param nodes: Nodes that are about to be mopified
+        :return: None
+        """
+        visited: Set[Value] = set()
+        frontier = list(nodes)
+        depth = 0
+        while frontier:
+            frontier = [node for node in dict.fromkeys(frontier) if node not in visited]
+            visited.update(frontier)
+            self.log.debug("Prefetching level %d (%d nodes)" % (depth, len(frontier)))
+            self.get_statements_for_subjects(frontier)
+
+            next_frontier = []
+            superclasses = []
+            for node in frontier:
+                if node not in self.mops:
+                    children, node_superclasses = self.get_mopify_dependencies(node)
+                    next_frontier.extend(children)
+                    superclasses.extend(node_superclasses)
+
+            # Superclasses have to be fetched before the next level to learn whether they are restrictions
+            self.get_statements_for_subjects([superclass for superclass in superclasses
+                                              if superclass not in self.restrictions])
+            for superclass in superclasses:
+                is_restriction, restriction_property, restriction_value = self.check_restriction(superclass)
+                if is_restriction:
+                    next_frontier.extend(value for value in (restriction_property, restriction_value) if value)
+                else:
+                    next_frontier.append(superclass)
+
+            frontier = next_frontier
+            depth += 1
+
+    def get_mopify_dependencies(self, node: Value) -> Tuple[List[Value], List[Value]]:
+        """
+        Find the nodes whose statements will be read when node is mopified. Mirrors parse_statements.
+        :param node: A node with cached statements
+        :return: Nodes that will be mopified or labelled, and superclasses that will be checked for restrictions
+        """
+        is_trivial = self.is_node_trivial(node)
+        children: List[Value] = list()
+        superclasses: List[Value] = list()
+        node_type = None
+
+        for statement in self.get_statements(node):
+            o = statement.getObject()
+            p = statement.getPredicate()
+
+            if p == RDF.TYPE:
+                node_type = o
+            if not is_trivial:
+                if p == RDFS.SUBCLASSOF:
+                    superclasses.append(o)
+                elif p not in self.NOT_A_SLOT:
+                    children.extend((p, o))
+            elif p in (RDF.FIRST, RDF.REST):
+                # Trivial nodes are only expanded when they are RDF lists
+                children.append(o)
+
+        if self.is_instance(node, node_type):
+            children.append(node_type)
+
+        return children, superclasses
+
     def mopify(self, node: str or Value, depth: int = 0) -> Value or List[Value]:
         """
-        Convert node to a mop and mopify its parents if it is a Bio World node
+        Convert node to a mop and mopify its parents if it is a Bio World node. Nodes are mopified depth first using an
+        explicit stack of frames rather than recursion, so there is no limit on how deep the mopification can go.
         :param node: A KaBOB node to mopify
         :param depth: Current mopification depth
         :return:
         """
+        stack: List[MopFrame or ListFrame] = list()
+        return self.run_mopify_stack(stack, self.start_mopify(node, depth, stack))
 
-        # Convert node to URI
+    def run_mopify_stack(self, stack: List[MopFrame or ListFrame], value) -> Value or List[Value]:
+        """
+        Work through the mopification stack until it is empty
+        :param stack: Frames still being mopified
+        :param value: Result of the last finished mopification or PENDING if the top frame was just pushed
+        :return: Result of mopifying the bottom frame
+        """
+        while stack:
+            frame = stack[-1]
+            child = frame.next_child(self, value)
+            if child is None:
+                stack.pop()
+                value = frame.finish(self)
+            else:
+                value = self.start_mopify(child[0], child[1], stack)
+        return value
 
-        if node in self.mops.abstractions:  # No need to mopify if it has already been mopified
+    def start_mopify(self, node: Value, depth: int, stack: List[MopFrame or ListFrame]) -> Value or List[Value]:
+        """
+        Begin mopifying node. If the node still has parents, slots or list elements to mopify, a frame for them is
+        pushed onto the stack.
+        :param node: A KaBOB node to mopify
+        :param depth: Current mopification depth
+        :param stack: Frames still being mopified
+        :return: The mopified node or PENDING if a frame was pushed
+        """
+        if node in self.mops:  # No need to mopify if it has already been mopified
             return node
-        else:
-            is_trivial = self.is_node_trivial(node)
-            if is_trivial:
-                self.log.warning("\t" * depth + "Trivial mopification of non-BIO-world node %s" % node)
-            mop_label, parents, slots, node_type, equivalent_class = self.parse_statements(node, is_trivial)
 
-            if node_type == RDF.LIST:
-                return self.get_list_from_rdf(node, depth)
+        is_trivial = self.is_node_trivial(node)
+        if is_trivial:
+            self.log.warning("\t" * depth + "Trivial mopification of non-BIO-world node %s" % node)
+        mop_label, parents, slots, node_type, equivalent_class = self.parse_statements(node, is_trivial)
 
+        if node_type == RDF.LIST:
+            stack.append(ListFrame(node, depth))
+        else:
             self.log.debug("\t" * depth + "> " + mop_label)
-            self.create_kabob_mop(node, mop_label, parents, slots, node_type, equivalent_class, depth, is_trivial)
-            self.log.debug("\t" * depth + "< " + mop_label)
-            return equivalent_class
+            stack.append(self.create_kabob_mop(node, mop_label, parents, slots, node_type, equivalent_class, depth,
+                                               is_trivial))
+        return PENDING
 
     def create_kabob_mop(self,
                          node: URI or Literal,
@@ -255,9 +647,9 @@ class Interface:
                          node_type: Value,
                          equivalent_class: Value,
                          depth: int,
-                         is_trivial: bool = False) -> None:
+                         is_trivial: bool = False) -> MopFrame:
         """
-        Adds the node to KaBOB's mops and mopifies its slots and parents if it is not a trivial node
+        Adds the node to KaBOB's mops. Its slots and parents are left to be mopified if it is not a trivial node
         :param node: Node to be added as a mop
         :param mop_label: Label for the mop
         :param parents: Parents of the node
@@ -266,7 +658,7 @@ class Interface:
         :param equivalent_class: The equivalent class of the node
         :param depth:
         :param is_trivial:
-        :return:
+        :return: Frame holding the parents and slots left to mopify
         """
 
         if parents and self.is_instance(node, node_type):
@@ -275,18 +667,11 @@ class Interface:
         self.mops.add_frame(node, label=mop_label)
 
         if not is_trivial or depth < self.max_depth:
-            # if equivalent_class == node:
-            #     [self.mops.add_equivalent_frame(node, self.mopify(equivalent, depth=depth + 1))
-            #      for equivalent in self.equivalent_classes[equivalent_class] if equivalent != node]
-            # else:
-            #     self.mops.add_equivalent_frame(node, equivalent_class)
-
-            [self.mops.add_abstraction(equivalent_class,
-                                       self.mopify(parent, depth=depth + 1)) for parent in parents]
-            [self.mops.add_slot(equivalent_class,
-                                role,
-                                self.get_label(role),
-                                self.mopify(filler, depth=depth + 1)) for role, filler in slots]
+            # Label all of the roles at once rather than one query per slot
+            self.get_labels([role for role, _ in slots])
+            return MopFrame(node, mop_label, parents, slots, equivalent_class, depth)
+        else:
+            return MopFrame(node, mop_label, [], [], equivalent_class, depth)
 
     def parse_statements(self, node: Value, is_trivial: bool) -> Tuple[
         str, List[Value], List[Tuple[Value, Value]], Value, Value]:
@@ -299,7 +684,6 @@ class Interface:
         parents: List[Value] = list()
         slots: List[Tuple[Value, Value]] = list()
         labels: List[str] = list()
-        equivalent_class = None
         node_type = None
 
         node_statements = self.get_statements(node)
@@ -326,28 +710,12 @@ class Interface:
                 labels.append(str(o.getLabel()))
 
             elif p == OWL.EQUIVALENTCLASS:
-                if not equivalent_class:
-                    for key, classes in self.equivalent_classes.items():
-                        if o in classes:
-                            equivalent_class = key
-                            classes.add(node)
-                            break
-                        if node in classes:
-                            equivalent_class = key
-                            classes.add(o)
-                            break
-                    if not equivalent_class:
-                        self.equivalent_classes[node] = {node}
-                        equivalent_class = node
-                else:
-                    self.equivalent_classes[equivalent_class].add(o)
+                self.equivalent_classes.union(node, o)
 
             elif p == RDF.TYPE:
                 node_type = o
 
-        if not equivalent_class:
-            self.equivalent_classes[node] = {node}
-            equivalent_class = node
+        equivalent_class = self.equivalent_classes.add(node)
 
         if self.is_instance(node, node_type):
             mop_label: str = self.get_instance_node_label(node, labels)
@@ -357,6 +725,21 @@ class Interface:
         return mop_label, parents, slots, node_type, equivalent_class
 
     def check_restriction(self, o):
+        """
+        Check whether o is an owl:Restriction, consulting the restriction index before asking the store. Once the whole
+        index has been loaded, nodes missing from it aren't restrictions
+        :param o: A superclass
+        :return: Whether o is a restriction, the restriction's property and its someValuesFrom or onClass value
+        """
+        restriction = self.restrictions.get(o)
+        if restriction is not None:
+            self.stats.record_cache("restrictions", hits=1)
+            return (True,) + restriction
+        if self.restrictions_complete:
+            self.stats.record_cache("restrictions", hits=1)
+            return False, None, None
+        self.stats.record_cache("restrictions", misses=1)
+
         parent_statements = self.get_statements(o)
         is_restriction = False
         restriction_property = None
@@ -392,15 +775,48 @@ class Interface:
         return "%s - " % self.get_label(self.get_node_type(node), labels)
 
     def get_label(self, node: URI or Literal, labels: List = None) -> str:
+        """
+        Get a readable label for node. Labels looked up for a node are remembered, and persisted if there is a cache
+        directory.
+        :param node: The node
+        :param labels: The node's rdfs:labels if they are already known
+        :return: The node's label
+        """
+        if labels:
+            return self.resolve_label(node, labels)
+
+        label = self.labels.get(node)
+        self.stats.record_cache("labels", hits=label is not None, misses=label is None)
+        if label is None:
+            label = self.resolve_label(node, [str(o.getLabel()) for o in self.get_objects(node, RDFS.LABEL)])
+            self.labels[node] = label
+        return label
+
+    def get_labels(self, nodes: List[Value]) -> Dict[Value, str]:
+        """
+        Get labels for many nodes, looking up the rdfs:labels of all unlabelled nodes whose statements aren't cached in
+        one batch
+        :param nodes: The nodes
+        :return: Labels keyed by node
+        """
+        unlabelled = [node for node in dict.fromkeys(nodes) if node not in self.labels]
+        uncached = [node for node in unlabelled if node not in self.cached_statements]
+        if uncached:
+            with self.stats.timer("get_labels_for_subjects", "s??") as call:
+                subject_labels = self.store.get_labels_for_subjects(uncached)
+                call.statements = sum(len(labels) for labels in subject_labels.values())
+            for node, labels in subject_labels.items():
+                self.labels[node] = self.resolve_label(node, labels)
+
+        return {node: self.get_label(node) for node in nodes}
+
+    def resolve_label(self, node: URI or Literal, labels: List[str]) -> str:
         local_name = node
         if isinstance(node, URI):
             local_name = node.getLocalName()
         elif isinstance(node, Literal):
             local_name = node.getLabel()
 
-        if not labels:
-            labels = [str(o.getLabel()) for o in self.get_objects(node, RDFS.LABEL)]
-
         def find_lowercase_label(_labels):
             for label in _labels:
                 if label.islower():
@@ -417,6 +833,11 @@ class Interface:
                         return "subclass of " + self.get_label(parent)
             return label
 
+    def iterate_objects(self, s: Value or None, p: URI or None, page_size: int = None,
+                        offset: int = 0) -> Iterator[URI or Literal]:
+        return (statement.getObject() for statement in self.iterate_statements(s=s, p=p, page_size=page_size,
+                                                                                offset=offset))
+
     def get_objects(self, s: Value or None, p: URI or None) -> List[URI or Literal]:
         statements = self.get_statements(s=s, p=p)
         return [] if not statements else [statement.getObject() for statement in statements]
@@ -434,31 +855,66 @@ class Interface:
         return subjects[0] if subjects else None
 
     def get_statements(self, s: Value = None, p: URI = None, o: Value = None) -> List[Statement]:
-        statements = None
-        if s and not p and not o:
-            statements = self.cached_statements.get(s)
-        if not statements:
-            with self.conn.getStatements(subject=s, predicate=p, object=o) as statements:
-                statements = statements.asList()
-                if s and not p and not o:
-                    self.cached_statements[s] = statements
+        statements = self.cached_statements.get(s, p, o)
+        self.stats.record_cache("statements", hits=statements is not None, misses=statements is None)
+        if statements is None:
+            with self.stats.timer("get_statements", self.stats.get_pattern(s, p, o)) as call:
+                statements = self.store.get_statements(s=s, p=p, o=o)
+                call.statements = len(statements)
+            self.cached_statements.put(s, p, o, statements)
         return statements
 
+    def iterate_statements(self, s: Value = None, p: URI = None, o: Value = None,
+                           page_size: int = None, offset: int = 0) -> Iterator[Statement]:
+        """
+        Stream the statements matching a pattern from the store a page at a time. Unlike get_statements, the results are
+        not cached, so patterns matching millions of statements can be consumed in bounded memory.
+        :param page_size: Number of statements to fetch at a time. Defaults to the store's page size
+        :param offset: Number of matching statements to skip
+        :return: The statements
+        """
+        statements = self.cached_statements.get(s, p, o)
+        if statements is not None:
+            return iter(statements[offset:])
+        return self.store.iterate_statements(s=s, p=p, o=o, page_size=page_size, offset=offset)
+
+    def get_statements_for_subjects(self, subjects: List[Value]) -> None:
+        """
+        Fetch and cache the statements for many subjects at once. Subjects that are already cached are skipped. With more
+        than one connection, the subjects are split into chunks that are fetched concurrently. Only the calling thread
+        writes to the cache.
+        :param subjects: Subjects to fetch statements for
+        :return: None
+        """
+        subjects = list(dict.fromkeys(subjects))
+        uncached = [subject for subject in subjects if subject not in self.cached_statements]
+        self.stats.record_cache("statements", hits=len(subjects) - len(uncached), misses=len(uncached))
+        chunk_size = max(1, min(self.store.statement_batch_size, -(-len(uncached) // self.connections)))
+        chunks = [uncached[i:i + chunk_size] for i in range(0, len(uncached), chunk_size)]
+
+        if len(chunks) > 1 and self.connections > 1:
+            for statements in self.get_executor().map(self.fetch_statements_for_subjects, chunks):
+                self.cached_statements.update(statements)
+        else:
+            for chunk in chunks:
+                self.cached_statements.update(self.fetch_statements_for_subjects(chunk))
+
+    def fetch_statements_for_subjects(self, subjects: List[Value]) -> Dict[Value, List[Statement]]:
+        with self.stats.timer("get_statements_for_subjects", "s??") as call:
+            statements = self.store.get_statements_for_subjects(subjects)
+            call.statements = sum(len(subject_statements) for subject_statements in statements.values())
+        return statements
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="kabob")
+        return self.executor
+
     def get_node_type(self, node: Value) -> URI or Literal:
         return self.get_object(s=node, p=RDF.TYPE)
 
     def get_list_from_rdf(self, node: URI or Literal, depth: int) -> List[URI or Literal]:
-        first = self.get_object(s=node, p=RDF.FIRST)
-        rest = self.get_object(s=node, p=RDF.REST)
-
-        if first:
-            if rest.getURI() == RDF.NIL:
-                return [self.mopify(first, depth=depth + 1)]
-            else:
-                return [self.mopify(first, depth=depth + 1)] + self.get_list_from_rdf(rest, depth + 1)
-        else:
-            self.log.warning("\t" * depth + "List has no first: %s" % node)
-            return []
+        return self.run_mopify_stack([ListFrame(node, depth)], PENDING)
 
     def get_equivalent_classes(self, node: Value) -> List[Value]:
         return self.get_objects(s=node, p=OWL.EQUIVALENTCLASS)
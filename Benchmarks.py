@@ -0,0 +1,125 @@
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from franz.openrdf.vocabulary import RDFS
+
+from Collapsing import Collapser
+from CompactMOPs import CompactMOPs
+from KaBOBInterface import KaBOBInterface
+from MOPs import MOPs
+from SyntheticKaBOB import SyntheticKaBOB
+from Walker import Automata, EdgeWalker
+
+TAXON = "only_in_taxon"
+ROLES = ["part_of", "has_participant", "located_in"]
+
+
+def benchmark_mops(mops_class=MOPs, number_of_frames: int = 100000, block_size: int = 10000) -> List[Tuple[int, float]]:
+    """
+    Time the MOPs calls made while mopifying, block by block as the graph grows. Every frame gets a label, abstractions
+    to two earlier frames, one slot per role and a special attribute slot, as bio world frames do.
+    :param mops_class: MOPs or CompactMOPs
+    :param number_of_frames: Number of frames to add
+    :param block_size: Number of frames to add between measurements
+    :return: Number of frames added so far and frames added per second for each block
+    """
+    mops = mops_class()
+    mops.add_special_node_attribute(TAXON, "taxon")
+    mops.add_frame("taxon", label="taxon")
+
+    throughputs = []
+    start = time.perf_counter()
+    for frame in range(number_of_frames):
+        mops.add_frame(frame, label="frame %d" % frame)
+        for abstraction in {frame // 2, frame // 3} - {frame}:
+            mops.add_abstraction(frame, abstraction)
+        for i, role in enumerate(ROLES):
+            mops.add_slot(frame, role, role, (frame * (i + 7)) % (frame + 1))
+        mops.add_slot(frame, TAXON, "only in taxon", "taxon")
+        mops.is_mop(frame)
+        mops.get_frame_label(frame)
+
+        if (frame + 1) % block_size == 0:
+            end = time.perf_counter()
+            throughputs.append((frame + 1, block_size / (end - start)))
+            start = end
+
+    return throughputs
+
+
+def benchmark_kabob(kabob: SyntheticKaBOB = None, number_of_nodes: int = None,
+                    number_of_walks: int = 100) -> Dict[str, Tuple[int, float]]:
+    """
+    Time the main KaBOBInterface operations against a LocalTripleStore loaded with a synthetic KaBOB, so regressions show
+    up without a server
+    :param kabob: Generator of the synthetic KaBOB. Defaults to SyntheticKaBOB()
+    :param number_of_nodes: Number of classes to mopify. Defaults to all of them
+    :param number_of_walks: Number of walks over the mopified slots
+    :return: Number of operations and seconds taken for each benchmark, in the order they were run
+    """
+    kabob = kabob or SyntheticKaBOB()
+    classes = kabob.get_classes()[:number_of_nodes]
+    timings: Dict[str, Tuple[int, float]] = dict()
+
+    start = time.perf_counter()
+    store = kabob.to_store()
+    timings["generate"] = store.size, time.perf_counter() - start
+
+    # Adding the subclass axioms of the synthetic KaBOB, other than restrictions, to an empty MOPs
+    mops = MOPs()
+    restrictions = store.get_restrictions()
+    abstractions = [(s, o) for s, p, o in kabob.generate() if p == RDFS.SUBCLASSOF and o not in restrictions]
+    start = time.perf_counter()
+    for frame, abstraction in abstractions:
+        mops.add_frame(frame)
+        mops.add_frame(abstraction)
+        mops.add_abstraction(frame, abstraction)
+    timings["add_abstraction"] = len(abstractions), time.perf_counter() - start
+
+    with KaBOBInterface(None, store=store) as interface:
+        start = time.perf_counter()
+        for node in classes:
+            interface.mopify(node)
+        timings["mopify"] = len(classes), time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(kabob.drugs):
+            interface.get_drug_targets(kabob.get_drugbank_id(i))
+        timings["get_drug_targets"] = kabob.drugs, time.perf_counter() - start
+
+        start = time.perf_counter()
+        interface.get_all_drug_targets()
+        timings["get_all_drug_targets"] = 1, time.perf_counter() - start
+
+        start = time.perf_counter()
+        Collapser(interface.mops, classes[:10], all_specializations=True)
+        timings["Collapser"] = 1, time.perf_counter() - start
+
+        # Walks along any sequence of slots to the first ten classes
+        labels = {label for _, _, label in interface.mops.slots.edges(data=interface.mops.attribute_label) if label}
+        automaton = Automata(None, labels, [])
+        for label in labels:
+            for next_label in labels:
+                automaton.add_transition(label, next_label)
+        walker = EdgeWalker(interface.mops.slots, automaton, interface.mops.attribute_label, classes[:10])
+        sources = [node for node in classes if node in interface.mops.slots][:number_of_walks]
+        start = time.perf_counter()
+        for source in sources:
+            walker.walk(source)
+        timings["Walker.walk"] = len(sources), time.perf_counter() - start
+
+    return timings
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    block = max(1, frames // 10)
+    for benchmarked_class in (MOPs, CompactMOPs):
+        print(benchmarked_class.__name__)
+        for frames_added, throughput in benchmark_mops(benchmarked_class, frames, block):
+            print("%10d frames: %10.0f frames/s" % (frames_added, throughput))
+
+    print("KaBOBInterface")
+    for name, (operations, seconds) in benchmark_kabob(SyntheticKaBOB(classes=max(1, frames // 10))).items():
+        print("%20s: %10d in %8.3f s, %10.0f/s" % (name, operations, seconds, operations / seconds if seconds else 0))
@@ -1,26 +1,101 @@
+from collections import deque
+from typing import Dict, FrozenSet, Hashable, List, Set
+
 import networkx as nx
 
+from CompactMOPs import CompactMOPs
+
 
 class Collapser:
+    """
+    Collapses the slot graph of a MOPs onto frames of interest. Each frame to collapse on is merged with its
+    specializations into one node and every other frame is kept as a node of its own. The collapsed graph has the same
+    form as one made by nx.quotient_graph: nodes are frozensets of frames labeled like the frame collapsed on, and there
+    is an edge for each pair of frames with slots between them, holding those slots keyed by role. Building it takes
+    time linear in the size of the slot graph. CompactMOPs are converted to MOPs first, since the collapsed graph keeps
+    the slot graph's networkx edge data.
+    """
 
-    def __init__(self, mops, node_to_collapse_on):
-        self.mops = mops
-        self.node_to_collapse_on = node_to_collapse_on
-        self.collapsed_graph = nx.quotient_graph(mops.slots, self.is_neighbor, node_data=self.label_nodes)
+    def __init__(self, mops, node_to_collapse_on, all_specializations: bool = False):
+        """
+        :param mops: The MOPs or CompactMOPs
+        :param node_to_collapse_on: Frame or list of frames to collapse on. A frame that specializes several of them is
+        collapsed onto the first
+        :param all_specializations: Collapse on all specializations of the frames rather than only the direct ones
+        """
+        self.mops = mops.to_mops() if isinstance(mops, CompactMOPs) else mops
+        self.nodes_to_collapse_on: List[Hashable] = list(node_to_collapse_on) \
+            if isinstance(node_to_collapse_on, (list, tuple)) else [node_to_collapse_on]
+        self.node_to_collapse_on = self.nodes_to_collapse_on[0]
+        self.all_specializations = all_specializations
 
-    def is_neighbor(self, u, v):
-        return (u in self.mops.abstractions.predecessors(
-            self.node_to_collapse_on) or u == self.node_to_collapse_on) and v in self.mops.abstractions.predecessors(
-            self.node_to_collapse_on)
+        # Frame that each collapsed block is collapsed on
+        self.collapsed_on: Dict[FrozenSet[Hashable], Hashable] = dict()
+        self.blocks: Dict[Hashable, FrozenSet[Hashable]] = self.make_blocks()
+        self.collapsed_graph = self.collapse()
 
-    def label_nodes(self, B):
-        label = None
-        for u in B:
-            label = {self.mops.attribute_label: self.mops.get_frame_label(u)}
-            if u == self.node_to_collapse_on:
-                return label
+    def get_specializations(self, frame) -> Set[Hashable]:
+        """
+        :return: The frames directly below frame or, with all_specializations, every frame below it
+        """
+        abstractions = self.mops.abstractions
+        if frame not in abstractions:
+            return set()
+        if not self.all_specializations:
+            return set(abstractions.predecessors(frame))
+
+        specializations = set()
+        queue = deque([frame])
+        while queue:
+            for specialization in abstractions.predecessors(queue.popleft()):
+                if specialization not in specializations and specialization != frame:
+                    specializations.add(specialization)
+                    queue.append(specialization)
+        return specializations
+
+    def make_blocks(self) -> Dict[Hashable, FrozenSet[Hashable]]:
+        """
+        :return: The block of each frame in the slot graph
+        """
+        slots = self.mops.slots
+        collapsed_on: Dict[Hashable, Hashable] = {node: node for node in self.nodes_to_collapse_on}
+        for node in self.nodes_to_collapse_on:
+            for specialization in self.get_specializations(node):
+                collapsed_on.setdefault(specialization, node)
+
+        members: Dict[Hashable, Set[Hashable]] = dict()
+        for frame, node in collapsed_on.items():
+            if frame in slots:
+                members.setdefault(node, set()).add(frame)
 
-        return label
+        blocks = {frame: frozenset([frame]) for frame in slots if frame not in collapsed_on}
+        for node, block_members in members.items():
+            block = frozenset(block_members)
+            self.collapsed_on[block] = node
+            blocks.update((frame, block) for frame in block)
+        return blocks
+
+    def collapse(self) -> nx.MultiDiGraph:
+        """
+        :return: The slot graph with each block of frames as a single node
+        """
+        collapsed_graph = nx.MultiDiGraph()
+        for block in set(self.blocks.values()):
+            collapsed_graph.add_node(block, **self.label_nodes(block))
+
+        for u, neighbors in self.mops.slots.adjacency():
+            for v, roles in neighbors.items():
+                if self.blocks[u] != self.blocks[v]:
+                    key = collapsed_graph.add_edge(self.blocks[u], self.blocks[v])
+                    collapsed_graph.edges[self.blocks[u], self.blocks[v], key].update(roles)
+
+        return collapsed_graph
+
+    def label_nodes(self, B):
+        frame = self.collapsed_on.get(B)
+        if frame is None:
+            frame = next(iter(B))
+        return {self.mops.attribute_label: self.mops.get_frame_label(frame)}
 
     def get_collapsed_edge_labels(self, G):
         labels = dict()
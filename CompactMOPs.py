@@ -0,0 +1,500 @@
+import logging
+from array import array
+from typing import Callable, Dict, Hashable, Iterator, List, Set, Tuple
+
+import networkx as nx
+
+from MOPs import MOPs, AbstractionException
+
+# Marks the end of an adjacency chain
+NO_EDGE = -1
+
+
+class CompactMOPs:
+    """
+    MOPs kept in compact, array-backed storage. Frames, fillers and roles are interned to integer IDs and labels to
+    string IDs. Abstractions and slots are edge lists in typed arrays, with per-node chains of outgoing and incoming
+    edges linking them together so that neighbours can be found without a dict per node. Unlike MOPs, no transitive
+    closure of the abstractions is kept: whether one frame is an abstraction of another is found by searching the
+    frame's ancestors, which are few next to the whole hierarchy. It has the same interface as MOPs and can be converted
+    to one for drawing or any other networkx processing.
+    """
+    log = logging.getLogger("CompactMOPs")
+
+    type_mop = MOPs.type_mop
+    type_instance = MOPs.type_instance
+
+    attribute_label = MOPs.attribute_label
+    attribute_frame_type = MOPs.attribute_frame_type
+    attribute_filler = MOPs.attribute_filler
+
+    # Codes for the frame types in frame_types. Nodes that are only slot fillers are not frames.
+    frame_type_codes = {type_mop: 0, type_instance: 1}
+    not_a_frame = 127
+
+    # Records additions when set. See Journal.recorder
+    journal: Callable = None
+
+    def __init__(self):
+        # Interned nodes
+        self.node_ids: Dict[Hashable, int] = dict()
+        self.nodes: List[Hashable] = list()
+
+        # Interned labels. String 0 stands for no label.
+        self.string_ids: Dict[str, int] = {None: 0}
+        self.strings: List[str or None] = [None]
+
+        # Per node arrays indexed by node ID
+        self.frame_types = array('b')
+        self.labels = array('l')
+        self.first_abstraction = array('l')
+        self.first_specialization = array('l')
+        self.first_slot = array('l')
+
+        # Abstraction edges from specializations to abstractions
+        self.abstraction_sources = array('l')
+        self.abstraction_targets = array('l')
+        self.next_abstraction = array('l')
+        self.next_specialization = array('l')
+
+        # Slot edges from frames to fillers
+        self.slot_sources = array('l')
+        self.slot_targets = array('l')
+        self.slot_roles = array('l')
+        self.slot_labels = array('l')
+        self.next_slot = array('l')
+        # Slot edge of each frame, filler and role, packed into an int by slot_key
+        self.slot_keys: Dict[int, int] = dict()
+
+        self.lists: Dict[int, list] = dict()
+        self.node_attributes: Dict[str, Dict[int, int]] = dict()
+        self.special_node_attributes = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("journal", None)
+        # Rebuilt from the slot arrays when loaded
+        state.pop("slot_keys", None)
+        return state
+
+    def __setstate__(self, state):
+        state.pop("reachability", None)
+        self.__dict__.update(state)
+        self.slot_keys = {self.slot_key(self.slot_sources[edge], self.slot_targets[edge], self.slot_roles[edge]): edge
+                          for edge in range(len(self.slot_sources))}
+
+    @staticmethod
+    def slot_key(frame_id: int, filler_id: int, role_id: int) -> int:
+        return (frame_id << 64) | (filler_id << 32) | role_id
+
+    '''
+    INTERNING
+    '''
+
+    def intern_node(self, node) -> int:
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.node_ids[node] = node_id
+            self.nodes.append(node)
+            self.frame_types.append(self.not_a_frame)
+            self.labels.append(0)
+            self.first_abstraction.append(NO_EDGE)
+            self.first_specialization.append(NO_EDGE)
+            self.first_slot.append(NO_EDGE)
+        return node_id
+
+    def intern_string(self, string: str or None) -> int:
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.string_ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+    def get_frame_id(self, frame) -> int or None:
+        frame_id = self.node_ids.get(frame)
+        if frame_id is not None and self.frame_types[frame_id] != self.not_a_frame:
+            return frame_id
+
+    '''
+    ADDERS
+    '''
+
+    def add_special_node_attribute(self, role, role_label):
+        if self.journal is not None:
+            self.journal("add_special_node_attribute", role, role_label)
+        self.special_node_attributes[role] = role_label
+
+    def add_frame(self, frame, label: str = None, frame_type: str = type_mop):
+        if self.get_frame_id(frame) is None:
+            if self.journal is not None:
+                self.journal("add_frame", frame, label, frame_type)
+            frame_id = self.intern_node(frame)
+            self.frame_types[frame_id] = self.frame_type_codes[frame_type]
+            self.labels[frame_id] = self.intern_string(label)
+
+    def add_slot(self, frame, role, role_label, filler):
+        if self.journal is not None:
+            self.journal("add_slot", frame, role, role_label, filler)
+        if isinstance(filler, list):
+            list_node = str(frame) + " " + str(role) + " - list"
+            list_id = self.intern_node(list_node)
+            self.labels[list_id] = self.intern_string(list_node)
+            self.lists[list_id] = filler
+            self.add_slot_edge(frame, list_node, role, role_label)
+        else:
+            if role in self.special_node_attributes.keys():
+                filler_label = self.labels[self.node_ids[filler]]
+                frame_id = self.get_frame_id(frame)
+                if frame_id is not None:
+                    self.node_attributes.setdefault(self.special_node_attributes[role], dict())[frame_id] = filler_label
+            else:
+                self.add_slot_edge(frame, filler, role, role_label)
+
+    def add_slot_edge(self, frame, filler, role, role_label):
+        frame_id = self.intern_node(frame)
+        filler_id = self.intern_node(filler)
+        role_id = self.intern_node(role)
+        label_id = self.intern_string(role_label)
+
+        # Like a MultiDiGraph keyed by role, adding the same slot again only updates its label
+        key = self.slot_key(frame_id, filler_id, role_id)
+        edge = self.slot_keys.get(key)
+        if edge is not None:
+            self.slot_labels[edge] = label_id
+            return
+
+        edge = self.slot_keys[key] = len(self.slot_sources)
+        self.slot_sources.append(frame_id)
+        self.slot_targets.append(filler_id)
+        self.slot_roles.append(role_id)
+        self.slot_labels.append(label_id)
+        self.next_slot.append(self.first_slot[frame_id])
+        self.first_slot[frame_id] = edge
+
+    def add_instance(self, label):
+        return self.add_frame(label, frame_type=self.type_instance)
+
+    def add_abstraction(self, frame, abstraction):
+        if not self.is_abstraction(abstraction, frame):
+            try:
+                if self.is_abstraction(frame, abstraction):
+                    raise AbstractionException(self.get_frame_label(frame), self.get_frame_label(abstraction))
+                else:
+                    if self.journal is not None:
+                        self.journal("add_abstraction", frame, abstraction)
+                    self.add_abstraction_edge(self.intern_node(frame), self.intern_node(abstraction))
+            except AbstractionException as ae:
+                self.log.warning(ae.message)
+
+    def add_abstraction_edge(self, frame_id: int, abstraction_id: int):
+        # Endpoints become frames as they would when added to a DiGraph
+        for node_id in (frame_id, abstraction_id):
+            if self.frame_types[node_id] == self.not_a_frame:
+                self.frame_types[node_id] = self.frame_type_codes[self.type_mop]
+
+        edge = len(self.abstraction_sources)
+        self.abstraction_sources.append(frame_id)
+        self.abstraction_targets.append(abstraction_id)
+        self.next_abstraction.append(self.first_abstraction[frame_id])
+        self.next_specialization.append(self.first_specialization[abstraction_id])
+        self.first_abstraction[frame_id] = edge
+        self.first_specialization[abstraction_id] = edge
+
+    '''
+    CHECKERS
+    '''
+
+    def __contains__(self, frame) -> bool:
+        return self.get_frame_id(frame) is not None
+
+    def is_abstraction(self, abstraction, specialization):
+        if abstraction == specialization:
+            return True
+
+        abstraction_id = self.node_ids.get(abstraction)
+        specialization_id = self.node_ids.get(specialization)
+        if abstraction_id is None or specialization_id is None:
+            return False
+        return self.is_reachable(specialization_id, abstraction_id)
+
+    def is_reachable(self, specialization_id: int, abstraction_id: int) -> bool:
+        """
+        :return: Whether abstraction_id is among the ancestors of specialization_id
+        """
+        stack = [specialization_id]
+        visited = {specialization_id}
+        while stack:
+            for ancestor_id in self.get_abstraction_ids(stack.pop()):
+                if ancestor_id == abstraction_id:
+                    return True
+                if ancestor_id not in visited:
+                    visited.add(ancestor_id)
+                    stack.append(ancestor_id)
+        return False
+
+    def is_mop(self, frame):
+        return self.frame_types[self.node_ids[frame]] == self.frame_type_codes[self.type_mop]
+
+    def is_instance(self, frame):
+        return self.frame_types[self.node_ids[frame]] == self.frame_type_codes[self.type_instance]
+
+    def is_strict_abstraction(self, specialization, abstraction):
+        return abstraction is not specialization and self.is_abstraction(abstraction, specialization)
+
+    '''
+    GETTERS
+    '''
+
+    def get_frame_label(self, frame):
+        frame_id = self.get_frame_id(frame)
+        if frame_id is not None:
+            return self.strings[self.labels[frame_id]]
+
+    def get_edge_label(self, u, v):
+        u_id = self.node_ids.get(u)
+        v_id = self.node_ids.get(v)
+        if u_id is not None and v_id is not None:
+            # Slots are chained newest first, so the last match is the first one added
+            role = None
+            for edge in self.get_slot_edges(u_id):
+                if self.slot_targets[edge] == v_id:
+                    role = self.nodes[self.slot_roles[edge]]
+            return role
+
+    def get_abstractions(self, frame) -> List:
+        frame_id = self.node_ids.get(frame)
+        if frame_id is None:
+            return []
+        return [self.nodes[abstraction_id] for abstraction_id in self.get_abstraction_ids(frame_id)]
+
+    def get_specializations(self, frame) -> List:
+        frame_id = self.node_ids.get(frame)
+        if frame_id is None:
+            return []
+        return [self.nodes[specialization_id] for specialization_id in self.get_specialization_ids(frame_id)]
+
+    def get_abstraction_ids(self, frame_id: int) -> Iterator[int]:
+        edge = self.first_abstraction[frame_id]
+        while edge != NO_EDGE:
+            yield self.abstraction_targets[edge]
+            edge = self.next_abstraction[edge]
+
+    def get_specialization_ids(self, frame_id: int) -> Iterator[int]:
+        edge = self.first_specialization[frame_id]
+        while edge != NO_EDGE:
+            yield self.abstraction_sources[edge]
+            edge = self.next_specialization[edge]
+
+    def get_slot_edges(self, frame_id: int) -> Iterator[int]:
+        edge = self.first_slot[frame_id]
+        while edge != NO_EDGE:
+            yield edge
+            edge = self.next_slot[edge]
+
+    def get_frames(self) -> Iterator:
+        return (node for node_id, node in enumerate(self.nodes) if self.frame_types[node_id] != self.not_a_frame)
+
+    def number_of_frames(self) -> int:
+        return sum(1 for frame_type in self.frame_types if frame_type != self.not_a_frame)
+
+    def get_full_graph(self):
+        return self.to_mops().get_full_graph()
+
+    '''
+    CONVERSION
+    '''
+
+    def to_mops(self, node_ids: Set[int] = None) -> MOPs:
+        """
+        :param node_ids: Only convert these nodes and the edges between them. All of them if None
+        :return: The same MOPs stored in networkx graphs
+        """
+        def keep(*ids: int) -> bool:
+            return node_ids is None or all(node_id in node_ids for node_id in ids)
+
+        mops = MOPs()
+        mops.special_node_attributes = dict(self.special_node_attributes)
+
+        for node_id, node, data in self.iterate_frames():
+            if keep(node_id):
+                mops.abstractions.add_node(node, **data)
+
+        for source, target in zip(self.abstraction_sources, self.abstraction_targets):
+            if keep(source, target):
+                mops.abstractions.add_edge(self.nodes[source], self.nodes[target])
+        mops.reachability.rebuild(mops.abstractions)
+
+        for list_id, filler in self.lists.items():
+            if keep(list_id):
+                list_node = self.nodes[list_id]
+                mops.slots.add_node(list_node, label=list_node, list=filler)
+        # Edges are added oldest first so that parallel slots keep the order they were added in
+        for edge in range(len(self.slot_sources)):
+            if keep(self.slot_sources[edge], self.slot_targets[edge]):
+                mops.slots.add_edge(self.nodes[self.slot_sources[edge]], self.nodes[self.slot_targets[edge]],
+                                    key=self.nodes[self.slot_roles[edge]], label=self.strings[self.slot_labels[edge]])
+
+        return mops
+
+    def iterate_frames(self) -> Iterator[Tuple[int, Hashable, Dict]]:
+        """
+        :return: The ID, frame and node attributes of each frame, as a MOPs holds them
+        """
+        type_names = {code: frame_type for frame_type, code in self.frame_type_codes.items()}
+        for node_id, node in enumerate(self.nodes):
+            if self.frame_types[node_id] != self.not_a_frame:
+                data = {self.attribute_label: self.strings[self.labels[node_id]],
+                        self.attribute_frame_type: type_names[self.frame_types[node_id]]}
+                for attribute, values in self.node_attributes.items():
+                    if node_id in values:
+                        data[attribute] = self.strings[values[node_id]]
+                yield node_id, node, data
+
+    def to_ego_mops(self, center, radius: int = 1) -> MOPs:
+        """
+        Convert only the frames near center, without building the rest of the graph. Slots have no chain of incoming
+        edges, so each hop scans the slot edges once.
+        :param center: Frame at the center
+        :param radius: Number of hops from center, along abstractions and slots in either direction
+        :return: The frames within radius hops of center and the edges between them
+        :exception ValueError: If center isn't a frame
+        """
+        center_id = self.node_ids.get(center)
+        if center_id is None:
+            raise ValueError("Unknown frame %s" % center)
+
+        visited = {center_id}
+        frontier = {center_id}
+        for _ in range(radius):
+            neighbors = set()
+            for node_id in frontier:
+                neighbors.update(self.get_abstraction_ids(node_id))
+                neighbors.update(self.get_specialization_ids(node_id))
+                neighbors.update(self.slot_targets[edge] for edge in self.get_slot_edges(node_id))
+            neighbors.update(source for source, target in zip(self.slot_sources, self.slot_targets)
+                             if target in frontier)
+            frontier = neighbors - visited
+            visited.update(frontier)
+        return self.to_mops(visited)
+
+    def get_ego_graph(self, center, radius: int = 1) -> nx.MultiDiGraph:
+        return self.to_ego_mops(center, radius).get_ego_graph(center, radius)
+
+    @classmethod
+    def from_mops(cls, mops: MOPs):
+        """
+        :param mops: MOPs stored in networkx graphs
+        :return: The same MOPs in compact storage
+        """
+        compact_mops = cls()
+        compact_mops.special_node_attributes = dict(mops.special_node_attributes)
+
+        attribute_names = set(mops.special_node_attributes.values())
+        for frame, data in mops.abstractions.nodes(data=True):
+            compact_mops.add_frame(frame, label=data.get(cls.attribute_label),
+                                   frame_type=data.get(cls.attribute_frame_type, cls.type_mop))
+            for attribute in attribute_names.intersection(data):
+                compact_mops.node_attributes.setdefault(attribute, dict())[compact_mops.node_ids[frame]] = \
+                    compact_mops.intern_string(data[attribute])
+
+        for frame, abstraction in mops.abstractions.edges:
+            compact_mops.add_abstraction_edge(compact_mops.node_ids[frame], compact_mops.node_ids[abstraction])
+
+        for node, data in mops.slots.nodes(data=True):
+            if "list" in data:
+                list_id = compact_mops.intern_node(node)
+                compact_mops.labels[list_id] = compact_mops.intern_string(data.get(cls.attribute_label))
+                compact_mops.lists[list_id] = data["list"]
+        for frame, filler, role, data in mops.slots.edges(keys=True, data=True):
+            compact_mops.add_slot_edge(frame, filler, role, data.get(cls.attribute_label))
+
+        return compact_mops
+
+    '''
+    REMOVERS
+    '''
+
+    def clear_frames(self):
+        special_node_attributes = self.special_node_attributes
+        journal = self.journal
+        self.__init__()
+        self.special_node_attributes = special_node_attributes
+        self.journal = journal
+
+    '''
+    EXPORTING
+    '''
+
+    # The writers only read the nodes and edges through iterate_export_nodes and iterate_export_edges, which read the
+    # arrays directly, so exporting doesn't build any networkx graphs
+    export_graph = MOPs.export_graph
+    get_export_node_attributes = MOPs.get_export_node_attributes
+    write_graphml = MOPs.write_graphml
+    write_gexf = MOPs.write_gexf
+    write_gexf_attributes = staticmethod(MOPs.write_gexf_attributes)
+    write_edge_list = MOPs.write_edge_list
+
+    def iterate_export_nodes(self) -> Iterator[Tuple[Hashable, Dict]]:
+        """
+        :return: Frames with their attributes, followed by the slot fillers that aren't frames
+        """
+        for _, frame, data in self.iterate_frames():
+            yield frame, data
+
+        in_slots = bytearray(len(self.nodes))
+        for node_id in self.lists:
+            in_slots[node_id] = 1
+        for source, target in zip(self.slot_sources, self.slot_targets):
+            in_slots[source] = in_slots[target] = 1
+        for node_id, node in enumerate(self.nodes):
+            if in_slots[node_id] and self.frame_types[node_id] == self.not_a_frame:
+                yield node, {self.attribute_label: node, "list": self.lists[node_id]} if node_id in self.lists else {}
+
+    def iterate_export_edges(self) -> Iterator[Tuple[Hashable, Hashable, Dict]]:
+        """
+        :return: Abstraction and slot edges with their type, role and label
+        """
+        for source, target in zip(self.abstraction_sources, self.abstraction_targets):
+            yield self.nodes[source], self.nodes[target], {"type": "abstraction"}
+        for edge in range(len(self.slot_sources)):
+            yield self.nodes[self.slot_sources[edge]], self.nodes[self.slot_targets[edge]], \
+                {"type": "slot", "role": self.nodes[self.slot_roles[edge]],
+                 self.attribute_label: self.strings[self.slot_labels[edge]]}
+
+    '''
+    DRAWING
+    '''
+
+    def draw_mops(self, image_dir: str, layout: Callable = nx.spring_layout, size: float = None, center=None,
+                  radius: int = 1):
+        mops = self.to_mops() if center is None else self.to_ego_mops(center, radius)
+        mops.draw_mops(image_dir, layout=layout, size=size, center=center, radius=radius)
+
+    def draw_graph(self, G: nx.Graph, pos, out_loc: str, size: float = None, node_labels=None, edge_labels=None):
+        if node_labels is None:
+            node_labels = {n: str(self.get_frame_label(n) or n) for n in G if n in self}
+        self.to_mops().draw_graph(G, pos, out_loc, size=size, node_labels=node_labels, edge_labels=edge_labels)
+
+    """
+    Statistics
+    """
+
+    def get_statistics(self):
+        return self.get_frame_statistics(), self.get_role_statistics()
+
+    def get_frame_statistics(self):
+        frame_types = {}
+        type_names = {code: frame_type for frame_type, code in self.frame_type_codes.items()}
+        for code in self.frame_types:
+            if code != self.not_a_frame:
+                frame_types[type_names[code]] = frame_types.get(type_names[code], 0) + 1
+        return frame_types
+
+    def get_role_statistics(self):
+        role_types = {}
+        for label_id in self.slot_labels:
+            role_type = self.strings[label_id]
+            role_types[role_type] = role_types.get(role_type, 0) + 1
+        return role_types
@@ -0,0 +1,132 @@
+from typing import Callable, Dict, Set, Hashable
+
+
+class EquivalentClasses:
+    """
+    Disjoint sets of equivalent classes, kept as a union-find forest with path compression. Every class maps to the
+    canonical class that represents its set. A representative is always a class that was added or unioned as a node
+    itself, never one that was only seen as an equivalent.
+    """
+
+    # Records additions when set. See Journal.recorder
+    journal: Callable = None
+
+    def __init__(self):
+        self.parents: Dict[Hashable, Hashable] = dict()
+
+    @classmethod
+    def from_dict(cls, classes: Dict[Hashable, Set[Hashable]]):
+        """
+        :param classes: Sets of equivalent classes keyed by their representative, as saved in equivalent_classes.pickle
+        :return: The equivalent classes
+        """
+        equivalent_classes = cls()
+        for key, members in classes.items():
+            equivalent_classes.add(key)
+            for member in members:
+                equivalent_classes.union(member, key)
+        return equivalent_classes
+
+    def to_dict(self) -> Dict[Hashable, Set[Hashable]]:
+        """
+        :return: Sets of equivalent classes keyed by their representative, as saved in equivalent_classes.pickle
+        """
+        classes = dict()
+        for node in self.parents:
+            classes.setdefault(self.find(node), set()).add(node)
+        return classes
+
+    """
+    ADDERS
+    """
+
+    def add(self, node: Hashable) -> Hashable:
+        """
+        Add node as its own class if it isn't already known
+        :return: The representative of node's class
+        """
+        if node not in self.parents:
+            if self.journal is not None:
+                self.journal("add", node)
+            self.parents[node] = node
+            return node
+        return self.find(node)
+
+    def union(self, node: Hashable, equivalent: Hashable) -> Hashable:
+        """
+        Merge the classes of node and equivalent. An existing class of equivalent keeps its representative, then an
+        existing class of node. If neither is known yet, node represents the new class.
+        :return: The representative of the merged class
+        """
+        if self.journal is not None:
+            self.journal("union", node, equivalent)
+        equivalent_root = self.find(equivalent)
+        node_root = self.find(node)
+
+        if equivalent_root is not None:
+            root = equivalent_root
+            if node_root is None:
+                self.parents[node] = root
+            elif node_root != root:
+                self.parents[node_root] = root
+        else:
+            root = node_root if node_root is not None else self.add(node)
+            self.parents[equivalent] = root
+
+        return root
+
+    def merge(self, other: "EquivalentClasses") -> None:
+        """
+        Add the classes of other. Where a class overlaps with known classes, the known representative of other's
+        representative is kept, then that of its first member in string order.
+        """
+        for representative, members in other.to_dict().items():
+            root = None
+            for member in [representative] + sorted(members, key=str):
+                root = self.find(member)
+                if root is not None:
+                    break
+            if root is None:
+                root = self.add(representative)
+
+            for member in members:
+                self.union(member, root)
+
+    """
+    GETTERS
+    """
+
+    def find(self, node: Hashable) -> Hashable or None:
+        """
+        :return: The representative of node's class or None if node isn't known
+        """
+        parent = self.parents.get(node)
+        if parent is None:
+            return None
+
+        root = node
+        while self.parents[root] != root:
+            root = self.parents[root]
+
+        while node != root:
+            parent = self.parents[node]
+            self.parents[node] = root
+            node = parent
+
+        return root
+
+    def canonical(self, node: Hashable) -> Hashable:
+        """
+        :return: The representative of node's class or node itself if it isn't known
+        """
+        root = self.find(node)
+        return node if root is None else root
+
+    def __contains__(self, node: Hashable) -> bool:
+        return node in self.parents
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, EquivalentClasses) and self.to_dict() == other.to_dict()
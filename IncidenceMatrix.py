@@ -0,0 +1,98 @@
+from typing import Dict, Hashable, Iterator, List, Set, Tuple
+
+
+class IncidenceMatrix:
+    """
+    Sparse boolean matrix between two sets of nodes, such as drugs and their targets. Rows and columns are numbered in
+    the order they are added and only the entries that are set are stored, as a set of column numbers per row. Entries
+    are looked up by row or by column in time proportional to the number of entries returned.
+    """
+
+    def __init__(self):
+        self.rows: List[Hashable] = list()
+        self.columns: List[Hashable] = list()
+        self.row_index: Dict[Hashable, int] = dict()
+        self.column_index: Dict[Hashable, int] = dict()
+        self.row_entries: Dict[int, Set[int]] = dict()
+        self.column_entries: Dict[int, Set[int]] = dict()
+
+    """
+    ADDERS
+    """
+
+    def add_row(self, row: Hashable) -> int:
+        """
+        :return: The number of the row
+        """
+        i = self.row_index.get(row)
+        if i is None:
+            i = self.row_index[row] = len(self.rows)
+            self.rows.append(row)
+            self.row_entries[i] = set()
+        return i
+
+    def add_column(self, column: Hashable) -> int:
+        """
+        :return: The number of the column
+        """
+        j = self.column_index.get(column)
+        if j is None:
+            j = self.column_index[column] = len(self.columns)
+            self.columns.append(column)
+            self.column_entries[j] = set()
+        return j
+
+    def add(self, row: Hashable, column: Hashable) -> None:
+        i, j = self.add_row(row), self.add_column(column)
+        self.row_entries[i].add(j)
+        self.column_entries[j].add(i)
+
+    """
+    GETTERS
+    """
+
+    def get_row(self, row: Hashable) -> List[Hashable]:
+        """
+        :return: The columns set in row, or nothing if row isn't known
+        """
+        i = self.row_index.get(row)
+        return [] if i is None else [self.columns[j] for j in sorted(self.row_entries[i])]
+
+    def get_column(self, column: Hashable) -> List[Hashable]:
+        """
+        :return: The rows set in column, or nothing if column isn't known
+        """
+        j = self.column_index.get(column)
+        return [] if j is None else [self.rows[i] for i in sorted(self.column_entries[j])]
+
+    def get_entries(self) -> Iterator[Tuple[int, int]]:
+        """
+        :return: The row and column numbers of the entries that are set, in row order
+        """
+        for i in range(len(self.rows)):
+            for j in sorted(self.row_entries[i]):
+                yield i, j
+
+    def to_dict(self) -> Dict[Hashable, Set[Hashable]]:
+        """
+        :return: The columns set in each row, keyed by row
+        """
+        return {row: set(self.get_row(row)) for row in self.rows}
+
+    def __contains__(self, entry: Tuple[Hashable, Hashable]) -> bool:
+        row, column = entry
+        i, j = self.row_index.get(row), self.column_index.get(column)
+        return i is not None and j is not None and j in self.row_entries[i]
+
+    def __len__(self) -> int:
+        """
+        :return: The number of entries that are set
+        """
+        return sum(len(entries) for entries in self.row_entries.values())
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.rows), len(self.columns)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, IncidenceMatrix) and self.to_dict() == other.to_dict()
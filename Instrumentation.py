@@ -0,0 +1,183 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+from franz.openrdf.model import Value
+
+
+class CallStatistics:
+    """
+    Round trips made from one call site with one access pattern. Latencies are counted in a histogram of powers of two
+    of Statistics.smallest_latency, so recording a call takes constant time and memory.
+    """
+
+    def __init__(self, buckets: int):
+        self.calls = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.bytes = 0
+        self.histogram: List[int] = [0] * buckets
+
+    def get_percentile(self, q: float, smallest_latency: float) -> float:
+        """
+        :param q: Fraction of calls, between 0 and 1
+        :return: Latency in seconds that at least q of the calls took no longer than, up to the histogram's resolution
+        """
+        threshold = q * self.calls
+        cumulative = 0
+        for i, count in enumerate(self.histogram):
+            cumulative += count
+            if cumulative >= threshold:
+                return smallest_latency * 2 ** i
+        return math.inf
+
+
+class Call:
+    """
+    A round trip in progress. Results are added to it while it runs and recorded when it finishes.
+    """
+    __slots__ = ("statements", "bytes")
+
+    def __init__(self):
+        self.statements = 0
+        self.bytes = 0
+
+
+class Statistics:
+    """
+    Counters for the round trips an Interface makes to its triple store and for its cache lookups. Round trips are
+    broken down by call site and access pattern, with their count, latency histogram and the statements and bytes they
+    returned. Bytes are those of the response bodies a store reads, as TSV query results or N-Triples statements, so
+    stores that don't go over the network count none. Recording takes a lock and a few additions, so it can be left on.
+    """
+
+    # Upper bound of the first latency bucket in seconds. Each following bucket doubles it
+    smallest_latency = 0.0001
+    buckets = 24
+
+    def __init__(self):
+        self.calls: Dict[Tuple[str, str], CallStatistics] = dict()
+        self.cache_lookups: Dict[str, List[int]] = dict()
+        self.lock = threading.Lock()
+        self.current = threading.local()
+        self.started = time.perf_counter()
+
+    @staticmethod
+    def get_pattern(s: Value = None, p: Value = None, o: Value = None) -> str:
+        """
+        :return: Which of the subject, predicate and object are bound, as in "sp?"
+        """
+        return "".join(term if value is not None else "?" for term, value in (("s", s), ("p", p), ("o", o)))
+
+    @contextmanager
+    def timer(self, site: str, pattern: str = ""):
+        """
+        Time a round trip and record it when it finishes. Statements can be added to the yielded call, and bytes
+        received on the same thread are added to it through add_bytes.
+        :param site: Name of the call site
+        :param pattern: Access pattern of the call. See get_pattern
+        """
+        call = Call()
+        outer = getattr(self.current, "call", None)
+        self.current.call = call
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            self.current.call = outer
+            self.record(site, pattern, time.perf_counter() - start, statements=call.statements, size=call.bytes)
+
+    def iterate_timed(self, pages: Iterator[List], site: str, pattern: str = "") -> Iterator[List]:
+        """
+        Time fetching each page of an iterator as a round trip, without the time the caller spends between pages. The
+        length of each page is counted as its statements, and bytes received while it is fetched are added to it.
+        :param pages: Iterator fetching a page each time it is advanced
+        :param site: Name of the call site
+        :param pattern: Access pattern of the calls. See get_pattern
+        :return: The pages
+        """
+        while True:
+            call = Call()
+            outer = getattr(self.current, "call", None)
+            self.current.call = call
+            start = time.perf_counter()
+            try:
+                page = next(pages, None)
+            finally:
+                self.current.call = outer
+            if page is None:
+                return
+            self.record(site, pattern, time.perf_counter() - start, statements=len(page), size=call.bytes)
+            yield page
+
+    def record(self, site: str, pattern: str, seconds: float, statements: int = 0, size: int = 0) -> None:
+        bucket = min(self.buckets - 1, max(0, math.frexp(seconds / self.smallest_latency)[1]))
+        with self.lock:
+            call_statistics = self.calls.get((site, pattern))
+            if call_statistics is None:
+                call_statistics = self.calls[site, pattern] = CallStatistics(self.buckets)
+            call_statistics.calls += 1
+            call_statistics.seconds += seconds
+            call_statistics.statements += statements
+            call_statistics.bytes += size
+            call_statistics.histogram[bucket] += 1
+
+    def add_bytes(self, size: int) -> None:
+        """
+        Count bytes received towards the round trip running on this thread, if it is being timed
+        """
+        call = getattr(self.current, "call", None)
+        if call is not None:
+            call.bytes += size
+
+    def record_cache(self, cache: str, hits: int = 0, misses: int = 0) -> None:
+        with self.lock:
+            lookups = self.cache_lookups.get(cache)
+            if lookups is None:
+                lookups = self.cache_lookups[cache] = [0, 0]
+            lookups[0] += hits
+            lookups[1] += misses
+
+    def get_hit_rate(self, cache: str) -> float or None:
+        hits, misses = self.cache_lookups.get(cache, (0, 0))
+        return hits / (hits + misses) if hits + misses else None
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """
+        :return: The round trips keyed by call site and access pattern, and the hits and misses of each cache
+        """
+        with self.lock:
+            return {"calls": {"%s %s" % (site, pattern) if pattern else site: {
+                "calls": call_statistics.calls,
+                "seconds": call_statistics.seconds,
+                "statements": call_statistics.statements,
+                "bytes": call_statistics.bytes,
+                "p50": call_statistics.get_percentile(0.5, self.smallest_latency),
+                "p99": call_statistics.get_percentile(0.99, self.smallest_latency)}
+                for (site, pattern), call_statistics in self.calls.items()},
+                "caches": {cache: {"hits": hits, "misses": misses}
+                           for cache, (hits, misses) in self.cache_lookups.items()}}
+
+    def summary(self) -> str:
+        """
+        :return: One line per call site and access pattern, slowest first, followed by one line per cache
+        """
+        statistics = self.to_dict()
+        lines = ["%.1f s since start" % (time.perf_counter() - self.started)]
+        for name, call in sorted(statistics["calls"].items(), key=lambda item: -item[1]["seconds"]):
+            lines.append("%s: %d calls, %.3f s, mean %.1f ms, p50 <= %.1f ms, p99 <= %.1f ms, %d statements, %d bytes" %
+                         (name, call["calls"], call["seconds"], 1000 * call["seconds"] / call["calls"],
+                          1000 * call["p50"], 1000 * call["p99"], call["statements"], call["bytes"]))
+        for cache, lookups in sorted(statistics["caches"].items()):
+            total = lookups["hits"] + lookups["misses"]
+            lines.append("%s cache: %d/%d hits (%.1f%%)" % (cache, lookups["hits"], total,
+                                                             100 * lookups["hits"] / total if total else 0))
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls.clear()
+            self.cache_lookups.clear()
+            self.started = time.perf_counter()
@@ -0,0 +1,94 @@
+import logging
+import os
+import pickle
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+COMMIT = "commit"
+
+
+class Journal:
+    """
+    Append-only log of the additions made to mops and equivalent classes. Objects that support journaling (MOPs,
+    CompactMOPs and EquivalentClasses) record each addition as a method call through a recorder. Records only count once
+    a commit record follows them, so replaying the journal over the last snapshot restores the state as of the last
+    committed node. Every recorded call is idempotent, so replaying records that already made it into the snapshot is
+    harmless.
+    """
+    log = logging.getLogger('Journal')
+
+    def __init__(self, path: str):
+        """
+        :param path: Journal file. Created if it doesn't exist
+        """
+        self.path = path
+        self.file = open(path, "ab")
+        self.records = 0
+
+    def recorder(self, target: str) -> Callable:
+        """
+        :param target: Name the journaled object is replayed to
+        :return: Function that records a call, taking the method name followed by its arguments
+        """
+        return partial(self.record, target)
+
+    def record(self, target: str, method: str, *args) -> None:
+        pickle.dump((target, method, args), self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.records += 1
+
+    def commit(self, index: int, node) -> None:
+        """
+        Mark everything recorded so far as complete
+        :param index: Position of the last node mopified in the input list
+        :param node: The last node mopified
+        :return: None
+        """
+        self.record(COMMIT, COMMIT, index, node)
+        self.file.flush()
+
+    def replay(self, targets: Dict[str, object]) -> Tuple[int, object] or None:
+        """
+        Apply the committed records to their targets. Records after the last commit, including a record left half
+        written by a crash, are dropped from the file.
+        :param targets: Objects to replay calls to, keyed by the names they were recorded under
+        :return: The index and node of the last commit or None if nothing was committed
+        """
+        self.file.flush()
+
+        last_commit = None
+        committed_size = 0
+        pending: List[Tuple[str, str, tuple]] = []
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    target, method, args = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, ValueError, AttributeError):
+                    break
+
+                if target == COMMIT:
+                    for pending_target, pending_method, pending_args in pending:
+                        getattr(targets[pending_target], pending_method)(*pending_args)
+                    pending = []
+                    last_commit = args
+                    committed_size = f.tell()
+                else:
+                    pending.append((target, method, args))
+
+        if os.path.getsize(self.path) != committed_size:
+            self.log.debug("Dropping %d uncommitted records" % len(pending))
+            self.file.truncate(committed_size)
+        self.records = 0
+        return last_commit
+
+    def truncate(self) -> None:
+        """
+        Empty the journal once its records are in a snapshot
+        :return: None
+        """
+        self.file.truncate(0)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.records = 0
+
+    def close(self) -> None:
+        self.file.close()
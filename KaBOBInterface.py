@@ -1,5 +1,7 @@
 import logging
+import os
 import pickle
+from typing import Dict, Iterator, List, Set, Tuple
 
 from KaBOB_SPARQL_QUERY import KaBOBSPARQLQuery
 from franz.openrdf.model import URI
@@ -7,6 +9,10 @@ from franz.openrdf.model import Value
 from franz.openrdf.vocabulary import RDF, RDFS, OWL
 
 from AllegroGraphRepositoryInterface import Interface
+from IncidenceMatrix import IncidenceMatrix
+from StatementCache import DenotesIndex
+from TripleStore import TripleStore
+from Walker import Automata, PathQuery
 
 
 class KaBOBInterface(Interface):
@@ -18,30 +24,35 @@ class KaBOBInterface(Interface):
         apoptotic_process = p53 = cytochrome_C = CUSTOM_RELATIONS_TO_IGNORE = NOT_A_SLOT = DC = DCTERMS = ERR = FN = \
         FOAF = FTI = KEYWORD = ND = NDFN = SKOS = XS = XSD = drugbank_identifier = reactome_identifier = None
 
-    def __init__(self, credentials_file: str, max_depth=1000, cache_dir=None):
-        super().__init__(credentials_file, max_depth=max_depth, cache_dir=cache_dir)
+    def __init__(self, credentials_file: str or None, max_depth=1000, cache_dir=None, store: TripleStore = None,
+                 connections: int = 1, compact_mops: bool = False):
+        super().__init__(credentials_file, max_depth=max_depth, cache_dir=cache_dir, store=store,
+                         connections=connections, compact_mops=compact_mops)
         self.bio_world = None
+        self.drug_targets_query: KaBOBSPARQLQuery = None
+        self.drug_targets: IncidenceMatrix = None
+        self.denotes = DenotesIndex("%s/denotes.sqlite" % self.cache_dir if self.cache_dir else None)
 
     def initialize_namespaces(self):
-        self.BIO = self.conn.namespace("http://ccp.ucdenver.edu/kabob/bio/")
-        self.CCP_BNODE = self.conn.namespace("http://ccp.ucdenver.edu/bnode/")
-        self.CCP_EXT = self.conn.namespace("http://ccp.ucdenver.edu/obo/ext/")
-        self.DC = self.conn.namespace("http://purl.org/dc/elements /11/")
-        self.DCTERMS = self.conn.namespace("http://purl.org/dc/terms/")
-        self.ERR = self.conn.namespace("http://www.w3.org/2005/xqt-errors#")
-        self.FN = self.conn.namespace("http://www.w3.org/2005 /xpath-functions#")
-        self.FOAF = self.conn.namespace("http://xmlns.com/foaf /01/")
-        self.FTI = self.conn.namespace("http://franz.com/ns/allegrograph/2.2/textindex/")
-        self.ICE = self.conn.namespace("http://ccp.ucdenver.edu/kabob/ice/")
-        self.KEYWORD = self.conn.namespace("http://franz.com/ns/keyword#")
-        self.ND = self.conn.namespace("http://franz.com/ns/allegrograph/5.0/geo/nd#")
-        self.NDFN = self.conn.namespace("http://franz.com/ns/allegrograph/5.0/geo/nd/fn#")
-        self.OBOINOWL = self.conn.namespace("http://www.geneontology.org/formats/oboInOwl#")
-        self.SKOS = self.conn.namespace("http://www.w3.org/2004/02/skos/core#")
-        self.XS = self.conn.namespace("http://www.w3.org/2001/XMLSchema#")
-        self.XSD = self.conn.namespace("http://www.w3.org/2001/XMLSchema#")
-
-        self.OBO = self.conn.namespace("http://purl.obolibrary.org/obo/")
+        self.BIO = self.store.namespace("http://ccp.ucdenver.edu/kabob/bio/")
+        self.CCP_BNODE = self.store.namespace("http://ccp.ucdenver.edu/bnode/")
+        self.CCP_EXT = self.store.namespace("http://ccp.ucdenver.edu/obo/ext/")
+        self.DC = self.store.namespace("http://purl.org/dc/elements /11/")
+        self.DCTERMS = self.store.namespace("http://purl.org/dc/terms/")
+        self.ERR = self.store.namespace("http://www.w3.org/2005/xqt-errors#")
+        self.FN = self.store.namespace("http://www.w3.org/2005 /xpath-functions#")
+        self.FOAF = self.store.namespace("http://xmlns.com/foaf /01/")
+        self.FTI = self.store.namespace("http://franz.com/ns/allegrograph/2.2/textindex/")
+        self.ICE = self.store.namespace("http://ccp.ucdenver.edu/kabob/ice/")
+        self.KEYWORD = self.store.namespace("http://franz.com/ns/keyword#")
+        self.ND = self.store.namespace("http://franz.com/ns/allegrograph/5.0/geo/nd#")
+        self.NDFN = self.store.namespace("http://franz.com/ns/allegrograph/5.0/geo/nd/fn#")
+        self.OBOINOWL = self.store.namespace("http://www.geneontology.org/formats/oboInOwl#")
+        self.SKOS = self.store.namespace("http://www.w3.org/2004/02/skos/core#")
+        self.XS = self.store.namespace("http://www.w3.org/2001/XMLSchema#")
+        self.XSD = self.store.namespace("http://www.w3.org/2001/XMLSchema#")
+
+        self.OBO = self.store.namespace("http://purl.obolibrary.org/obo/")
 
     def initialize_relations(self):
         super(KaBOBInterface, self).initialize_relations()
@@ -63,7 +74,7 @@ class KaBOBInterface(Interface):
         CUSTOM_RELATIONS_TO_IGNORE = [OWL.DISJOINTWITH,
                                       HAS_RANK,
                                       OWL.INTERSECTIONOF,
-                                      self.conn.createURI(namespace=RDF.NAMESPACE, localname='subClassOf'),
+                                      self.store.createURI(namespace=RDF.NAMESPACE, localname='subClassOf'),
                                       self.XREF, self.ID, self.DEFINITION,
                                       self.EXACTSYNONYM, RDFS.COMMENT, self.OBONAMESPACE,
                                       self.DENOTES]
@@ -89,6 +100,14 @@ class KaBOBInterface(Interface):
         self.drugbank_identifier = self.CCP_EXT.IAO_EXT_0001309
         self.reactome_identifier = self.CCP_EXT.IAO_EXT_0001643
 
+    def load_release_caches(self) -> None:
+        super(KaBOBInterface, self).load_release_caches()
+        self.denotes.set_release(self.release)
+
+    def close(self):
+        super(KaBOBInterface, self).close()
+        self.denotes.close()
+
 
 
     """
@@ -113,32 +132,144 @@ class KaBOBInterface(Interface):
     """
 
     def get_bio_world(self):
-        if self.cache_dir:
-            try:
-                self.bio_world = pickle.load(open("%s/bio_world.pickle" % self.cache_dir, "rb"))
-            except FileNotFoundError:
-                self.log.warning("Collecting all bio world nodes")
-                self.bio_world = self.get_objects(None, self.DENOTES)
-                pickle.dump(self.bio_world, open("%s/bio_world.pickle" % self.cache_dir, "wb"))
-
-            return self.bio_world
+        if self.bio_world is None:
+            self.bio_world = list(self.iterate_bio_world())
+        return self.bio_world
+
+    def iterate_bio_world(self) -> Iterator[Value]:
+        """
+        Stream the bio world nodes so that they can be mopified as they are read from KaBOB. The nodes are appended to
+        bio_world.pickle a page at a time as they are read, and when the stream is dropped, so a later call reads the
+        nodes cached so far from there and only the rest from KaBOB.
+        :return: The bio world nodes
+        """
+        if self.bio_world is not None:
+            yield from self.bio_world
+            return
+
+        bio_world, complete = self.load_bio_world()
+        yield from bio_world
+        if complete:
+            self.bio_world = bio_world
+            return
+
+        self.log.warning("Collecting bio world nodes from node %d" % len(bio_world))
+        page = []
+        try:
+            for node in self.iterate_objects(None, self.DENOTES, offset=len(bio_world)):
+                page.append(node)
+                yield node
+                if len(page) >= self.store.statement_page_size:
+                    self.append_bio_world(page)
+                    bio_world.extend(page)
+                    page = []
+            self.append_bio_world(page, complete=True)
+            bio_world.extend(page)
+            self.bio_world = bio_world
+        finally:
+            if page and self.bio_world is None:
+                self.append_bio_world(page)
+
+    def load_bio_world(self) -> Tuple[List[Value], bool]:
+        """
+        Read the bio world nodes cached in bio_world.pickle. The file holds the KaBOB release followed by pages of nodes
+        and, once every node has been read, None. Pages left half written are dropped.
+        :return: The cached nodes and whether they are all of them
+        """
+        bio_world, complete = [], False
+        if not self.cache_dir or self.release is None:
+            return bio_world, complete
+
+        path = "%s/bio_world.pickle" % self.cache_dir
+        size = 0
+        try:
+            with open(path, "rb") as f:
+                if pickle.load(f) == self.release:
+                    while not complete:
+                        page = pickle.load(f)
+                        bio_world.extend(page or [])
+                        complete = page is None
+                        size = f.tell()
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError, AttributeError):
+            pass
+
+        if size == 0:
+            with open(path, "wb") as f:
+                pickle.dump(self.release, f)
+        elif os.path.getsize(path) != size:
+            os.truncate(path, size)
+        return bio_world, complete
+
+    def append_bio_world(self, page: List[Value], complete: bool = False) -> None:
+        """
+        Append a page of bio world nodes to bio_world.pickle
+        :param complete: Whether page holds the last nodes in the bio world
+        """
+        if not self.cache_dir or self.release is None:
+            return
+        with open("%s/bio_world.pickle" % self.cache_dir, "ab") as f:
+            if page:
+                pickle.dump(page, f)
+            if complete:
+                pickle.dump(None, f)
 
     def get_bio_node(self, node: URI or str) -> Value:
-        if isinstance(node, str):
-            node = self.get_node(node)
-        if self.is_ice(node):
-            return self.get_ice_to_bio(node)
-        else:
-            subjects = self.get_subjects(o=node, p=self.DENOTES)
-            for subject in subjects:
-                if self.is_ice(subject):
-                    return self.get_ice_to_bio(subject)
-
-    def get_ice_to_bio(self, node: Value) -> Value:
-        objects = self.get_objects(s=node, p=self.DENOTES)
-        for _object in objects:
-            if self.is_bio(_object):
-                return _object
+        return self.get_bio_nodes([node]).get(node)
+
+    def get_bio_nodes(self, nodes: List[URI or str]) -> Dict[URI or str, Value]:
+        """
+        Resolve many ICE nodes, or nodes denoted by ICE nodes, to the bio nodes they denote. Denotes statements that
+        aren't in the denotes index yet are fetched with at most one query for the ICE nodes and one for the rest.
+        :param nodes: Nodes or names of nodes as accepted by get_node
+        :return: Bio nodes keyed by the nodes as given. Nodes without a bio node map to None
+        """
+        resolved_nodes = {node: self.get_node(node) if isinstance(node, str) else node for node in nodes}
+
+        unknown = [node for node in dict.fromkeys(resolved_nodes.values())
+                   if node is not None and not self.denotes.is_complete(node)]
+        ices = [node for node in unknown if self.is_ice(node)]
+        others = [node for node in unknown if not self.is_ice(node)]
+
+        if others:
+            query = KaBOBSPARQLQuery(self)
+            query.add_values("node", others)
+            query.make_triple("ice", self.DENOTES, "node")
+            query.make_triple("ice", self.DENOTES, "bio")
+            query.set_selections(["node", "ice", "bio"])
+            denoters = set()
+            for binding_set in query.run(self.store, use_cache=False):
+                ice = binding_set.getValue("ice")
+                self.denotes.add(ice, binding_set.getValue("node"))
+                self.denotes.add(ice, binding_set.getValue("bio"))
+                denoters.add(ice)
+            # Every object of each denoter was collected, which only completes ICE nodes. Other nodes are complete once
+            # their subjects are collected
+            self.denotes.set_complete(ice for ice in denoters if self.is_ice(ice))
+            self.denotes.set_complete(others)
+        if ices:
+            query = KaBOBSPARQLQuery(self)
+            query.add_values("ice", ices)
+            query.make_triple("ice", self.DENOTES, "bio")
+            query.set_selections(["ice", "bio"])
+            for binding_set in query.run(self.store, use_cache=False):
+                self.denotes.add(binding_set.getValue("ice"), binding_set.getValue("bio"))
+            self.denotes.set_complete(ices)
+
+        return {key: None if node is None else self.get_indexed_bio_node(node) for key, node in resolved_nodes.items()}
+
+    def get_indexed_bio_node(self, node: Value) -> Value:
+        """
+        :param node: Node whose denotes statements are in the denotes index
+        :return: The bio node denoted by node, or by an ICE node that denotes node
+        """
+        self.denotes.ensure_loaded(node)
+        ices = [node] if self.is_ice(node) else sorted((ice for ice in self.denotes.get_denoters(node)
+                                                        if self.is_ice(ice)), key=str)
+        for ice in ices:
+            self.denotes.ensure_loaded(ice)
+            bio_nodes = sorted((_object for _object in self.denotes.get_denoted(ice) if self.is_bio(_object)), key=str)
+            if bio_nodes:
+                return bio_nodes[0]
 
     def get_node(self, node_name: str):
         split_node_name = node_name.split(":")
@@ -158,17 +289,64 @@ class KaBOBInterface(Interface):
 
     def get_drug_targets(self, drug_bank_id):
         drug = self.get_drugbank_drug(drug_bank_id)
-        binding = self.get_bio_node("GO_0005488")
-        has_participant = self.get_bio_node(self.HAS_PARTICIPANT)
-        inheres_in = self.get_bio_node("RO_0000052")
-
+        if drug is None:
+            return []
+
+        if self.drug_targets_query is None:
+            self.drug_targets_query = self.make_drug_targets_query()
+        result = self.drug_targets_query.run(self.store, bindings={"drug": drug})
+
+        return [binding_set.getValue("target") for binding_set in result]
+
+    def get_all_drug_targets(self, drugs: List[Value] = None) -> IncidenceMatrix:
+        """
+        Get the targets of many drugs with a single query rather than one query per drug
+        :param drugs: Bio nodes of the drugs. Defaults to every DrugBank drug, whose targets are cached in
+        drug_targets.pickle along with the KaBOB release
+        :return: Drug by target matrix. Every drug asked for has a row
+        """
+        if drugs is None:
+            if self.drug_targets is None:
+                self.drug_targets = self.load_release_cache("drug_targets.pickle")
+            if self.drug_targets is not None:
+                return self.drug_targets
+
+        query = self.make_drug_targets_query()
+        drug_targets = IncidenceMatrix()
+        if drugs is None:
+            query.make_triple("drug_ice", RDFS.SUBCLASSOF, self.drugbank_identifier)
+            query.make_triple("drug_ice", self.DENOTES, "drug")
+            result = query.run(self.store, stream=True)
+        else:
+            for drug in drugs:
+                drug_targets.add_row(drug)
+            query.add_values("drug", drugs)
+            result = query.run(self.store)
+
+        for binding_set in result:
+            drug_targets.add(binding_set.getValue("drug"), binding_set.getValue("target"))
+
+        if drugs is None:
+            self.drug_targets = drug_targets
+            self.save_release_cache("drug_targets.pickle", drug_targets)
+        return drug_targets
+
+    def make_drug_targets_query(self) -> KaBOBSPARQLQuery:
+        """
+        :return: Query for the drugs and their targets. Bind ?drug to query for the targets of one drug
+        """
+        names = ["GO_0005488", self.HAS_PARTICIPANT, "RO_0000052"]
+        bio_nodes = self.get_bio_nodes(names)
+        binding, has_participant, inheres_in = [bio_nodes[name] for name in names]
+
+        drug = "drug"
         drug_sc = "drug_sc"
         inheres = "inheres"
         interaction = "interaction"
         target_sc = "target_sc"
         target = "target"
 
-        selections = [target]
+        selections = [drug, target]
 
         query = KaBOBSPARQLQuery(self)
 
@@ -183,9 +361,7 @@ class KaBOBInterface(Interface):
 
         query.set_selections(selections)
 
-        result = query.run(self.conn)
-
-        return [binding_set.getValue(selection) for binding_set in result for selection in selections]
+        return query
 
     def mopify_pathway(self, pathway_node):
         # immediately_preceded_by_uri = "ice:RO_0002087"
@@ -198,9 +374,53 @@ class KaBOBInterface(Interface):
 
     def get_all_drugs(self):
         db_id_scs = self.get_subjects(o=self.drugbank_identifier, p=RDFS.SUBCLASSOF)
-        return [self.get_bio_node(db_id_sc) for db_id_sc in db_id_scs]
+        bio_nodes = self.get_bio_nodes(db_id_scs)
+        return [bio_nodes[db_id_sc] for db_id_sc in db_id_scs]
+
+    def get_path_ends(self, source: Value, automaton: Automata, targets: List[Value] = None,
+                      evaluate_locally: bool = None) -> Set[Value]:
+        """
+        Find the nodes reached from source along paths of predicates accepted by automaton. In KaBOB this is a single
+        property path query. If source has already been mopified, the slots of the mops can be searched instead.
+        :param source: Node to start from
+        :param automaton: Automaton over predicates
+        :param targets: If set, only these nodes are returned
+        :param evaluate_locally: Search the mops instead of KaBOB. If None, the mops are searched when source is in them
+        :return: The nodes reached
+        """
+        if evaluate_locally is None:
+            evaluate_locally = source in self.mops
+
+        if evaluate_locally:
+            query = PathQuery.for_mops(self.mops, automaton, targets=(), by_role=True)
+            ends = {node for (node, _), distance in query.reachable_states(source).items() if distance > 0}
+            return ends.intersection(targets) if targets else ends
+
+        end = "end"
+        query = KaBOBSPARQLQuery(self)
+        query.make_path(source, automaton, end)
+        if targets:
+            query.add_values(end, targets)
+        query.set_selections([end])
+
+        result = query.run(self.store)
+        return {binding_set.getValue(end) for binding_set in result}
 
     def get_all_pathways(self):
+        query = self.make_pathways_query()
+        return [binding_set.getValue(selection) for binding_set in query.run(self.store)
+                for selection in query.selections]
+
+    def iterate_all_pathways(self) -> Iterator[Value]:
+        """
+        Stream the Reactome pathways a page of query results at a time, so they can be mopified as they arrive
+        :return: The pathways
+        """
+        query = self.make_pathways_query()
+        for binding_set in query.run(self.store, stream=True):
+            yield binding_set.getValue("pathway")
+
+    def make_pathways_query(self) -> KaBOBSPARQLQuery:
         reactome_ice_id = "reactome_ice_id"
         pathway = "pathway"
         selections = [pathway]
@@ -210,8 +430,7 @@ class KaBOBInterface(Interface):
         query.make_triple(reactome_ice_id, self.DENOTES, pathway)
         query.set_selections(selections)
 
-        result = query.run(self.conn)
-        return [binding_set.getValue(selection) for binding_set in result for selection in selections]
+        return query
 
 
 def test_with_lipitor():
@@ -1,18 +1,56 @@
+import hashlib
+import logging
+import re
+from contextlib import nullcontext
+from typing import Dict, Iterator, List, Tuple
+
 import AllegroGraphRepositoryInterface
-from franz.openrdf.query.query import QueryLanguage
-from franz.openrdf.repository.repositoryconnection import RepositoryConnection
+from franz.openrdf.model import Value
 from franz.openrdf.vocabulary import OWL, RDF, RDFS
-import uuid
+
+from TripleStore import LocalBindingSet
+from Walker import Automata
+
+# Variables, skipping over IRIs and string literals that may contain a "?"
+VARIABLE = re.compile(r'<[^\s<>]*>|"(?:[^"\\]|\\.)*"|\?(\w+)')
 
 
 class KaBOBSPARQLQuery:
+    """
+    A SPARQL SELECT query built up from triple patterns. A query can be run with different values bound to its
+    variables, so it works as a template. Results are cached by the query's canonical text, bindings and the KaBOB
+    release, so running the same query again doesn't touch the server. Results from stores whose release isn't known
+    are never cached, since they couldn't be told apart from another store's.
+    """
+    log = logging.getLogger('KaBOBSPARQLQuery')
 
     def __init__(self, interface: AllegroGraphRepositoryInterface):
         self.interface = interface
         self.triples = []
+        # Subject, Walker Automata and object of each property path pattern
+        self.paths: List[Tuple[str, Automata, str]] = []
+        self.filters = []
         self.selections = []
+        self.values: Dict[str, List[Value]] = dict()
+        self.restrictions = 0
+        self.limit: int = None
+        self.offset: int = None
+
+    def make_query_string(self, canonical: bool = False, limit: int = None, offset: int = None):
+        """
+        :param canonical: Rename variables to v0, v1, ... in order of first appearance, so that queries differing only
+        in their variable names have the same text
+        :param limit: LIMIT of the query. Defaults to the query's own
+        :param offset: OFFSET of the query. Defaults to the query's own. Queries with a LIMIT or OFFSET are ordered by
+        their selections, so that consecutive pages neither skip nor repeat solutions
+        :return: The query
+        """
+        if canonical:
+            return self.canonicalize(self.make_query_string(limit=limit, offset=offset))[0]
+
+        limit = self.limit if limit is None else limit
+        offset = self.offset if offset is None else offset
 
-    def make_query_string(self):
         query_string = "SELECT"
         for selection in self.selections:
             query_string += " ?"
@@ -20,7 +58,9 @@ class KaBOBSPARQLQuery:
 
         query_string += " WHERE{\n"
         contains_unbound_var = [True for _ in self.selections]
-        for triple in self.triples:
+        for variable, values in self.values.items():
+            query_string += "\tVALUES ?%s { %s }\n" % (variable, " ".join(str(value) for value in values))
+        for triple in self.triples + [(s, automaton.to_property_path(), o) for s, automaton, o in self.paths]:
             if isinstance(triple, tuple):
                 query_string += "\t%s %s %s .\n" % triple
                 for i, (is_unbound, selection) in enumerate(zip(contains_unbound_var, self.selections)):
@@ -28,14 +68,31 @@ class KaBOBSPARQLQuery:
                         contains_unbound_var[i] = False
             else:
                 query_string += "\t%s\n" % triple
+        for _filter in self.filters:
+            query_string += "\tfilter (%s %s %s)\n" % _filter
 
         if True in contains_unbound_var:
             raise Exception("Contains unbound variable")
 
         query_string += "}"
+        if limit is not None or offset:
+            query_string += " ORDER BY %s" % " ".join("?" + selection for selection in self.selections)
+        if limit is not None:
+            query_string += " LIMIT %d" % limit
+        if offset:
+            query_string += " OFFSET %d" % offset
 
         return query_string
 
+    def make_path(self, s, automaton, o):
+        """
+        Match s to o along any path of predicates accepted by a Walker Automata. The path is written as a SPARQL
+        property path, see Automata.to_property_path
+        """
+        self.paths.append(("?%s" % s if isinstance(s, str) else str(s),
+                           automaton,
+                           "?%s" % o if isinstance(o, str) else str(o)))
+
     def make_triple(self, s, p, o):
         self.triples.append(("?%s" % s if isinstance(s, str) else str(s),
                              "?%s" % p if isinstance(p, str) else str(p),
@@ -43,29 +100,133 @@ class KaBOBSPARQLQuery:
                              ))
 
     def apply_restriction(self, svf, op, targets):
-        restriction_var = "restriction_" + uuid.uuid4().hex[:6].upper()
+        restriction_var = "restriction_%d" % self.restrictions
+        self.restrictions += 1
         self.make_triple(restriction_var, OWL.SOMEVALUESFROM, svf)
         self.make_triple(restriction_var, OWL.ONPROPERTY, op)
         self.make_triple(restriction_var, RDF.TYPE, OWL.RESTRICTION)
         for target in targets:
             self.make_triple(target, RDFS.SUBCLASSOF, restriction_var)
 
-    def run(self, conn:RepositoryConnection):
-        query_string = self.make_query_string()
-        print("Query:\n%s" % query_string)
-        print()
-
-        tuple_query = conn.prepareTupleQuery(QueryLanguage.SPARQL, query_string)
-        result = tuple_query.evaluate()
-        print("Number of results: %d" % len(result))
-
-        return result
+    def run(self, store=None, bindings: Dict[str, Value] = None, use_cache: bool = True, stream: bool = False,
+            page_size: int = None) -> List[LocalBindingSet] or Iterator[LocalBindingSet]:
+        """
+        :param store: Triple store to query. Defaults to the interface's
+        :param bindings: Values for variables of the query, keyed by variable name without the "?"
+        :param use_cache: Look the results up in, and save them to, the interface's query result cache
+        :param stream: Return an iterator over the results instead. See iterate
+        :param page_size: Number of results to fetch at a time when streaming
+        :return: Binding sets for the selections
+        """
+        if stream:
+            return self.iterate(store=store, bindings=bindings, use_cache=use_cache, page_size=page_size)
+
+        store = store or self.interface.store
+        bindings = bindings or {}
+        cache = self.get_cache() if use_cache else None
+
+        stats = getattr(self.interface, "stats", None)
+        key = self.get_cache_key(bindings)
+        rows = cache.get(key) if cache is not None else None
+        if stats is not None and cache is not None:
+            stats.record_cache("query_results", hits=rows is not None, misses=rows is None)
+        if rows is None:
+            self.log.debug("Query:\n%s\nBindings: %s" % (self.make_query_string(), bindings))
+            with stats.timer("query") if stats is not None else nullcontext() as call:
+                rows = [tuple(binding_set.getValue(selection) for selection in self.selections)
+                        for binding_set in store.evaluate_query(self, bindings)]
+                if call is not None:
+                    call.statements = len(rows)
+            self.log.debug("Number of results: %d" % len(rows))
+            if cache is not None:
+                cache[key] = rows
+        else:
+            self.log.debug("Cached results for query %s" % key)
+
+        return [LocalBindingSet(zip(self.selections, row)) for row in rows]
+
+    def iterate(self, store=None, bindings: Dict[str, Value] = None, use_cache: bool = True,
+                page_size: int = None) -> Iterator[LocalBindingSet]:
+        """
+        Stream the results a page at a time using LIMIT and OFFSET, so that they can be used as they arrive. Results
+        already in the query result cache are read from there, but streamed results are not saved to it since they are
+        expected to be too many to hold at once.
+        :param store: Triple store to query. Defaults to the interface's
+        :param bindings: Values for variables of the query, keyed by variable name without the "?"
+        :param use_cache: Look the results up in the interface's query result cache
+        :param page_size: Number of results to fetch at a time. Defaults to the store's query_page_size
+        :return: Binding sets for the selections
+        """
+        store = store or self.interface.store
+        bindings = bindings or {}
+        cache = self.get_cache() if use_cache else None
+        stats = getattr(self.interface, "stats", None)
+
+        rows = cache.get(self.get_cache_key(bindings)) if cache is not None else None
+        if stats is not None and cache is not None:
+            stats.record_cache("query_results", hits=rows is not None, misses=rows is None)
+        if rows is not None:
+            for row in rows:
+                yield LocalBindingSet(zip(self.selections, row))
+            return
+
+        self.log.debug("Streaming query:\n%s\nBindings: %s" % (self.make_query_string(), bindings))
+        pages = store.iterate_query_pages(self, bindings, page_size=page_size)
+        if stats is not None:
+            # Each page is a round trip. Only the time spent waiting on the store is counted
+            pages = stats.iterate_timed(pages, "query_stream")
+        for page in pages:
+            for binding_set in page:
+                yield LocalBindingSet((selection, binding_set.getValue(selection)) for selection in self.selections)
+
+    def set_limit(self, limit: int = None, offset: int = None):
+        self.limit = limit
+        self.offset = offset
+
+    def get_cache(self):
+        """
+        :return: The interface's query result cache, or None if there is no interface or the KaBOB release is unknown
+        """
+        if getattr(self.interface, "release", None) is None:
+            return None
+        return getattr(self.interface, "query_results", None)
+
+    def get_cache_key(self, bindings: Dict[str, Value] = None) -> str:
+        """
+        :param bindings: Values for variables of the query
+        :return: Digest of the canonical query text, the bindings and the KaBOB release
+        """
+        query_string, names = self.canonicalize(self.make_query_string())
+        bound = sorted("?%s=%s" % (names.get(name, name), value) for name, value in (bindings or {}).items())
+        release = getattr(self.interface, "release", None)
+        return hashlib.sha256("\n".join([str(release), query_string] + bound).encode()).hexdigest()
+
+    @staticmethod
+    def canonicalize(query_string: str) -> Tuple[str, Dict[str, str]]:
+        """
+        :return: The query with its variables renamed to v0, v1, ... in order of first appearance, and the new name of
+        each variable
+        """
+        names = dict()
+
+        def rename(match):
+            if match.group(1) is None:
+                return match.group(0)
+            return "?" + names.setdefault(match.group(1), "v%d" % len(names))
+
+        return VARIABLE.sub(rename, query_string), names
+
+    def add_values(self, variable: str, values: List[Value]):
+        """
+        Restrict a variable to a list of values with a VALUES clause
+        """
+        self.values[variable] = list(values)
 
     def set_selections(self, selections):
         self.selections = selections
 
     def add_filter(self, s, p, o):
-        self.triples.append("filter (%s %s %s)" % ("?%s" % s if isinstance(s, str) else str(s),
-                                                   str(p),
-                                                   "?%s" % o if isinstance(o, str) else str(o)))
+        self.filters.append(("?%s" % s if isinstance(s, str) else str(s),
+                             str(p),
+                             "?%s" % o if isinstance(o, str) else str(o)))
 
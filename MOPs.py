@@ -1,6 +1,9 @@
+import gzip
 import logging
 import math
-from typing import Callable
+from collections import deque
+from typing import Callable, Dict, Hashable, Iterator, List, Set, TextIO, Tuple
+from xml.sax.saxutils import escape, quoteattr
 
 import matplotlib.pyplot as plt
 import networkx as nx
@@ -10,6 +13,63 @@ class FrameNotAddedYetException(Exception):
     pass
 
 
+class ReachabilityIndex:
+    """
+    Transitive closure of an abstraction hierarchy, kept up to date as abstractions are added, so that checking whether
+    one frame is an abstraction of another is a set lookup instead of a graph search
+    """
+
+    def __init__(self):
+        self.ancestors: Dict[Hashable, Set[Hashable]] = dict()
+
+    def add_abstraction(self, specialization, abstraction, get_specializations: Callable) -> None:
+        """
+        Record that abstraction is a direct abstraction of specialization
+        :param specialization: The specialization
+        :param abstraction: The abstraction
+        :param get_specializations: Function returning the direct specializations of a frame
+        :return: None
+        """
+        new_ancestors = {abstraction}
+        new_ancestors.update(self.ancestors.get(abstraction, ()))
+
+        stack = [specialization]
+        visited = {specialization}
+        while stack:
+            frame = stack.pop()
+            self.ancestors.setdefault(frame, set()).update(new_ancestors)
+            for frame_specialization in get_specializations(frame):
+                if frame_specialization not in visited:
+                    visited.add(frame_specialization)
+                    stack.append(frame_specialization)
+
+    def is_reachable(self, specialization, abstraction) -> bool:
+        return abstraction in self.ancestors.get(specialization, ())
+
+    def get_ancestors(self, frame) -> Set[Hashable]:
+        return self.ancestors.get(frame, set())
+
+    def rebuild(self, abstractions: nx.DiGraph) -> None:
+        """
+        Recompute the closure of a whole abstraction hierarchy
+        :param abstractions: Graph with edges from specializations to abstractions
+        :return: None
+        """
+        self.ancestors = dict()
+        try:
+            for frame in reversed(list(nx.topological_sort(abstractions))):
+                frame_ancestors = set()
+                for abstraction in abstractions.successors(frame):
+                    frame_ancestors.add(abstraction)
+                    frame_ancestors.update(self.ancestors[abstraction])
+                self.ancestors[frame] = frame_ancestors
+        except nx.NetworkXUnfeasible:
+            self.ancestors = {frame: nx.descendants(abstractions, frame) for frame in abstractions}
+
+    def clear(self) -> None:
+        self.ancestors.clear()
+
+
 class MOPs:
     log = logging.getLogger("MOPs")
 
@@ -20,24 +80,46 @@ class MOPs:
     attribute_frame_type = 'frame_type'
     attribute_filler = 'filler'
 
+    # Records additions when set. See Journal.recorder
+    journal: Callable = None
+
     def __init__(self, **attr):
         super().__init__(**attr)
         self.abstractions = nx.DiGraph()
         self.slots = nx.MultiDiGraph()
         self.special_node_attributes = {}
+        self.reachability = ReachabilityIndex()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("journal", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # MOPs pickled before the reachability index existed
+        if "reachability" not in state:
+            self.reachability = ReachabilityIndex()
+            self.reachability.rebuild(self.abstractions)
 
     '''
     ADDERS
     '''
 
     def add_special_node_attribute(self, role, role_label):
+        if self.journal is not None:
+            self.journal("add_special_node_attribute", role, role_label)
         self.special_node_attributes[role] = role_label
 
     def add_frame(self, frame, label: str = None, frame_type: str = type_mop):
         if frame not in self.abstractions:
+            if self.journal is not None:
+                self.journal("add_frame", frame, label, frame_type)
             self.abstractions.add_node(frame, label=label, frame_type=frame_type)
 
     def add_slot(self, frame, role, role_label, filler):
+        if self.journal is not None:
+            self.journal("add_slot", frame, role, role_label, filler)
         if isinstance(filler, list):
             list_node = str(frame) + " " + str(role) + " - list"
             self.slots.add_node(list_node, label=list_node, list=filler)
@@ -45,9 +127,9 @@ class MOPs:
             self.slots.add_edge(frame, filler, key=role, label=role_label)
         else:
             if role in self.special_node_attributes.keys():
-                nx.set_node_attributes(self.abstractions,
-                                       {frame: nx.get_node_attributes(self.abstractions, self.attribute_label)[filler]},
-                                       self.special_node_attributes[role])
+                filler_label = self.abstractions.nodes[filler][self.attribute_label]
+                if frame in self.abstractions:
+                    self.abstractions.nodes[frame][self.special_node_attributes[role]] = filler_label
             else:
                 self.slots.add_edge(frame, filler, key=role, label=role_label)
 
@@ -61,32 +143,75 @@ class MOPs:
         if not self.is_abstraction(abstraction, frame):
             try:
                 if self.is_abstraction(frame, abstraction):
-                    raise AbstractionException(
-                        nx.get_node_attributes(self.abstractions, self.attribute_label)[frame],
-                        nx.get_node_attributes(self.abstractions, self.attribute_label)[abstraction])
+                    raise AbstractionException(self.abstractions.nodes[frame][self.attribute_label],
+                                               self.abstractions.nodes[abstraction][self.attribute_label])
                 else:
+                    if self.journal is not None:
+                        self.journal("add_abstraction", frame, abstraction)
                     self.abstractions.add_edge(frame, abstraction)
+                    self.reachability.add_abstraction(frame, abstraction, self.abstractions.predecessors)
             except AbstractionException as ae:
                 self.log.warning(ae.message)
 
+    def merge(self, other, canonical: Callable = None):
+        """
+        Add the frames, abstractions and slots of other. Frames already in these mops keep their attributes.
+        :param other: MOPs or CompactMOPs
+        :param canonical: Maps each of other's frames and fillers to the node it stands for in these mops, such as the
+        representative of its equivalent class. Defaults to the node itself
+        :return: None
+        """
+        if not isinstance(other, MOPs):
+            other = other.to_mops()
+        if canonical is None:
+            def canonical(node):
+                return node
+
+        def canonical_filler(filler):
+            if isinstance(filler, list):
+                return [canonical_filler(item) for item in filler]
+            return canonical(filler)
+
+        for role, role_label in other.special_node_attributes.items():
+            self.add_special_node_attribute(role, role_label)
+        special_attributes = set(self.special_node_attributes.values())
+
+        for frame, data in other.abstractions.nodes(data=True):
+            merged_frame = canonical(frame)
+            self.add_frame(merged_frame, label=data.get(self.attribute_label),
+                           frame_type=data.get(self.attribute_frame_type, self.type_mop))
+            merged_data = self.abstractions.nodes[merged_frame]
+            for attribute in special_attributes.intersection(data):
+                merged_data.setdefault(attribute, data[attribute])
+
+        for frame, abstraction in other.abstractions.edges:
+            merged_frame, merged_abstraction = canonical(frame), canonical(abstraction)
+            if merged_frame != merged_abstraction:
+                self.add_abstraction(merged_frame, merged_abstraction)
+
+        for frame, filler, role, data in other.slots.edges(keys=True, data=True):
+            filler_list = other.slots.nodes[filler].get("list")
+            self.add_slot(canonical(frame), role, data.get(self.attribute_label),
+                          canonical_filler(filler_list if filler_list is not None else filler))
+
     '''
     CHECKERS
     '''
 
+    def __contains__(self, frame) -> bool:
+        return frame in self.abstractions
+
     def is_abstraction(self, abstraction, specialization):
         if abstraction == specialization:
             return True
 
-        if abstraction in self.abstractions and specialization in self.abstractions:
-            return nx.has_path(self.abstractions, specialization, abstraction)
-        else:
-            return False
+        return self.reachability.is_reachable(specialization, abstraction)
 
     def is_mop(self, frame):
-        return nx.get_node_attributes(self.abstractions, self.attribute_frame_type)[frame] == self.type_mop
+        return self.abstractions.nodes[frame][self.attribute_frame_type] == self.type_mop
 
     def is_instance(self, frame):
-        return nx.get_node_attributes(self.abstractions, self.attribute_frame_type)[frame] == self.type_instance
+        return self.abstractions.nodes[frame][self.attribute_frame_type] == self.type_instance
 
     # def has_slot(self, instance, role, filler):
     #     self.is_abstraction(filler, self.inherit_filler(instance, role))
@@ -119,7 +244,7 @@ class MOPs:
 
     def get_frame_label(self, frame):
         if frame in self.abstractions:
-            return nx.get_node_attributes(self.abstractions, self.attribute_label)[frame]
+            return self.abstractions.nodes[frame][self.attribute_label]
 
     def get_edge_label(self, u, v):
         if self.slots.has_edge(u, v):
@@ -134,6 +259,38 @@ class MOPs:
 
         return full_graph
 
+    def get_ego_graph(self, center, radius: int = 1) -> nx.MultiDiGraph:
+        """
+        Like get_full_graph, but only for the frames near center. Only those frames are visited.
+        :param center: Frame at the center
+        :param radius: Number of hops from center, along abstractions and slots in either direction
+        :return: The frames within radius hops of center and the edges between them
+        :exception ValueError: If center isn't a frame
+        """
+        if center not in self.abstractions and center not in self.slots:
+            raise ValueError("Unknown frame %s" % center)
+
+        distances = {center: 0}
+        queue = deque([center])
+        while queue:
+            frame = queue.popleft()
+            if distances[frame] >= radius:
+                continue
+            for graph in (self.abstractions, self.slots):
+                if frame in graph:
+                    for neighbor in (*graph.successors(frame), *graph.predecessors(frame)):
+                        if neighbor not in distances:
+                            distances[neighbor] = distances[frame] + 1
+                            queue.append(neighbor)
+
+        ego_graph = nx.MultiDiGraph()
+        ego_graph.add_nodes_from((frame, self.abstractions.nodes[frame] if frame in self.abstractions
+                                  else self.slots.nodes[frame]) for frame in distances)
+        ego_graph.add_edges_from(self.abstractions.subgraph(distances).edges)
+        ego_graph.add_edges_from(self.slots.subgraph(distances).edges(keys=True, data=True))
+
+        return ego_graph
+
     # def get_instances(self, abstraction, slots):
     #     if self.is_instance(abstraction) and self.has_slots(abstraction, slots):
     #         return list(abstraction)
@@ -157,20 +314,153 @@ class MOPs:
     def clear_frames(self):
         self.abstractions.clear()
         self.slots.clear()
+        self.reachability.clear()
+
+    '''
+    EXPORTING
+    '''
+
+    def export_graph(self, path: str, graph_format: str = None) -> None:
+        """
+        Write the abstractions and slots to a file as they are read, without building the full graph. Abstractions are
+        written as edges of type abstraction and slots as edges of type slot, keyed by their role.
+        :param path: File to write. Compressed with gzip if it ends in .gz
+        :param graph_format: graphml, gexf or edgelist. Defaults to the extension of path
+        :return: None
+        """
+        if graph_format is None:
+            graph_format = path[:-3] if path.endswith(".gz") else path
+            graph_format = graph_format.rsplit(".", 1)[-1]
+        writers = {"graphml": self.write_graphml, "gexf": self.write_gexf, "edgelist": self.write_edge_list,
+                   "tsv": self.write_edge_list}
+        if graph_format not in writers:
+            raise ValueError("Unknown graph format %s" % graph_format)
+
+        with (gzip.open(path, "wt", encoding="utf-8") if path.endswith(".gz")
+              else open(path, "w", encoding="utf-8")) as f:
+            writers[graph_format](f)
+
+    def iterate_export_nodes(self) -> Iterator[Tuple[Hashable, Dict]]:
+        """
+        :return: Frames with their attributes, followed by the slot fillers that aren't frames
+        """
+        yield from self.abstractions.nodes(data=True)
+        for node, data in self.slots.nodes(data=True):
+            if node not in self.abstractions:
+                yield node, data
+
+    def iterate_export_edges(self) -> Iterator[Tuple[Hashable, Hashable, Dict]]:
+        """
+        :return: Abstraction and slot edges with their type, role and label
+        """
+        for frame, abstraction in self.abstractions.edges:
+            yield frame, abstraction, {"type": "abstraction"}
+        for frame, filler, role, data in self.slots.edges(keys=True, data=True):
+            yield frame, filler, {"type": "slot", "role": role, self.attribute_label: data.get(self.attribute_label)}
+
+    def get_export_node_attributes(self) -> List[str]:
+        return list(dict.fromkeys([self.attribute_label, self.attribute_frame_type, "list",
+                                   *self.special_node_attributes.values()]))
+
+    def write_graphml(self, f: TextIO) -> None:
+        node_attributes = self.get_export_node_attributes()
+        edge_attributes = ["type", "role", self.attribute_label]
+
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for i, name in enumerate(node_attributes):
+            f.write('<key id="n%d" for="node" attr.name=%s attr.type="string"/>\n' % (i, quoteattr(str(name))))
+        for i, name in enumerate(edge_attributes):
+            f.write('<key id="e%d" for="edge" attr.name=%s attr.type="string"/>\n' % (i, quoteattr(str(name))))
+        f.write('<graph edgedefault="directed">\n')
+
+        for node, data in self.iterate_export_nodes():
+            f.write('<node id=%s>' % quoteattr(str(node)))
+            for i, name in enumerate(node_attributes):
+                if data.get(name) is not None:
+                    f.write('<data key="n%d">%s</data>' % (i, escape(str(data[name]))))
+            f.write('</node>\n')
+        for u, v, data in self.iterate_export_edges():
+            f.write('<edge source=%s target=%s>' % (quoteattr(str(u)), quoteattr(str(v))))
+            for i, name in enumerate(edge_attributes):
+                if data.get(name) is not None:
+                    f.write('<data key="e%d">%s</data>' % (i, escape(str(data[name]))))
+            f.write('</edge>\n')
+
+        f.write('</graph>\n</graphml>\n')
+
+    def write_gexf(self, f: TextIO) -> None:
+        node_attributes = [name for name in self.get_export_node_attributes() if name != self.attribute_label]
+        edge_attributes = ["type", "role"]
+
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gexf xmlns="http://gexf.net/1.3" version="1.3">\n'
+                '<graph defaultedgetype="directed" mode="static">\n')
+        for cls, names in (("node", node_attributes), ("edge", edge_attributes)):
+            f.write('<attributes class="%s">\n' % cls)
+            for i, name in enumerate(names):
+                f.write('<attribute id="%d" title=%s type="string"/>\n' % (i, quoteattr(str(name))))
+            f.write('</attributes>\n')
+
+        f.write('<nodes>\n')
+        for node, data in self.iterate_export_nodes():
+            label = data.get(self.attribute_label)
+            f.write('<node id=%s label=%s>' % (quoteattr(str(node)), quoteattr(str(node if label is None else label))))
+            self.write_gexf_attributes(f, node_attributes, data)
+            f.write('</node>\n')
+        f.write('</nodes>\n<edges>\n')
+        for i, (u, v, data) in enumerate(self.iterate_export_edges()):
+            label = data.get(self.attribute_label)
+            f.write('<edge id="%d" source=%s target=%s' % (i, quoteattr(str(u)), quoteattr(str(v))))
+            if label is not None:
+                f.write(' label=%s' % quoteattr(str(label)))
+            f.write('>')
+            self.write_gexf_attributes(f, edge_attributes, data)
+            f.write('</edge>\n')
+        f.write('</edges>\n</graph>\n</gexf>\n')
+
+    @staticmethod
+    def write_gexf_attributes(f: TextIO, names: List[str], data: Dict) -> None:
+        f.write('<attvalues>')
+        for i, name in enumerate(names):
+            if data.get(name) is not None:
+                f.write('<attvalue for="%d" value=%s/>' % (i, quoteattr(str(data[name]))))
+        f.write('</attvalues>')
+
+    def write_edge_list(self, f: TextIO) -> None:
+        """
+        Write one tab separated line per edge: source, target, type, role and label. Frames without edges are left out.
+        """
+        for u, v, data in self.iterate_export_edges():
+            f.write("\t".join("" if value is None else str(value).replace("\t", " ").replace("\n", " ")
+                              for value in (u, v, data["type"], data.get("role"), data.get(self.attribute_label))))
+            f.write("\n")
 
     '''
     DRAWING
     '''
 
-    def draw_mops(self, image_dir: str, layout: Callable = nx.spring_layout, size: float = None):
+    def draw_mops(self, image_dir: str, layout: Callable = nx.spring_layout, size: float = None, center=None,
+                  radius: int = 1):
+        """
+        Draw the full graph, abstraction hierarchy and slot graph. Layouts and drawing don't scale past a few hundred
+        frames, so give center to draw only the ego graph around a frame, or use export_graph for bigger graphs.
+        :param center: Only draw the frames within radius hops of this frame
+        :param radius: Number of hops from center, along abstractions and slots in either direction
+        """
         self.log.debug("Drawing Mops")
-        full_graph = self.get_full_graph()
+        if center is None:
+            full_graph = self.get_full_graph()
+            abstractions, slots = self.abstractions, self.slots
+        else:
+            full_graph = self.get_ego_graph(center, radius)
+            abstractions, slots = self.abstractions.subgraph(full_graph), self.slots.subgraph(full_graph)
 
         pos = layout(full_graph)
 
         self.draw_graph(full_graph, pos, "%s/full_graph.png" % image_dir, size=size)
-        self.draw_graph(self.abstractions, pos, "%s/abstraction_hierarchy.png" % image_dir, size=size)
-        self.draw_graph(self.slots, pos, "%s/slot_graph.png" % image_dir, size=size)
+        self.draw_graph(abstractions, pos, "%s/abstraction_hierarchy.png" % image_dir, size=size)
+        self.draw_graph(slots, pos, "%s/slot_graph.png" % image_dir, size=size)
 
     def draw_graph(self, G: nx.Graph, pos, out_loc: str, size: float = None, node_labels=None, edge_labels=None):
         if G.nodes:
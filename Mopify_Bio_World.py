@@ -1,20 +1,110 @@
 import logging
+import multiprocessing
+import os
+import pickle
 import sys
+from typing import Dict, List, Tuple
 
+from franz.openrdf.model import Value
+
+from EquivalentClasses import EquivalentClasses
 from KaBOBInterface import KaBOBInterface
+from MOPs import MOPs
 
 log = logging.getLogger('mopify_kabob_world')
 
+CREDENTIALS_FILE = "KaBOB_credentials.txt"
+
+
+def mopify_bio_world(pickle_dir, num_nodes=None, cache_every_iter=10000):
+    # Progress is journaled in pickle_dir, so running this again picks up after the last mopified node
+    with KaBOBInterface(CREDENTIALS_FILE, cache_dir=pickle_dir) as interface:
+
+        interface.load_restriction_index()
+        # Nodes are mopified as they stream in rather than after the whole bio world has been read
+        bio_world = interface.iterate_bio_world()
+        interface.mopify_and_cache(bio_world, cache_every_iter=cache_every_iter, number_of_nodes_to_mopify=num_nodes)
+
 
-def mopify_bio_world(pickle_dir, num_nodes=None):
-    with KaBOBInterface("KaBOB_credentials.txt", cache_dir=pickle_dir) as interface:
+def mopify_bio_world_sharded(pickle_dir, num_nodes=None, shards=None, cache_every_iter=10000):
+    """
+    Mopify the bio world with a process per shard. Bio world nodes are dealt round robin to the shards, and each shard is
+    mopified with its own connection and cache directory under pickle_dir, so rerunning with the same arguments resumes
+    every shard. The shards are merged into pickle_dir once they have all finished. The bio world and restriction index
+    are read once, with a cache directory of their own so that the mops being merged into pickle_dir aren't loaded.
+    :param pickle_dir: Cache directory
+    :param num_nodes: Number of bio world nodes to mopify. All of them if None
+    :param shards: Number of worker processes. Defaults to the number of CPUs
+    :param cache_every_iter: Number of nodes between snapshots of each shard
+    :return: The merged mops and equivalent classes
+    """
+    shards = shards or os.cpu_count()
 
+    coordinator_dir = "%s/coordinator" % pickle_dir
+    os.makedirs(coordinator_dir, exist_ok=True)
+    with KaBOBInterface(CREDENTIALS_FILE, cache_dir=coordinator_dir) as interface:
+        interface.load_restriction_index()
+        restrictions = interface.restrictions
         bio_world = interface.get_bio_world()
-        interface.mopify_and_cache(bio_world, number_of_nodes_to_mopify=num_nodes)
+    if num_nodes is not None:
+        bio_world = bio_world[:num_nodes]
+
+    shard_dirs = ["%s/shard_%d" % (pickle_dir, shard) for shard in range(shards)]
+    for shard_dir in shard_dirs:
+        os.makedirs(shard_dir, exist_ok=True)
+
+    log.info("Mopifying %d nodes in %d shards" % (len(bio_world), shards))
+    # Shards reuse the restriction index instead of each collecting it again
+    with multiprocessing.Pool(shards) as pool:
+        pool.map(mopify_shard, [(shard_dir, bio_world[shard::shards], cache_every_iter, restrictions)
+                                for shard, shard_dir in enumerate(shard_dirs)])
+
+    return merge_shards(pickle_dir, shard_dirs)
+
+
+def mopify_shard(shard: Tuple[str, list, int, Dict[Value, Tuple[Value, Value]]]) -> None:
+    shard_dir, nodes, cache_every_iter, restrictions = shard
+    with KaBOBInterface(CREDENTIALS_FILE, cache_dir=shard_dir) as interface:
+        interface.load_restriction_index(restrictions)
+        interface.mopify_and_cache(nodes, cache_every_iter=cache_every_iter)
+
+
+def merge_shards(pickle_dir: str, shard_dirs: List[str]) -> Tuple[MOPs, EquivalentClasses]:
+    """
+    Merge the mops and equivalent classes cached in each shard directory, in order, and cache the result in pickle_dir.
+    Equivalent classes are unified first so that a frame mopified under different representatives in different
+    shards becomes a single frame. Where shards disagree, the earlier shard wins, so the result only depends on the
+    order of shard_dirs.
+    :param pickle_dir: Directory to cache the merged mops and equivalent classes in
+    :param shard_dirs: Cache directories of the shards
+    :return: The merged mops and equivalent classes
+    """
+    equivalent_classes = EquivalentClasses()
+    for shard_dir in shard_dirs:
+        with open("%s/equivalent_classes.pickle" % shard_dir, "rb") as f:
+            equivalent_classes.merge(EquivalentClasses.from_dict(pickle.load(f)))
+
+    mops = MOPs()
+    for shard_dir in shard_dirs:
+        log.info("Merging %s" % shard_dir)
+        with open("%s/mops.pickle" % shard_dir, "rb") as f:
+            mops.merge(pickle.load(f), canonical=equivalent_classes.canonical)
+
+    with open("%s/equivalent_classes.pickle" % pickle_dir, "wb") as f:
+        pickle.dump(equivalent_classes.to_dict(), f)
+    with open("%s/mops.pickle" % pickle_dir, "wb") as f:
+        pickle.dump(mops, f)
+
+    return mops, equivalent_classes
 
 
 if __name__ == "__main__":
-    if len(sys.argv) == 3:
+    number_of_shards = 1
+    if len(sys.argv) == 4:
+        pickle_folder = sys.argv[1]
+        val = int(sys.argv[2])
+        number_of_shards = int(sys.argv[3])
+    elif len(sys.argv) == 3:
         pickle_folder = sys.argv[1]
         val = int(sys.argv[2])
     else:
@@ -24,4 +114,7 @@ if __name__ == "__main__":
             val = 1000
         pickle_folder = "E:/Documents/KaBOB/pickles"
 
-    mopify_bio_world(pickle_folder, num_nodes=val)
+    if number_of_shards > 1:
+        mopify_bio_world_sharded(pickle_folder, num_nodes=val, shards=number_of_shards)
+    else:
+        mopify_bio_world(pickle_folder, num_nodes=val)
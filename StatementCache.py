@@ -0,0 +1,474 @@
+import copyreg
+import logging
+import pickle
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, List, Iterable, Set, Tuple
+
+from franz.openrdf.model import Statement, URI, Value
+from franz.openrdf.model.utils import parse_term
+
+
+def reduce_uri(uri: URI):
+    return URI, (uri.getURI(),)
+
+
+# URIs can't be unpickled through their default reduction because URI.__new__ requires the URI string. The reduction is
+# registered for the whole process when this module is imported, since mops and other caches pickled alongside the
+# statement cache hold URIs too
+copyreg.pickle(URI, reduce_uri)
+
+
+def set_db_release(db: sqlite3.Connection, release: str or None, tables: List[str], log: logging.Logger) -> None:
+    """
+    Empty tables unless they were written for release, and record release as the one they now hold. They are always
+    emptied if the release isn't known
+    """
+    db.execute("CREATE TABLE IF NOT EXISTS release (release TEXT)")
+    row = db.execute("SELECT release FROM release").fetchone()
+    if release is not None and row is not None and row[0] == release:
+        return
+    if row is not None:
+        log.warning("Discarding %s for release %s" % (", ".join(tables), row[0]))
+    for table in tables + ["release"]:
+        db.execute("DELETE FROM %s" % table)
+    if release is not None:
+        db.execute("INSERT INTO release (release) VALUES (?)", (release,))
+    db.commit()
+
+
+class SQLiteStatementCache:
+    """
+    Persistent statement cache keyed by subject. Entries are read from disk only when they are looked up and new entries
+    are written as they are added, so opening the cache costs the same no matter how large it has grown.
+    """
+    log = logging.getLogger('SQLiteStatementCache')
+
+    def __init__(self, path: str, commit_every: int = 1000):
+        """
+        :param path: SQLite database file. Created if it doesn't exist
+        :param commit_every: Number of writes between commits
+        """
+        self.path = path
+        self.commit_every = commit_every
+        self.uncommitted = 0
+
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS statements (subject TEXT PRIMARY KEY, statements BLOB)")
+
+    """
+    MAPPING
+    """
+
+    def __contains__(self, subject: Value) -> bool:
+        return self.db.execute("SELECT 1 FROM statements WHERE subject = ?", (str(subject),)).fetchone() is not None
+
+    def __getitem__(self, subject: Value) -> List[Statement]:
+        statements = self.get(subject)
+        if statements is None:
+            raise KeyError(subject)
+        return statements
+
+    def __setitem__(self, subject: Value, statements: List[Statement]) -> None:
+        self.update([(subject, statements)])
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM statements").fetchone()[0]
+
+    def is_empty(self) -> bool:
+        return self.db.execute("SELECT 1 FROM statements LIMIT 1").fetchone() is None
+
+    def get(self, subject: Value, default=None) -> List[Statement] or None:
+        row = self.db.execute("SELECT statements FROM statements WHERE subject = ?", (str(subject),)).fetchone()
+        return self.decode(row[0]) if row else default
+
+    def update(self, items: Dict[Value, List[Statement]] or Iterable[Tuple[Value, List[Statement]]]) -> None:
+        if isinstance(items, dict):
+            items = items.items()
+        rows = [(str(subject), self.encode(statements)) for subject, statements in items]
+        self.db.executemany("INSERT OR REPLACE INTO statements (subject, statements) VALUES (?, ?)", rows)
+
+        self.uncommitted += len(rows)
+        if self.uncommitted >= self.commit_every:
+            self.commit()
+
+    """
+    SERIALIZATION
+    """
+
+    @staticmethod
+    def encode(statements: List[Statement]) -> bytes:
+        # Terms are stored in N-Triples form. Statements parse them lazily when they are read back.
+        return pickle.dumps([tuple(None if term is None else str(term) for term in
+                                   (statement.getSubject(), statement.getPredicate(), statement.getObject(),
+                                    statement.getContext()))
+                             for statement in statements], protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def decode(blob: bytes) -> List[Statement]:
+        return [Statement(*terms) for terms in pickle.loads(blob)]
+
+    """
+    PERSISTENCE
+    """
+
+    def commit(self) -> None:
+        self.db.commit()
+        self.uncommitted = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.db.close()
+
+
+class LRUStatementCache:
+    """
+    In-memory cache of get_statements results for every (s, p, o) pattern. It is bounded both by the number of patterns
+    and by the total number of statements held, evicting the least recently used patterns first. Statements cached for a
+    subject also answer the subject's more specific patterns. Subject patterns that are evicted or missed can fall back
+    on a persistent backing cache such as SQLiteStatementCache. Subjects with more statements than the cache can hold are
+    answered from the backing cache every time, and counted as bypasses rather than hits.
+    """
+    log = logging.getLogger('LRUStatementCache')
+
+    def __init__(self, max_entries: int = 100000, max_statements: int = 2000000,
+                 backing: SQLiteStatementCache = None):
+        """
+        :param max_entries: Maximum number of patterns to hold
+        :param max_statements: Maximum number of statements to hold across all patterns
+        :param backing: Persistent cache for the statements of whole subjects
+        """
+        self.max_entries = max_entries
+        self.max_statements = max_statements
+        self.backing = backing
+
+        self.entries: OrderedDict = OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.backing_hits = 0
+        self.bypasses = 0
+        self.misses = 0
+        self.evictions = 0
+
+    """
+    LOOKUP
+    """
+
+    def get(self, s: Value = None, p: Value = None, o: Value = None) -> List[Statement] or None:
+        """
+        :return: The cached statements matching the pattern or None if they aren't cached
+        """
+        statements = self._lookup(s, p, o)
+        if statements is not None:
+            self.hits += 1
+            return statements
+
+        if s is not None and self.backing is not None:
+            subject_statements = self.backing.get(s)
+            if subject_statements is not None:
+                if len(subject_statements) > self.max_statements:
+                    self.bypasses += 1
+                    return self.match(subject_statements, p, o)
+                self.backing_hits += 1
+                self._put((s, None, None), subject_statements)
+                return self._lookup(s, p, o)
+
+        self.misses += 1
+        return None
+
+    def _lookup(self, s: Value, p: Value, o: Value) -> List[Statement] or None:
+        statements = self._get((s, p, o))
+        if statements is None and s is not None and (p is not None or o is not None):
+            subject_statements = self._get((s, None, None))
+            if subject_statements is not None:
+                statements = self.match(subject_statements, p, o)
+        return statements
+
+    @staticmethod
+    def match(statements: List[Statement], p: Value, o: Value) -> List[Statement]:
+        """
+        :return: The statements with predicate p and object o. Either may be None to match any
+        """
+        if p is None and o is None:
+            return statements
+        return [statement for statement in statements
+                if (p is None or statement.getPredicate() == p) and (o is None or statement.getObject() == o)]
+
+    def _get(self, pattern: Tuple[Value, Value, Value]) -> List[Statement] or None:
+        statements = self.entries.get(pattern)
+        if statements is not None:
+            self.entries.move_to_end(pattern)
+        return statements
+
+    def __contains__(self, subject: Value) -> bool:
+        return (subject, None, None) in self.entries or (self.backing is not None and subject in self.backing)
+
+    """
+    INSERTION
+    """
+
+    def put(self, s: Value, p: Value, o: Value, statements: List[Statement]) -> None:
+        self._put((s, p, o), statements)
+        if s is not None and p is None and o is None and self.backing is not None:
+            self.backing[s] = statements
+
+    def update(self, subject_statements: Dict[Value, List[Statement]]) -> None:
+        """
+        Cache the statements of many subjects at once
+        :param subject_statements: Statements keyed by subject
+        :return: None
+        """
+        for subject, statements in subject_statements.items():
+            self._put((subject, None, None), statements)
+        if self.backing is not None:
+            self.backing.update(subject_statements)
+
+    def _put(self, pattern: Tuple[Value, Value, Value], statements: List[Statement]) -> None:
+        if len(statements) > self.max_statements:
+            return
+
+        previous = self.entries.pop(pattern, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self.entries[pattern] = statements
+        self.size += len(statements)
+
+        while len(self.entries) > self.max_entries or self.size > self.max_statements:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    """
+    STATISTICS
+    """
+
+    def get_statistics(self) -> Dict[str, int or float]:
+        lookups = self.hits + self.backing_hits + self.bypasses + self.misses
+        return {"entries": len(self.entries),
+                "statements": self.size,
+                "hits": self.hits,
+                "backing_hits": self.backing_hits,
+                "bypasses": self.bypasses,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.backing_hits) / lookups if lookups else 0.0}
+
+    """
+    PERSISTENCE
+    """
+
+    def commit(self) -> None:
+        if self.backing is not None:
+            self.backing.commit()
+
+    def close(self) -> None:
+        if self.backing is not None:
+            self.backing.close()
+
+
+class LabelCache:
+    """
+    Labels resolved for nodes. When given a path, labels are also written to SQLite as they are added and read back on
+    demand, so they persist across sessions, along with the KaBOB release they were read from.
+    """
+    log = logging.getLogger('LabelCache')
+
+    def __init__(self, path: str = None, commit_every: int = 1000):
+        """
+        :param path: SQLite database file. If None, labels are only kept in memory
+        :param commit_every: Number of writes between commits
+        """
+        self.labels: Dict[Value, str] = dict()
+        self.commit_every = commit_every
+        self.uncommitted = 0
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS labels (node TEXT PRIMARY KEY, label TEXT)")
+
+    def set_release(self, release: str or None) -> None:
+        """
+        Discard the persisted labels if they were read from another KaBOB release. If the release isn't known, the labels
+        are emptied and only kept in memory from then on, since there would be no telling whether they are still current.
+        """
+        if self.db is None:
+            return
+        self.commit()
+        set_db_release(self.db, release, ["labels"], self.log)
+        self.labels.clear()
+        if release is None:
+            self.db.close()
+            self.db = None
+
+    def __contains__(self, node: Value) -> bool:
+        return self.get(node) is not None
+
+    def __setitem__(self, node: Value, label: str) -> None:
+        self.labels[node] = label
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO labels (node, label) VALUES (?, ?)", (str(node), label))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_every:
+                self.commit()
+
+    def get(self, node: Value, default=None) -> str or None:
+        label = self.labels.get(node)
+        if label is None and self.db is not None:
+            row = self.db.execute("SELECT label FROM labels WHERE node = ?", (str(node),)).fetchone()
+            if row:
+                label = self.labels[node] = row[0]
+        return default if label is None else label
+
+    def commit(self) -> None:
+        if self.db is not None:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def close(self) -> None:
+        if self.db is not None:
+            self.commit()
+            self.db.close()
+
+
+class QueryResultCache:
+    """
+    Rows of query results keyed by a query's cache key. When given a path, results are also written to SQLite so they
+    persist across sessions.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        :param path: SQLite database file. If None, results are only kept in memory
+        """
+        self.results: Dict[str, List[Tuple[Value, ...]]] = dict()
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, rows BLOB)")
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __setitem__(self, key: str, rows: List[Tuple[Value, ...]]) -> None:
+        self.results[key] = rows
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO results (key, rows) VALUES (?, ?)", (key, self.encode(rows)))
+            self.db.commit()
+
+    def get(self, key: str, default=None) -> List[Tuple[Value, ...]] or None:
+        rows = self.results.get(key)
+        if rows is None and self.db is not None:
+            row = self.db.execute("SELECT rows FROM results WHERE key = ?", (key,)).fetchone()
+            if row:
+                rows = self.results[key] = self.decode(row[0])
+        return default if rows is None else rows
+
+    @staticmethod
+    def encode(rows: List[Tuple[Value, ...]]) -> bytes:
+        return pickle.dumps([tuple(None if value is None else str(value) for value in row) for row in rows],
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def decode(blob: bytes) -> List[Tuple[Value, ...]]:
+        return [tuple(None if value is None else parse_term(value) for value in row) for row in pickle.loads(blob)]
+
+    def close(self) -> None:
+        if self.db is not None:
+            self.db.close()
+
+
+class DenotesIndex:
+    """
+    Two way index of denotes statements between ICE nodes and the nodes they denote. A node is complete once all of its
+    denotes statements are in the index: those with it as the subject for an ICE node, and those with it as the object
+    otherwise. When given a path, the index is also written to SQLite so it persists across sessions, along with the KaBOB
+    release it was read from.
+    """
+    log = logging.getLogger('DenotesIndex')
+
+    def __init__(self, path: str = None):
+        """
+        :param path: SQLite database file. If None, the index is only kept in memory
+        """
+        self.denoted: Dict[Value, Set[Value]] = dict()
+        self.denoters: Dict[Value, Set[Value]] = dict()
+        self.complete: Set[Value] = set()
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS denotes (ice TEXT, node TEXT, PRIMARY KEY (ice, node))")
+            self.db.execute("CREATE INDEX IF NOT EXISTS denotes_node ON denotes (node)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS complete (node TEXT PRIMARY KEY)")
+
+    def set_release(self, release: str or None) -> None:
+        """
+        Discard the persisted index if it was read from another KaBOB release. If the release isn't known, the index
+        is emptied and only kept in memory from then on, since there would be no telling whether it is still current.
+        """
+        if self.db is None:
+            return
+        set_db_release(self.db, release, ["denotes", "complete"], self.log)
+        if release is None:
+            self.db.close()
+            self.db = None
+
+    def add(self, ice: Value, node: Value) -> None:
+        self.denoted.setdefault(ice, set()).add(node)
+        self.denoters.setdefault(node, set()).add(ice)
+        if self.db is not None:
+            self.db.execute("INSERT OR IGNORE INTO denotes (ice, node) VALUES (?, ?)", (str(ice), str(node)))
+
+    def set_complete(self, nodes: Iterable[Value]) -> None:
+        """
+        Mark nodes as having all of their denotes statements in the index
+        """
+        nodes = [node for node in nodes if node not in self.complete]
+        self.complete.update(nodes)
+        if self.db is not None:
+            self.db.executemany("INSERT OR IGNORE INTO complete (node) VALUES (?)", ((str(node),) for node in nodes))
+            self.db.commit()
+
+    def is_complete(self, node: Value) -> bool:
+        self.ensure_loaded(node)
+        return node in self.complete
+
+    def ensure_loaded(self, node: Value) -> None:
+        """
+        Read the statements of node back from SQLite if all of them were saved there and they haven't been read yet
+        """
+        if node in self.complete or self.db is None:
+            return
+        if self.db.execute("SELECT 1 FROM complete WHERE node = ?", (str(node),)).fetchone():
+            self.complete.add(node)
+            self.load(node)
+
+    def load(self, node: Value) -> None:
+        """
+        Read the statements of node back from SQLite
+        """
+        for ice, denoted in self.db.execute("SELECT ice, node FROM denotes WHERE ice = ? OR node = ?",
+                                            (str(node), str(node))):
+            ice, denoted = parse_term(ice), parse_term(denoted)
+            self.denoted.setdefault(ice, set()).add(denoted)
+            self.denoters.setdefault(denoted, set()).add(ice)
+
+    def get_denoted(self, ice: Value) -> Set[Value]:
+        """
+        :return: The nodes ice denotes
+        """
+        return self.denoted.get(ice, set())
+
+    def get_denoters(self, node: Value) -> Set[Value]:
+        """
+        :return: The ICE nodes that denote node
+        """
+        return self.denoters.get(node, set())
+
+    def close(self) -> None:
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
@@ -0,0 +1,174 @@
+import gzip
+import random
+from itertools import count
+from typing import Iterator, List, Tuple
+
+from franz.openrdf.model import Literal, URI, Value
+from franz.openrdf.vocabulary import OWL, RDF, RDFS
+
+from TripleStore import LocalTripleStore
+
+BIO = "http://ccp.ucdenver.edu/kabob/bio/"
+ICE = "http://ccp.ucdenver.edu/kabob/ice/"
+OBO = "http://purl.obolibrary.org/obo/"
+CCP_BNODE = "http://ccp.ucdenver.edu/bnode/"
+
+DENOTES = URI(OBO + "IAO_0000219")
+DRUGBANK_IDENTIFIER = URI("http://ccp.ucdenver.edu/obo/ext/IAO_EXT_0001309")
+BINDING = "GO_0005488"
+HAS_PARTICIPANT = "RO_0000057"
+INHERES_IN = "RO_0000052"
+# Relations KaBOBInterface looks up by name, followed by ones only used in restrictions
+RELATIONS = [HAS_PARTICIPANT, INHERES_IN, "RO_0002160", "BFO_0000050", "BFO_0000051", "RO_0002313", "RO_0003302"]
+
+
+class SyntheticKaBOB:
+    """
+    Generates statements shaped like KaBOB's at a chosen scale, so that mopification and queries can be tested and
+    timed without a KaBOB server. Every bio world class and relation is denoted by an ICE node, which also denotes the
+    OBO node it stands for. Classes have labels, subclass axioms to earlier classes, OWL restrictions on the relations,
+    and some have equivalent classes and RDF list slots. Drugs bind protein targets through binding interactions, as
+    KaBOBInterface.make_drug_targets_query expects. The same parameters and seed always give the same statements.
+    """
+
+    def __init__(self, classes: int = 1000, relations: int = 10, proteins: int = 100, drugs: int = 20,
+                 parents: int = 2, restrictions: int = 2, targets: int = 3, equivalent_fraction: float = 0.05,
+                 list_fraction: float = 0.05, list_length: int = 5, seed: int = 0):
+        """
+        :param classes: Number of bio world classes
+        :param relations: Number of relations, at least the ones KaBOBInterface looks up
+        :param proteins: Number of proteins, which are classes drugs can target
+        :param drugs: Number of DrugBank drugs
+        :param parents: Most superclasses per class
+        :param restrictions: Most restrictions per class
+        :param targets: Most targets per drug
+        :param equivalent_fraction: Fraction of classes with an equivalent class
+        :param list_fraction: Fraction of classes with an RDF list slot
+        :param list_length: Length of each RDF list
+        :param seed: Random seed
+        """
+        self.classes = classes
+        self.relation_names = RELATIONS + ["RO_9%06d" % i for i in range(max(0, relations - len(RELATIONS)))]
+        self.proteins = proteins
+        self.drugs = drugs
+        self.parents = parents
+        self.restrictions = restrictions
+        self.targets = targets
+        self.equivalent_fraction = equivalent_fraction
+        self.list_fraction = list_fraction
+        self.list_length = list_length
+        self.seed = seed
+
+    """
+    NODES
+    """
+
+    @staticmethod
+    def get_class(i: int) -> URI:
+        return URI(BIO + "class_%d" % i)
+
+    @staticmethod
+    def get_protein(i: int) -> URI:
+        return URI(BIO + "protein_%d" % i)
+
+    @staticmethod
+    def get_drug(i: int) -> URI:
+        return URI(BIO + "drug_%d" % i)
+
+    @staticmethod
+    def get_drugbank_id(i: int) -> str:
+        return "DB%05d" % i
+
+    def get_classes(self) -> List[URI]:
+        return [self.get_class(i) for i in range(self.classes)]
+
+    def get_relations(self) -> List[URI]:
+        return [URI(BIO + name) for name in self.relation_names]
+
+    """
+    STATEMENTS
+    """
+
+    def generate(self) -> Iterator[Tuple[Value, URI, Value]]:
+        """
+        :return: Subject, predicate and object of each statement
+        """
+        rng = random.Random(self.seed)
+        relations = self.get_relations()
+        bnodes = count()
+
+        def restriction(on_property: URI, some_values_from: Value) -> Iterator[Tuple[Value, URI, Value]]:
+            node = URI(CCP_BNODE + "restriction_%d" % next(bnodes))
+            yield node, RDF.TYPE, OWL.RESTRICTION
+            yield node, OWL.ONPROPERTY, on_property
+            yield node, OWL.SOMEVALUESFROM, some_values_from
+            return node
+
+        def denoted(name: str, label: str) -> Iterator[Tuple[Value, URI, Value]]:
+            yield URI(ICE + name), DENOTES, URI(OBO + name)
+            yield URI(ICE + name), DENOTES, URI(BIO + name)
+            yield URI(BIO + name), RDFS.LABEL, Literal(label)
+
+        for name in self.relation_names + [BINDING]:
+            yield from denoted(name, name.lower().replace("_", " "))
+
+        for i in range(self.classes):
+            cls = self.get_class(i)
+            yield URI(ICE + "CLASS_%d" % i), DENOTES, cls
+            yield cls, RDFS.LABEL, Literal("class %d" % i)
+            for parent in rng.sample(range(i), min(i, rng.randint(1, self.parents))):
+                yield cls, RDFS.SUBCLASSOF, self.get_class(parent)
+            for _ in range(rng.randint(0, self.restrictions)):
+                node = yield from restriction(rng.choice(relations), self.get_class(rng.randrange(self.classes)))
+                yield cls, RDFS.SUBCLASSOF, node
+            if i and rng.random() < self.equivalent_fraction:
+                yield cls, OWL.EQUIVALENTCLASS, self.get_class(rng.randrange(i))
+            if rng.random() < self.list_fraction:
+                cells = [URI(CCP_BNODE + "list_%d" % next(bnodes)) for _ in range(self.list_length)]
+                yield cls, rng.choice(relations), cells[0]
+                yield cells[0], RDF.TYPE, RDF.LIST
+                for j, cell in enumerate(cells):
+                    yield cell, RDF.FIRST, self.get_class(rng.randrange(self.classes))
+                    yield cell, RDF.REST, cells[j + 1] if j + 1 < len(cells) else RDF.NIL
+
+        for i in range(self.proteins):
+            protein = self.get_protein(i)
+            yield URI(ICE + "PR_%d" % i), DENOTES, protein
+            yield protein, RDFS.LABEL, Literal("protein %d" % i)
+            yield protein, RDFS.SUBCLASSOF, self.get_class(rng.randrange(self.classes))
+            yield URI(CCP_BNODE + "target_sc_%d" % i), RDFS.SUBCLASSOF, protein
+
+        has_participant, inheres_in = URI(BIO + HAS_PARTICIPANT), URI(BIO + INHERES_IN)
+        for i in range(self.drugs):
+            drug, drug_ice = self.get_drug(i), URI(ICE + "DRUGBANK_" + self.get_drugbank_id(i))
+            drug_sc = URI(CCP_BNODE + "drug_sc_%d" % i)
+            yield drug_ice, RDFS.SUBCLASSOF, DRUGBANK_IDENTIFIER
+            yield drug_ice, DENOTES, drug
+            yield drug, RDFS.LABEL, Literal("drug %d" % i)
+            yield drug_sc, RDFS.SUBCLASSOF, drug
+
+            inheres = URI(CCP_BNODE + "inheres_%d" % i)
+            node = yield from restriction(inheres_in, drug_sc)
+            yield inheres, RDFS.SUBCLASSOF, node
+            for target in rng.sample(range(self.proteins), min(self.proteins, rng.randint(1, self.targets))):
+                interaction = URI(CCP_BNODE + "interaction_%d_%d" % (i, target))
+                yield interaction, RDFS.SUBCLASSOF, URI(BIO + BINDING)
+                node = yield from restriction(has_participant, drug_sc)
+                yield interaction, RDFS.SUBCLASSOF, node
+                node = yield from restriction(has_participant, URI(CCP_BNODE + "target_sc_%d" % target))
+                yield interaction, RDFS.SUBCLASSOF, node
+
+    def to_store(self) -> LocalTripleStore:
+        store = LocalTripleStore()
+        for s, p, o in self.generate():
+            store.add(s, p, o)
+        return store
+
+    def write(self, path: str) -> None:
+        """
+        Write the statements as N-Triples, which LocalTripleStore can load. Compressed with gzip if path ends in .gz
+        """
+        with (gzip.open(path, "wt", encoding="utf-8") if path.endswith(".gz") else open(path, "w", encoding="utf-8")) \
+                as f:
+            for s, p, o in self.generate():
+                f.write("%s %s %s .\n" % (s, p, o))
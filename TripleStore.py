@@ -0,0 +1,560 @@
+import gzip
+import io
+import logging
+import queue
+import re
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, List, Iterable, Iterator, Set, Tuple
+
+from franz.openrdf.connect import ag_connect
+from franz.openrdf.model import Literal, Statement, URI, Value
+from franz.openrdf.model.utils import parse_term
+from franz.openrdf.model.valuefactory import ValueFactory
+from franz.openrdf.query.query import QueryLanguage
+from franz.openrdf.repository.repositoryconnection import RepositoryConnection
+from franz.openrdf.rio.rdfformat import RDFFormat
+from franz.openrdf.rio.tupleformat import TupleFormat
+from franz.openrdf.vocabulary import RDF, RDFS, OWL, XMLSchema
+
+ONCLASS = URI(namespace=OWL.NAMESPACE, localname="onClass")
+
+# An N-Triples or N-Quads statement
+NTRIPLES_TERM = r'(<[^>]*>|_:\S+|"(?:[^"\\]|\\.)*"(?:@[A-Za-z0-9\-]+|\^\^<[^>]*>)?)'
+NTRIPLES_LINE = re.compile(r'^\s*%s\s+%s\s+%s(?:\s+%s)?\s*\.\s*$' % ((NTRIPLES_TERM,) * 4))
+
+# Datatypes of the numbers and booleans that SPARQL TSV writes without quotes
+TSV_DATATYPES = [(re.compile(r"[+-]?\d+"), XMLSchema.INTEGER),
+                 (re.compile(r"[+-]?\d*\.\d+"), XMLSchema.DECIMAL),
+                 (re.compile(r"[+-]?(\d+\.?\d*|\.\d+)[eE][+-]?\d+"), XMLSchema.DOUBLE),
+                 (re.compile(r"true|false"), XMLSchema.BOOLEAN)]
+
+
+class TripleStore(ABC):
+    """
+    Source of the statements that an Interface mopifies
+    """
+    log = logging.getLogger('TripleStore')
+
+    # Number of subjects to ask for per get_statements_for_subjects call
+    statement_batch_size = 500
+    # Number of statements to ask for per page of iterate_statements
+    statement_page_size = 10000
+    # Number of solutions to ask for per page of iterate_query_pages
+    query_page_size = 10000
+    # Instrumentation.Statistics of the interface reading from the store, if any
+    stats = None
+    # KaBOB release the store holds, if known. Interfaces only persist release dependent caches when it is set
+    release: str = None
+
+    def __init__(self):
+        self.value_factory = ValueFactory(self)
+
+    def namespace(self, prefix: str):
+        return self.value_factory.namespace(prefix)
+
+    def createURI(self, uri=None, namespace=None, localname=None) -> URI:
+        return self.value_factory.createURI(uri=uri, namespace=namespace, localname=localname)
+
+    @abstractmethod
+    def get_statements(self, s: Value = None, p: URI = None, o: Value = None) -> List[Statement]:
+        pass
+
+    def iterate_statements(self, s: Value = None, p: URI = None, o: Value = None,
+                           page_size: int = None, offset: int = 0) -> Iterator[Statement]:
+        """
+        Iterate over the statements matching a pattern a page at a time, so that patterns matching millions of statements
+        are never held in memory all at once
+        :param page_size: Number of statements to fetch at a time. Defaults to statement_page_size
+        :param offset: Number of matching statements to skip
+        :return: The statements
+        """
+        return iter(self.get_statements(s=s, p=p, o=o)[offset:])
+
+    def get_statements_for_subjects(self, subjects: List[Value]) -> Dict[Value, List[Statement]]:
+        """
+        Get the statements for many subjects at once
+        :param subjects: Subjects to get statements for
+        :return: Statements keyed by subject. Every subject asked for has an entry
+        """
+        return {subject: self.get_statements(s=subject) for subject in subjects}
+
+    def get_labels_for_subjects(self, subjects: List[Value]) -> Dict[Value, List[str]]:
+        """
+        Get the rdfs:labels of many subjects at once
+        :param subjects: Subjects to get labels for
+        :return: Labels keyed by subject. Every subject asked for has an entry
+        """
+        return {subject: [str(statement.getObject().getLabel()) for statement in
+                          self.get_statements(s=subject, p=RDFS.LABEL)]
+                for subject in subjects}
+
+    def get_restrictions(self) -> Dict[Value, Tuple[Value, Value]]:
+        """
+        Get every owl:Restriction in the store
+        :return: The property and the someValuesFrom or onClass value of each restriction
+        """
+        restrictions = dict()
+        for type_statement in self.get_statements(p=RDF.TYPE, o=OWL.RESTRICTION):
+            restriction = type_statement.getSubject()
+            restriction_property = restriction_value = None
+            for statement in self.get_statements(s=restriction):
+                if statement.getPredicate() == OWL.ONPROPERTY:
+                    restriction_property = statement.getObject()
+                elif statement.getPredicate() in (OWL.SOMEVALUESFROM, ONCLASS):
+                    restriction_value = statement.getObject()
+            restrictions[restriction] = (restriction_property, restriction_value)
+        return restrictions
+
+    @abstractmethod
+    def evaluate_query(self, query, bindings: Dict[str, Value] = None) -> Iterable:
+        """
+        Evaluate a KaBOBSPARQLQuery
+        :param query: The query
+        :param bindings: Values for variables of the query
+        :return: Binding sets supporting getValue(selection)
+        """
+
+    def iterate_query_pages(self, query, bindings: Dict[str, Value] = None, page_size: int = None) -> Iterator[List]:
+        """
+        Fetch the solutions of a KaBOBSPARQLQuery a page at a time, so that the first solutions can be used before the
+        last ones are fetched. Each page is fetched when it is asked for
+        :param query: The query
+        :param bindings: Values for variables of the query
+        :param page_size: Number of solutions to fetch at a time. Defaults to query_page_size
+        :return: Pages of binding sets supporting getValue(selection)
+        """
+        yield list(self.evaluate_query(query, bindings))
+
+    def close(self) -> None:
+        pass
+
+
+class LocalBindingSet(dict):
+    """
+    A query solution read from a triple store
+    """
+
+    def getValue(self, name: str) -> Value:
+        return self[name]
+
+
+class ConnectionPool:
+    """
+    Connections to the same repository that are handed out to one thread at a time
+    """
+
+    def __init__(self, connections: List[RepositoryConnection]):
+        self.connections = connections
+        self.available = queue.Queue()
+        for conn in connections:
+            self.available.put(conn)
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    @contextmanager
+    def connection(self) -> RepositoryConnection:
+        """
+        Borrow a connection, waiting for one to be returned if they are all in use
+        """
+        conn = self.available.get()
+        try:
+            yield conn
+        finally:
+            self.available.put(conn)
+
+    def close(self) -> None:
+        for conn in self.connections:
+            conn.close()
+
+
+class AllegroGraphStore(TripleStore):
+    """
+    Triple store backed by connections to an AllegroGraph repository. Each request borrows a connection from a pool, so
+    the store can be read from several threads at once.
+    """
+
+    def __init__(self, conn: RepositoryConnection, pool: ConnectionPool = None, release: str = None):
+        """
+        :param conn: Connection to the repository
+        :param pool: Connections to use for requests. Defaults to only conn
+        :param release: KaBOB release in the repository
+        """
+        super().__init__()
+        self.conn = conn
+        self.pool = pool or ConnectionPool([conn])
+        self.release = release
+
+    @classmethod
+    def connect(cls, repository: str, host: str, port: int, user: str, password: str, pool_size: int = 1):
+        """
+        Open pool_size connections to an AllegroGraph repository. KaBOB repositories are named after their release.
+        """
+        connections = [ag_connect(repository, host=host, port=port, user=user, password=password,
+                                  create=False, clear=False) for _ in range(max(1, pool_size))]
+        return cls(connections[0], pool=ConnectionPool(connections), release=repository)
+
+    def namespace(self, prefix: str):
+        return self.conn.namespace(prefix)
+
+    def createURI(self, uri=None, namespace=None, localname=None) -> URI:
+        return self.conn.createURI(uri=uri, namespace=namespace, localname=localname)
+
+    def get_statements(self, s: Value = None, p: URI = None, o: Value = None) -> List[Statement]:
+        return self.fetch_statements(s, p, o)
+
+    def iterate_statements(self, s: Value = None, p: URI = None, o: Value = None,
+                           page_size: int = None, offset: int = 0) -> Iterator[Statement]:
+        page_size = page_size or self.statement_page_size
+        while True:
+            # The connection is only borrowed while a page is fetched so that it is free while the page is consumed
+            page = self.fetch_statements(s, p, o, limit=page_size, offset=offset)
+            yield from page
+
+            if len(page) < page_size:
+                break
+            offset += page_size
+
+    def fetch_statements(self, s: Value = None, p: URI = None, o: Value = None, limit: int = None,
+                         offset: int = None) -> List[Statement]:
+        """
+        Get the statements matching a pattern, reading them as N-Triples so that the bytes received are counted
+        """
+        response = io.BytesIO()
+        with self.pool.connection() as conn:
+            conn.getStatements(subject=s, predicate=p, object=o, limit=limit, offset=offset, output=response,
+                               output_format=RDFFormat.NTRIPLES)
+        if self.stats is not None:
+            self.stats.add_bytes(response.tell())
+
+        statements = []
+        for line in response.getvalue().decode("utf-8").split("\n"):
+            match = NTRIPLES_LINE.match(line)
+            if match:
+                statements.append(Statement(*(parse_term(term) for term in match.groups()[:3])))
+        return statements
+
+    def get_statements_for_subjects(self, subjects: List[Value]) -> Dict[Value, List[Statement]]:
+        """
+        Fetch the statements for many subjects using chunked SPARQL VALUES queries. Literals can't be subjects so they
+        are answered without asking the server, and subjects that can't be written in a VALUES clause are fetched
+        individually.
+        :param subjects: Subjects to get statements for
+        :return: Statements keyed by subject
+        """
+        statements: Dict[Value, List[Statement]] = dict()
+        uris: List[URI] = list()
+        for subject in dict.fromkeys(subjects):
+            if isinstance(subject, Literal):
+                statements[subject] = []
+            elif isinstance(subject, URI):
+                uris.append(subject)
+            else:
+                statements[subject] = self.get_statements(s=subject)
+
+        for i in range(0, len(uris), self.statement_batch_size):
+            chunk = uris[i:i + self.statement_batch_size]
+            statements.update((subject, []) for subject in chunk)
+
+            query_string = "SELECT ?s ?p ?o WHERE {\n\tVALUES ?s { %s }\n\t?s ?p ?o .\n}" % \
+                           " ".join(str(subject) for subject in chunk)
+            for binding_set in self.evaluate_query_string(query_string):
+                s = binding_set.getValue("s")
+                statements[s].append(Statement(s, binding_set.getValue("p"), binding_set.getValue("o")))
+
+        return statements
+
+    def get_labels_for_subjects(self, subjects: List[Value]) -> Dict[Value, List[str]]:
+        labels: Dict[Value, List[str]] = dict()
+        uris = [subject for subject in dict.fromkeys(subjects) if isinstance(subject, URI)]
+        labels.update(super().get_labels_for_subjects([subject for subject in subjects if not isinstance(subject, URI)]))
+
+        for i in range(0, len(uris), self.statement_batch_size):
+            chunk = uris[i:i + self.statement_batch_size]
+            labels.update((subject, []) for subject in chunk)
+
+            query_string = "SELECT ?s ?label WHERE {\n\tVALUES ?s { %s }\n\t?s %s ?label .\n}" % \
+                           (" ".join(str(subject) for subject in chunk), RDFS.LABEL)
+            for binding_set in self.evaluate_query_string(query_string):
+                labels[binding_set.getValue("s")].append(str(binding_set.getValue("label").getLabel()))
+
+        return labels
+
+    def get_restrictions(self) -> Dict[Value, Tuple[Value, Value]]:
+        query_string = "SELECT ?restriction ?property ?value WHERE {\n" \
+                       "\t?restriction %s %s .\n" \
+                       "\tOPTIONAL { ?restriction %s ?property }\n" \
+                       "\tOPTIONAL { ?restriction %s|%s ?value }\n" \
+                       "}" % (RDF.TYPE, OWL.RESTRICTION, OWL.ONPROPERTY, OWL.SOMEVALUESFROM, ONCLASS)
+        return {binding_set.getValue("restriction"): (binding_set.getValue("property"), binding_set.getValue("value"))
+                for binding_set in self.evaluate_query_string(query_string)}
+
+    def evaluate_query(self, query, bindings: Dict[str, Value] = None) -> List[LocalBindingSet]:
+        return self.evaluate_query_string(query.make_query_string(), bindings)
+
+    def iterate_query_pages(self, query, bindings: Dict[str, Value] = None,
+                            page_size: int = None) -> Iterator[List[LocalBindingSet]]:
+        page_size = page_size or self.query_page_size
+        offset = query.offset or 0
+        remaining = query.limit
+        while remaining is None or remaining > 0:
+            limit = page_size if remaining is None else min(page_size, remaining)
+            page = self.evaluate_query_string(query.make_query_string(limit=limit, offset=offset), bindings)
+            yield page
+
+            if len(page) < limit:
+                break
+            offset += limit
+            if remaining is not None:
+                remaining -= limit
+
+    def evaluate_query_string(self, query_string: str, bindings: Dict[str, Value] = None) -> List[LocalBindingSet]:
+        """
+        Evaluate a SELECT query, reading the results as SPARQL TSV. Each value is a single N-Triples term, which is much
+        smaller on the wire than the default format and is parsed without building intermediate result objects.
+        :param query_string: The query
+        :param bindings: Values for variables of the query
+        :return: Binding sets keyed by the query's variables
+        """
+        response = io.BytesIO()
+        with self.pool.connection() as conn:
+            tuple_query = conn.prepareTupleQuery(QueryLanguage.SPARQL, query_string)
+            for name, value in (bindings or {}).items():
+                tuple_query.setBinding(name, value)
+            tuple_query.evaluate(output=response, output_format=TupleFormat.TSV)
+        if self.stats is not None:
+            self.stats.add_bytes(response.tell())
+
+        return self.parse_tsv(response.getvalue().decode("utf-8"))
+
+    @staticmethod
+    def parse_tsv(text: str) -> List[LocalBindingSet]:
+        """
+        :param text: SPARQL TSV results. Tabs and newlines inside literals are escaped, so each line is a solution
+        :return: Binding sets keyed by the header's variables. Unbound variables are None
+        """
+        lines = text.split("\n")
+        names = [name.lstrip("?") for name in lines[0].rstrip("\r").split("\t")]
+        return [LocalBindingSet(zip(names, (AllegroGraphStore.parse_tsv_term(term) for term in line.split("\t"))))
+                for line in (line.rstrip("\r") for line in lines[1:]) if line]
+
+    @staticmethod
+    def parse_tsv_term(term: str) -> Value or None:
+        """
+        :param term: An N-Triples term, or a number or boolean in its abbreviated Turtle form
+        :return: The term, with abbreviated numbers and booleans typed by their XML Schema datatype
+        """
+        if not term:
+            return None
+        for pattern, datatype in TSV_DATATYPES:
+            if pattern.fullmatch(term):
+                return Literal(term, datatype=datatype)
+        # Escapes inside quoted literals are decoded by parse_term
+        return parse_term(term)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class LocalTripleStore(TripleStore):
+    """
+    In-memory triple store loaded from N-Triples or N-Quads dumps. Statements are indexed by subject, predicate and object
+    (SPO, POS and OSP) so that every access pattern is answered with hash lookups.
+    """
+
+    _line = NTRIPLES_LINE
+
+    def __init__(self, *files: str, release: str = None):
+        """
+        :param files: N-Triples or N-Quads files to load
+        :param release: KaBOB release the files were dumped from
+        """
+        super().__init__()
+        self.release = release
+        self.spo: Dict[Value, Dict[URI, List[Statement]]] = dict()
+        self.pos: Dict[URI, Dict[Value, List[Statement]]] = dict()
+        self.osp: Dict[Value, Dict[Value, List[Statement]]] = dict()
+        self.size = 0
+        self._terms: Dict[str, Value] = dict()
+
+        for file in files:
+            self.load(file)
+
+    def load(self, file: str) -> None:
+        """
+        Load an N-Triples or N-Quads file. Files ending in .gz are decompressed as they are read.
+        :param file: Path to the file
+        :return: None
+        """
+        self.log.debug("Loading %s" % file)
+        with (gzip.open(file, "rt", encoding="utf-8") if file.endswith(".gz") else open(file, encoding="utf-8")) as f:
+            self.load_lines(f)
+
+    def load_lines(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            match = self._line.match(line)
+            if not match:
+                self.log.warning("Could not parse line: %s" % line)
+                continue
+            self.add(*(self.get_term(term) for term in match.groups()))
+
+    def get_term(self, term: str or None) -> Value or None:
+        if term is None:
+            return None
+        value = self._terms.get(term)
+        if value is None:
+            value = self._terms[term] = parse_term(term)
+        return value
+
+    def add(self, s: Value, p: URI, o: Value, context: URI = None) -> None:
+        statement = Statement(s, p, o, context)
+        self.spo.setdefault(s, dict()).setdefault(p, list()).append(statement)
+        self.pos.setdefault(p, dict()).setdefault(o, list()).append(statement)
+        self.osp.setdefault(o, dict()).setdefault(s, list()).append(statement)
+        self.size += 1
+
+    def get_statements(self, s: Value = None, p: URI = None, o: Value = None) -> List[Statement]:
+        return list(self.iterate_index(s=s, p=p, o=o))
+
+    def iterate_statements(self, s: Value = None, p: URI = None, o: Value = None,
+                           page_size: int = None, offset: int = 0) -> Iterator[Statement]:
+        # Statements are read straight out of the indexes, so there is nothing to page
+        return islice(self.iterate_index(s=s, p=p, o=o), offset, None)
+
+    def iterate_index(self, s: Value = None, p: URI = None, o: Value = None) -> Iterator[Statement]:
+        """
+        :return: The statements matching a pattern, looked up in whichever index answers it
+        """
+        if s is not None:
+            by_predicate = self.spo.get(s, {})
+            if p is not None:
+                statements = by_predicate.get(p, [])
+            elif o is not None:
+                yield from self.osp.get(o, {}).get(s, [])
+                return
+            else:
+                statements = (statement for predicate_statements in by_predicate.values()
+                              for statement in predicate_statements)
+            yield from (statement for statement in statements if o is None or statement.getObject() == o)
+        elif p is not None:
+            by_object = self.pos.get(p, {})
+            if o is not None:
+                yield from by_object.get(o, [])
+            else:
+                yield from (statement for object_statements in by_object.values() for statement in object_statements)
+        elif o is not None:
+            yield from (statement for subject_statements in self.osp.get(o, {}).values()
+                        for statement in subject_statements)
+        else:
+            yield from (statement for by_predicate in self.spo.values()
+                        for predicate_statements in by_predicate.values()
+                        for statement in predicate_statements)
+
+    def evaluate_query(self, query, bindings: Dict[str, Value] = None) -> List[LocalBindingSet]:
+        """
+        Evaluate the basic graph pattern, property paths, VALUES and filters of a KaBOBSPARQLQuery by joining its triple
+        patterns one at a time, always choosing the pattern with the most bound terms next. Property paths are joined
+        after the triple patterns.
+        :param query: The query
+        :param bindings: Values for variables of the query
+        :return: Binding sets for the query's selections
+        """
+        patterns = [tuple(self.get_query_term(term) for term in triple) for triple in query.triples]
+        solutions: List[Dict[str, Value]] = [dict(bindings or {})]
+        for variable, values in query.values.items():
+            solutions = [dict(solution, **{variable: value}) for solution in solutions for value in values
+                         if solution.get(variable, value) == value]
+
+        while patterns and solutions:
+            pattern = max(patterns, key=lambda _pattern: sum(
+                not isinstance(term, str) or term in solutions[0] for term in _pattern))
+            patterns.remove(pattern)
+
+            next_solutions = []
+            for solution in solutions:
+                s, p, o = (solution.get(term) if isinstance(term, str) else term for term in pattern)
+                for statement in self.get_statements(s=s, p=p, o=o):
+                    next_solution = dict(solution)
+                    for term, value in zip(pattern, (statement.getSubject(), statement.getPredicate(),
+                                                     statement.getObject())):
+                        if isinstance(term, str):
+                            if next_solution.setdefault(term, value) != value:
+                                break
+                    else:
+                        next_solutions.append(next_solution)
+            solutions = next_solutions
+
+        for s, automaton, o in query.paths:
+            s, o = self.get_query_term(s), self.get_query_term(o)
+            next_solutions = []
+            for solution in solutions:
+                source = solution.get(s) if isinstance(s, str) else s
+                for start in [source] if source is not None else list(self.spo):
+                    for end in self.get_path_ends(start, automaton):
+                        next_solution = dict(solution)
+                        if isinstance(s, str):
+                            next_solution[s] = start
+                        if isinstance(o, str):
+                            if next_solution.setdefault(o, end) != end:
+                                continue
+                        elif o != end:
+                            continue
+                        next_solutions.append(next_solution)
+            solutions = next_solutions
+
+        for s, op, o in query.filters:
+            solutions = [solution for solution in solutions
+                         if self.apply_filter(solution, self.get_query_term(s), op, self.get_query_term(o))]
+
+        offset = query.offset or 0
+        solutions = solutions[offset:] if query.limit is None else solutions[offset:offset + query.limit]
+
+        return [LocalBindingSet((selection, solution.get(selection)) for selection in query.selections)
+                for solution in solutions]
+
+    def get_path_ends(self, source: Value, automaton) -> Set[Value]:
+        """
+        Follow the property path of a Walker Automata, as compiled by Automata.to_property_path, from source. Paths are
+        searched breadth first over pairs of a node and the last predicate read.
+        :param source: Node to start from
+        :param automaton: Automaton over predicates
+        :return: The nodes reached by paths of one or more predicates
+        """
+        first = automaton if automaton.start_state is None else automaton.successors(automaton.start_state)
+        by_predicate = self.spo.get(source, {})
+        queue = deque((statement.getObject(), predicate) for predicate in first
+                      for statement in by_predicate.get(predicate, ()))
+        visited = set(queue)
+        while queue:
+            node, predicate = queue.popleft()
+            by_predicate = self.spo.get(node, {})
+            for next_predicate in automaton.successors(predicate):
+                for statement in by_predicate.get(next_predicate, ()):
+                    next_state = (statement.getObject(), next_predicate)
+                    if next_state not in visited:
+                        visited.add(next_state)
+                        queue.append(next_state)
+        return {node for node, _ in visited}
+
+    def get_query_term(self, term: str) -> Value or str:
+        """
+        :param term: A term as written in a query
+        :return: The variable's name if the term is a variable, otherwise the value it represents
+        """
+        return term[1:] if term.startswith("?") else self.get_term(term)
+
+    @staticmethod
+    def apply_filter(solution: Dict[str, Value], s: Value or str, op: str, o: Value or str) -> bool:
+        s = solution.get(s) if isinstance(s, str) else s
+        o = solution.get(o) if isinstance(o, str) else o
+        if op == "!=":
+            return s != o
+        elif op == "=":
+            return s == o
+        raise ValueError("Unsupported filter operator %s" % op)
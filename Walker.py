@@ -1,8 +1,12 @@
-import copy
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, Set, Tuple
 
 import networkx as nx
 from logging import Logger
 
+from CompactMOPs import CompactMOPs
+from MOPs import MOPs
+
 
 class AcceptStateReached(Exception):
     pass
@@ -21,6 +25,7 @@ class Automata(nx.DiGraph):
             self.add_node(state)
 
         self.accept_states = accept_states
+        self.start_state = start_state
         self.current_state = start_state
 
     def add_transition(self, start, end):
@@ -31,6 +36,127 @@ class Automata(nx.DiGraph):
             self.current_state = next_state
             return self.current_state
 
+    def to_property_path(self) -> str:
+        """
+        Compile the paths this automaton accepts to a SPARQL 1.1 property path by state elimination. The states are
+        predicates, written with str. As in PathQuery, a path reads at least one predicate and can end on any state,
+        since paths end at target nodes rather than at accept states. Without a start state, a path can start with any
+        of the automaton's predicates.
+        :return: The property path
+        """
+        initial, final = object(), object()
+        states = sorted(self, key=str)
+        first = states if self.start_state is None else sorted(self.successors(self.start_state), key=str)
+        # A fixed order on the states makes the compiled path the same from run to run
+        order = {state: i for i, state in enumerate([initial] + states + [final])}
+
+        paths: Dict[Tuple[Hashable, Hashable], PropertyPath] = dict()
+        for state in first:
+            paths[initial, state] = PropertyPath.predicate(state)
+        for state, next_state in sorted(self.edges, key=lambda edge: (order[edge[0]], order[edge[1]])):
+            paths[state, next_state] = PropertyPath.predicate(next_state)
+        for state in states:
+            paths[state, final] = PropertyPath.EMPTY
+
+        successors: Dict[Hashable, Set[Hashable]] = dict()
+        predecessors: Dict[Hashable, Set[Hashable]] = dict()
+        for state, next_state in paths:
+            successors.setdefault(state, set()).add(next_state)
+            predecessors.setdefault(next_state, set()).add(state)
+
+        # Eliminating states with few neighbours first keeps the expression small
+        remaining = set(states)
+        while remaining:
+            state = min(remaining,
+                        key=lambda s: (len(predecessors.get(s, ())) * len(successors.get(s, ())), order[s]))
+            remaining.remove(state)
+
+            loop = PropertyPath.star(paths.pop((state, state), None))
+            incoming = sorted(predecessors.pop(state, set()) - {state}, key=order.get)
+            outgoing = sorted(successors.pop(state, set()) - {state}, key=order.get)
+            for previous_state in incoming:
+                successors[previous_state].discard(state)
+                for next_state in outgoing:
+                    through = PropertyPath.sequence(PropertyPath.sequence(paths[previous_state, state], loop),
+                                                    paths[state, next_state])
+                    paths[previous_state, next_state] = PropertyPath.alternative(
+                        paths.get((previous_state, next_state)), through)
+                    successors[previous_state].add(next_state)
+                    predecessors[next_state].add(previous_state)
+            for next_state in outgoing:
+                predecessors[next_state].discard(state)
+            for previous_state in incoming:
+                del paths[previous_state, state]
+            for next_state in outgoing:
+                del paths[state, next_state]
+
+        path = paths.get((initial, final))
+        if path is None or path is PropertyPath.EMPTY:
+            raise ValueError("The automaton doesn't accept any path")
+        return path.text
+
+
+class PropertyPath:
+    """
+    SPARQL property path expression built up during state elimination. None stands for no path at all and EMPTY for the
+    zero length path.
+    """
+    ALTERNATIVE, SEQUENCE, POSTFIX, PRIMARY = range(4)
+
+    def __init__(self, text: str, precedence: int):
+        self.text = text
+        self.precedence = precedence
+
+    def __eq__(self, other):
+        return isinstance(other, PropertyPath) and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def wrap(self, precedence: int) -> str:
+        return self.text if self.precedence >= precedence else "(%s)" % self.text
+
+    @classmethod
+    def predicate(cls, predicate) -> "PropertyPath":
+        return cls(str(predicate), cls.PRIMARY)
+
+    @classmethod
+    def sequence(cls, first: "PropertyPath" or None, second: "PropertyPath" or None) -> "PropertyPath" or None:
+        if first is None or second is None:
+            return None
+        if first is cls.EMPTY:
+            return second
+        if second is cls.EMPTY:
+            return first
+        return cls("%s/%s" % (first.wrap(cls.SEQUENCE), second.wrap(cls.SEQUENCE)), cls.SEQUENCE)
+
+    @classmethod
+    def alternative(cls, first: "PropertyPath" or None, second: "PropertyPath" or None) -> "PropertyPath" or None:
+        if first is None or first == second:
+            return second
+        if second is None:
+            return first
+        if first is cls.EMPTY:
+            return cls.optional(second)
+        if second is cls.EMPTY:
+            return cls.optional(first)
+        return cls("%s|%s" % (first.text, second.text), cls.ALTERNATIVE)
+
+    @classmethod
+    def optional(cls, path: "PropertyPath") -> "PropertyPath":
+        if path is cls.EMPTY or path.text.endswith(("*", "?")) and path.precedence == cls.POSTFIX:
+            return path
+        return cls("%s?" % path.wrap(cls.PRIMARY), cls.POSTFIX)
+
+    @classmethod
+    def star(cls, path: "PropertyPath" or None) -> "PropertyPath":
+        if path is None or path is cls.EMPTY:
+            return cls.EMPTY
+        return cls("%s*" % path.wrap(cls.PRIMARY), cls.POSTFIX)
+
+
+PropertyPath.EMPTY = PropertyPath("", PropertyPath.PRIMARY)
+
 
 class Walker:
     log = Logger("Walk")
@@ -40,13 +166,10 @@ class Walker:
         self.query = query
 
     def walk(self, start):
-        return dfs(self.G, start, [], self.is_exit, self.can_step, self.query)
-
-    def can_step(self, start, neighbor):
-        return self.query.transition(neighbor)
+        return self.get_path_query().shortest_path(start)
 
-    def is_exit(self, neighbor):
-        return neighbor in self.query.accept_states
+    def get_path_query(self) -> "PathQuery":
+        return PathQuery(self.G, self.query)
 
 
 class EdgeWalker(Walker):
@@ -55,26 +178,250 @@ class EdgeWalker(Walker):
         self.attribute_name = attribute_name
         self.accept_nodes = accept_nodes
 
-    def can_step(self, start, neighbor):
-        if self.G.has_edge(start, neighbor):
-            return self.query.transition(self.get_edge_attribute(start, neighbor))
-
-    def get_edge_attribute(self, start, neighbor):
-        for key, attribute in nx.get_edge_attributes(self.G, self.attribute_name).items():
-            u, v, key = key
-            if u == start and v == neighbor:
-                return attribute
-
-    def is_exit(self, neighbor):
-        return neighbor in self.accept_nodes
-
-
-def dfs(G, state, path, is_exit, can_step, query: Automata):
-    path.append(state)
-    if is_exit(state):
-        return path
-    for neighbor in G.successors(state):
-        if neighbor not in path and can_step(state, neighbor):
-            neighbor_path = dfs(G, neighbor, list(path), is_exit, can_step, copy.deepcopy(query))
-            if neighbor_path is not None:
-                return neighbor_path
+    def get_path_query(self) -> "PathQuery":
+        return PathQuery(self.G, self.query, edge_attribute=self.attribute_name, targets=self.accept_nodes)
+
+
+# A node of the graph paired with the automaton state reached on it
+ProductState = Tuple[Hashable, Hashable]
+
+
+class PathQuery:
+    """
+    Regular path query over a graph. Paths are searched breadth first over the product of the graph and an Automata,
+    visiting each (node, state) pair once. As in Walker, the automaton's states are the symbols read along a path: an
+    edge can be taken if the automaton has a transition from the last symbol read to the edge's symbol. The symbol of an
+    edge is its edge_attribute, its key in a multigraph if edge_attribute is edge_key, or the node it leads to if
+    edge_attribute is None. The outgoing edges of a node are indexed by symbol the first time the node is reached, so
+    each step only looks at the edges the automaton allows and nodes that are never reached are never indexed.
+    """
+    edge_key = "key"
+
+    def __init__(self, G: nx.MultiDiGraph or nx.DiGraph, automaton: Automata, edge_attribute: str = None,
+                 targets: Iterable[Hashable] = None):
+        """
+        :param G: Graph to search
+        :param automaton: Automaton over edge symbols
+        :param edge_attribute: Edge attribute holding the symbol of an edge. If None, an edge's symbol is its end node.
+        If edge_key, it is the edge's key
+        :param targets: Nodes that end a path. Defaults to the automaton's accept states, as in Walker
+        """
+        self.G = G
+        self.automaton = automaton
+        self.start_state = automaton.start_state
+        self.targets: Set[Hashable] = set(automaton.accept_states if targets is None else targets)
+        self.edge_attribute = edge_attribute
+
+        self.index: Dict[Hashable, Dict[Hashable, List[Hashable]]] = dict()
+
+    @classmethod
+    def for_mops(cls, mops: MOPs or CompactMOPs, automaton: Automata, targets: Iterable[Hashable] = None,
+                 by_role: bool = False):
+        """
+        :param mops: Mops to search. CompactMOPs are searched in place rather than converted to networkx graphs
+        :param automaton: Automaton over role labels, or over roles if by_role
+        :param targets: Frames that end a path
+        :param by_role: Read the roles of slots instead of their labels, such as the predicates of KaBOB
+        :return: A path query over the slots of mops
+        """
+        if isinstance(mops, CompactMOPs):
+            return CompactPathQuery(mops, automaton, targets=targets, by_role=by_role)
+        return cls(mops.slots, automaton, edge_attribute=cls.edge_key if by_role else mops.attribute_label,
+                   targets=targets)
+
+    def get_out_edges(self, node: Hashable) -> Iterable[Tuple[Hashable, Hashable]]:
+        """
+        :return: The end node and symbol of each edge out of node. Edges without a symbol are skipped
+        """
+        if node not in self.G:
+            return ()
+        if self.edge_attribute is None:
+            return ((v, v) for v in self.G.successors(node))
+        if self.edge_attribute == self.edge_key and self.G.is_multigraph():
+            return ((v, key) for _, v, key in self.G.out_edges(node, keys=True))
+        return ((v, symbol) for _, v, symbol in self.G.out_edges(node, data=self.edge_attribute) if symbol is not None)
+
+    def get_index(self, node: Hashable) -> Dict[Hashable, List[Hashable]]:
+        """
+        :return: The nodes reached by the edges out of node, keyed by symbol
+        """
+        by_symbol = self.index.get(node)
+        if by_symbol is None:
+            by_symbol = self.index[node] = dict()
+            for v, symbol in self.get_out_edges(node):
+                neighbors = by_symbol.setdefault(symbol, list())
+                if v not in neighbors:
+                    neighbors.append(v)
+        return by_symbol
+
+    """
+    SEARCH
+    """
+
+    def step(self, product_state: ProductState) -> Iterator[ProductState]:
+        """
+        :return: The product states reachable from product_state by one edge
+        """
+        node, state = product_state
+        by_symbol = self.get_index(node)
+        if not by_symbol:
+            return
+
+        if state is None:
+            symbols = by_symbol.keys()
+        elif state not in self.automaton:
+            # Without a start state the first edge can be any symbol, but only the automaton's symbols lead on
+            return
+        elif self.automaton.out_degree(state) < len(by_symbol):
+            symbols = (symbol for symbol in self.automaton.successors(state) if symbol in by_symbol)
+        else:
+            symbols = (symbol for symbol in by_symbol if self.automaton.has_edge(state, symbol))
+
+        for symbol in symbols:
+            for neighbor in by_symbol[symbol]:
+                yield neighbor, symbol
+
+    def is_target(self, node: Hashable) -> bool:
+        return node in self.targets
+
+    def shortest_path(self, source: Hashable) -> List[Hashable] or None:
+        """
+        :param source: Node to start from
+        :return: The nodes of a shortest path from source to a target, or None if there isn't one
+        """
+        start = (source, self.start_state)
+        parents: Dict[ProductState, ProductState or None] = {start: None}
+        queue = deque([start])
+        while queue:
+            product_state = queue.popleft()
+            if self.is_target(product_state[0]):
+                path = []
+                while product_state is not None:
+                    path.append(product_state[0])
+                    product_state = parents[product_state]
+                return path[::-1]
+
+            for next_state in self.step(product_state):
+                if next_state not in parents:
+                    parents[next_state] = product_state
+                    queue.append(next_state)
+        return None
+
+    def all_paths(self, source: Hashable, max_length: int) -> Iterator[List[Hashable]]:
+        """
+        Paths don't visit a node twice, as in Walker, and end at the first target they reach
+        :param source: Node to start from
+        :param max_length: Maximum number of edges in a path
+        :return: The nodes of every path from source to a target with at most max_length edges
+        """
+        # Product states that can't reach a target are pruned, along with those that are too far from one
+        distances = self.get_distances_to_targets(self.reachable_states(source, max_length))
+
+        start = (source, self.start_state)
+        if distances.get(start, max_length + 1) > max_length:
+            return
+        if self.is_target(source):
+            yield [source]
+            return
+
+        path = [source]
+        on_path = {source}
+        stack = [(start, self.step(start))]
+
+        while stack:
+            product_state, successors = stack[-1]
+            for next_state in successors:
+                node = next_state[0]
+                if node in on_path or distances.get(next_state, max_length + 1) > max_length - len(stack):
+                    continue
+                if self.is_target(node):
+                    yield path + [node]
+                    continue
+                path.append(node)
+                on_path.add(node)
+                stack.append((next_state, self.step(next_state)))
+                break
+            else:
+                stack.pop()
+                on_path.discard(path.pop())
+
+    def reachable(self, source: Hashable, max_length: int = None) -> Set[Hashable]:
+        """
+        :param source: Node to start from
+        :param max_length: Maximum number of edges to follow. Unbounded if None
+        :return: Every target reachable from source along a path the automaton accepts
+        """
+        return {node for node, _ in self.reachable_states(source, max_length) if self.is_target(node)}
+
+    def reachable_states(self, source: Hashable, max_length: int = None) -> Dict[ProductState, int]:
+        """
+        :return: Product states reachable from source, with their distances from it. Paths aren't followed past targets
+        """
+        start = (source, self.start_state)
+        distances = {start: 0}
+        queue = deque([start])
+        while queue:
+            product_state = queue.popleft()
+            distance = distances[product_state]
+            if self.is_target(product_state[0]) or (max_length is not None and distance >= max_length):
+                continue
+            for next_state in self.step(product_state):
+                if next_state not in distances:
+                    distances[next_state] = distance + 1
+                    queue.append(next_state)
+        return distances
+
+    def get_distances_to_targets(self, product_states: Iterable[ProductState]) -> Dict[ProductState, int]:
+        """
+        :return: The distance from each of product_states to the nearest target, for those that can reach one
+        """
+        product_states = set(product_states)
+        predecessors: Dict[ProductState, List[ProductState]] = dict()
+        queue = deque()
+        distances = dict()
+        for product_state in product_states:
+            if self.is_target(product_state[0]):
+                distances[product_state] = 0
+                queue.append(product_state)
+                continue
+            for next_state in self.step(product_state):
+                if next_state in product_states:
+                    predecessors.setdefault(next_state, list()).append(product_state)
+
+        while queue:
+            product_state = queue.popleft()
+            for predecessor in predecessors.get(product_state, ()):
+                if predecessor not in distances:
+                    distances[predecessor] = distances[product_state] + 1
+                    queue.append(predecessor)
+        return distances
+
+
+class CompactPathQuery(PathQuery):
+    """
+    PathQuery over the slots of CompactMOPs, read straight from its slot arrays
+    """
+
+    def __init__(self, mops: CompactMOPs, automaton: Automata, targets: Iterable[Hashable] = None,
+                 by_role: bool = False):
+        """
+        :param mops: Mops to search
+        :param automaton: Automaton over role labels, or over roles if by_role
+        :param targets: Frames that end a path
+        :param by_role: Read the roles of slots instead of their labels
+        """
+        super().__init__(None, automaton, targets=targets)
+        self.mops = mops
+        self.by_role = by_role
+
+    def get_out_edges(self, node: Hashable) -> Iterable[Tuple[Hashable, Hashable]]:
+        mops = self.mops
+        node_id = mops.node_ids.get(node)
+        if node_id is None:
+            return ()
+        # Slots are chained newest first, so they are reversed to match the order of the networkx graph
+        edges = reversed(list(mops.get_slot_edges(node_id)))
+        if self.by_role:
+            return ((mops.nodes[mops.slot_targets[edge]], mops.nodes[mops.slot_roles[edge]]) for edge in edges)
+        return ((mops.nodes[mops.slot_targets[edge]], mops.strings[mops.slot_labels[edge]]) for edge in edges
+                if mops.slot_labels[edge])
@@ -0,0 +1,61 @@
+from collections import Counter
+from unittest import TestCase
+
+import networkx as nx
+
+from Collapsing import Collapser
+from CompactMOPs import CompactMOPs
+from MOPs import MOPs
+
+
+class TestCollapser(TestCase):
+    def setUp(self):
+        self.mops = self.make_mops(MOPs())
+
+    @staticmethod
+    def make_mops(mops):
+        for frame, abstraction in (("protein", None), ("kinase", "protein"), ("p38", "kinase"), ("p53", "protein"),
+                                   ("pathway", None), ("apoptosis", "pathway"), ("cell", None)):
+            mops.add_frame(frame, label=frame.upper())
+            if abstraction:
+                mops.add_abstraction(frame, abstraction)
+        mops.add_slot("apoptosis", "has_participant", "has participant", "p53")
+        mops.add_slot("apoptosis", "has_participant", "has participant", "p38")
+        mops.add_slot("apoptosis", "occurs_in", "occurs in", "cell")
+        mops.add_slot("p53", "regulates", "regulates", "p38")
+        mops.add_slot("kinase", "part_of", "part of", "apoptosis")
+        return mops
+
+    def assert_quotient(self, partition, collapser):
+        expected = nx.quotient_graph(self.mops.slots, partition)
+        self.assertEqual(set(expected.nodes), set(collapser.collapsed_graph.nodes))
+        self.assertEqual(Counter((u, v, frozenset(data)) for u, v, data in expected.edges(data=True)),
+                         Counter((u, v, frozenset(data)) for u, v, data in collapser.collapsed_graph.edges(data=True)))
+
+    def test_collapse(self):
+        collapser = Collapser(self.mops, "protein")
+
+        self.assert_quotient([{"kinase", "p53"}, {"p38"}, {"apoptosis"}, {"cell"}], collapser)
+        self.assertEqual("PROTEIN", collapser.collapsed_graph.nodes[frozenset({"kinase", "p53"})]["label"])
+        edge_labels = collapser.get_collapsed_edge_labels(collapser.collapsed_graph)
+        self.assertEqual("has participant", edge_labels[frozenset({"apoptosis"}), frozenset({"kinase", "p53"})])
+
+    def test_collapse_all_specializations(self):
+        collapser = Collapser(self.mops, ["protein", "pathway"], all_specializations=True)
+
+        self.assert_quotient([{"kinase", "p53", "p38"}, {"apoptosis"}, {"cell"}], collapser)
+        self.assertEqual("PATHWAY", collapser.collapsed_graph.nodes[frozenset({"apoptosis"})]["label"])
+        self.assertEqual("CELL", collapser.collapsed_graph.nodes[frozenset({"cell"})]["label"])
+
+    def test_collapse_overlapping(self):
+        collapser = Collapser(self.mops, ["kinase", "protein"], all_specializations=True)
+
+        self.assert_quotient([{"kinase", "p38"}, {"p53"}, {"apoptosis"}, {"cell"}], collapser)
+        self.assertEqual("KINASE", collapser.collapsed_graph.nodes[frozenset({"kinase", "p38"})]["label"])
+        self.assertEqual("PROTEIN", collapser.collapsed_graph.nodes[frozenset({"p53"})]["label"])
+
+    def test_collapse_compact(self):
+        collapser = Collapser(self.make_mops(CompactMOPs()), ["protein", "pathway"], all_specializations=True)
+
+        self.assert_quotient([{"kinase", "p53", "p38"}, {"apoptosis"}, {"cell"}], collapser)
+        self.assertEqual("PROTEIN", collapser.collapsed_graph.nodes[frozenset({"kinase", "p53", "p38"})]["label"])
@@ -0,0 +1,142 @@
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+import networkx as nx
+from franz.openrdf.model import Literal, URI
+from franz.openrdf.vocabulary import RDF, RDFS
+
+from AllegroGraphRepositoryInterface import Interface
+from CompactMOPs import CompactMOPs
+from MOPs import MOPs
+from TripleStore import LocalTripleStore
+
+EX = "http://example.org/"
+
+
+class TestCompactMOPs(TestCase):
+    def setUp(self):
+        self.store = LocalTripleStore()
+        part_of = URI(EX + "part_of")
+        members = URI(EX + "members")
+        self.store.add(part_of, RDFS.LABEL, Literal("part of"))
+        for i in range(50):
+            self.store.add(URI(EX + "class_%d" % i), RDFS.LABEL, Literal("class %d" % i))
+            for parent in (i // 2, i // 3):
+                if parent != i:
+                    self.store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % parent))
+            self.store.add(URI(EX + "instance_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % i))
+            self.store.add(URI(EX + "instance_%d" % i), part_of, URI(EX + "instance_%d" % (i // 2)))
+
+        cells = [URI(EX + "cell_%d" % i) for i in range(3)]
+        self.store.add(URI(EX + "instance_0"), members, cells[0])
+        self.store.add(cells[0], RDF.TYPE, RDF.LIST)
+        for i, cell in enumerate(cells):
+            self.store.add(cell, RDF.FIRST, URI(EX + "class_%d" % i))
+            self.store.add(cell, RDF.REST, cells[i + 1] if i + 1 < len(cells) else RDF.NIL)
+
+        self.nodes = [URI(EX + "instance_%d" % i) for i in range(49, -1, -1)]
+
+    def assertSameMOPs(self, expected: MOPs, actual: MOPs):
+        for graph in ("abstractions", "slots"):
+            self.assertTrue(nx.utils.graphs_equal(getattr(expected, graph), getattr(actual, graph)))
+
+    def test_mopify(self):
+        with Interface(None, store=self.store) as interface:
+            expected = [interface.mopify(node) for node in self.nodes]
+        with Interface(None, store=self.store, compact_mops=True) as compact_interface:
+            actual = [compact_interface.mopify(node) for node in self.nodes]
+
+        self.assertIsInstance(compact_interface.mops, CompactMOPs)
+        self.assertEqual(expected, actual)
+        self.assertSameMOPs(interface.mops, compact_interface.mops.to_mops())
+
+        mops, compact_mops = interface.mops, compact_interface.mops
+        for node in (URI(EX + "class_7"), URI(EX + "instance_3"), URI(EX + "instance_0")):
+            self.assertEqual(mops.get_frame_label(node), compact_mops.get_frame_label(node))
+            self.assertEqual(mops.is_instance(node), compact_mops.is_instance(node))
+        self.assertTrue(compact_mops.is_abstraction(URI(EX + "class_0"), URI(EX + "instance_49")))
+        self.assertFalse(compact_mops.is_abstraction(URI(EX + "instance_49"), URI(EX + "class_0")))
+        self.assertEqual(mops.get_edge_label(URI(EX + "instance_5"), URI(EX + "instance_2")),
+                         compact_mops.get_edge_label(URI(EX + "instance_5"), URI(EX + "instance_2")))
+        self.assertEqual(mops.get_statistics(), compact_mops.get_statistics())
+
+    def test_round_trip(self):
+        with Interface(None, store=self.store) as interface:
+            for node in self.nodes:
+                interface.mopify(node)
+
+        compact_mops = CompactMOPs.from_mops(interface.mops)
+        self.assertSameMOPs(interface.mops, compact_mops.to_mops())
+        self.assertSameMOPs(interface.mops, pickle.loads(pickle.dumps(compact_mops)).to_mops())
+
+    def test_export_graph(self):
+        with Interface(None, store=self.store) as interface:
+            for node in self.nodes:
+                interface.mopify(node)
+        compact_mops = CompactMOPs.from_mops(interface.mops)
+
+        with tempfile.TemporaryDirectory() as directory:
+            interface.mops.export_graph(os.path.join(directory, "mops.graphml"))
+            compact_mops.export_graph(os.path.join(directory, "compact_mops.graphml"))
+            expected = nx.read_graphml(os.path.join(directory, "mops.graphml"))
+            actual = nx.read_graphml(os.path.join(directory, "compact_mops.graphml"))
+            self.assertEqual(dict(expected.nodes(data=True)), dict(actual.nodes(data=True)))
+            self.assertEqual(sorted(expected.edges(data=True), key=str), sorted(actual.edges(data=True), key=str))
+
+            for name in ("mops.tsv", "mops.gexf"):
+                interface.mops.export_graph(os.path.join(directory, name))
+                compact_mops.export_graph(os.path.join(directory, "compact_" + name))
+                with open(os.path.join(directory, name)) as f, open(os.path.join(directory, "compact_" + name)) as g:
+                    self.assertEqual(sorted(f.read().splitlines()), sorted(g.read().splitlines()))
+
+            for radius in (1, 2):
+                self.assertTrue(nx.utils.graphs_equal(interface.mops.get_ego_graph(URI(EX + "instance_3"), radius),
+                                                      compact_mops.get_ego_graph(URI(EX + "instance_3"), radius)))
+            self.assertRaises(ValueError, compact_mops.get_ego_graph, URI(EX + "unknown"))
+
+            compact_mops.draw_mops(directory, center=URI(EX + "instance_3"), radius=1)
+            self.assertTrue(os.path.exists(os.path.join(directory, "slot_graph.png")))
+
+    def test_cached_mops(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with Interface(None, store=self.store, cache_dir=cache_dir) as interface:
+                for node in self.nodes:
+                    interface.mopify(node)
+
+            # Snapshots are read as the storage asked for, whichever storage wrote them
+            with Interface(None, store=self.store, cache_dir=cache_dir, compact_mops=True) as compact_interface:
+                self.assertIsInstance(compact_interface.mops, CompactMOPs)
+                self.assertSameMOPs(interface.mops, compact_interface.mops.to_mops())
+            with Interface(None, store=self.store, cache_dir=cache_dir) as plain_interface:
+                self.assertIsInstance(plain_interface.mops, MOPs)
+                self.assertSameMOPs(interface.mops, plain_interface.mops)
+
+    def test_add_slot_and_abstraction(self):
+        mops = CompactMOPs()
+        for frame, abstraction in (("thing", None), ("protein", "thing"), ("kinase", "protein")):
+            mops.add_frame(frame)
+            if abstraction:
+                mops.add_abstraction(frame, abstraction)
+        self.assertTrue(mops.is_abstraction("thing", "kinase"))
+        self.assertFalse(mops.is_abstraction("kinase", "thing"))
+
+        mops.add_slot("kinase", "part_of", "part of", "thing")
+        mops = pickle.loads(pickle.dumps(mops))
+        # Adding the same slot again, even after a round trip, only updates its label
+        mops.add_slot("kinase", "part_of", "is part of", "thing")
+        mops.add_slot("kinase", "has_part", "has part", "thing")
+        self.assertEqual({("kinase", "thing", "part_of"): "is part of", ("kinase", "thing", "has_part"): "has part"},
+                         {(u, v, k): label for u, v, k, label in mops.to_mops().slots.edges(keys=True, data="label")})
+
+    def test_special_node_attributes(self):
+        taxon = URI(EX + "only_in_taxon")
+        for mops in (MOPs(), CompactMOPs()):
+            mops.add_special_node_attribute(taxon, "taxon")
+            mops.add_frame(URI(EX + "human"), label="human")
+            mops.add_frame(URI(EX + "gene"), label="gene")
+            mops.add_slot(URI(EX + "gene"), taxon, "only in taxon", URI(EX + "human"))
+            if isinstance(mops, CompactMOPs):
+                self.assertSameMOPs(expected, mops.to_mops())
+            expected = mops
@@ -0,0 +1,47 @@
+import pickle
+from unittest import TestCase
+
+from EquivalentClasses import EquivalentClasses
+
+
+class TestEquivalentClasses(TestCase):
+    def test_union(self):
+        classes = EquivalentClasses()
+
+        self.assertEqual("a", classes.union("a", "b"))
+        self.assertEqual("a", classes.union("c", "b"))
+        self.assertEqual("d", classes.add("d"))
+        self.assertEqual("d", classes.union("d", "e"))
+        self.assertTrue(classes.union("e", "c"))
+        self.assertEqual("a", classes.find("e"))
+        self.assertIsNone(classes.find("f"))
+
+        self.assertEqual({"a": {"a", "b", "c", "d", "e"}}, classes.to_dict())
+
+    def test_merge(self):
+        first = EquivalentClasses.from_dict({"a": {"a", "b"}, "x": {"x"}})
+        second = EquivalentClasses.from_dict({"c": {"c", "b", "d"}})
+
+        first.merge(second)
+
+        self.assertEqual({"a": {"a", "b", "c", "d"}, "x": {"x"}}, first.to_dict())
+        self.assertEqual("a", first.canonical("d"))
+        self.assertEqual("y", first.canonical("y"))
+
+    def test_pickle_compatibility(self):
+        legacy = {"a": {"a", "b"}, "c": {"c"}}
+        classes = EquivalentClasses.from_dict(pickle.loads(pickle.dumps(legacy)))
+
+        self.assertEqual("a", classes.find("b"))
+        self.assertEqual("c", classes.find("c"))
+        self.assertEqual(legacy, pickle.loads(pickle.dumps(classes.to_dict())))
+
+    def test_long_chain(self):
+        classes = EquivalentClasses()
+        classes.add(0)
+        for i in range(1, 100000):
+            classes.add(i)
+            classes.union(i - 1, i)
+
+        self.assertEqual(99999, classes.find(0))
+        self.assertEqual(99999, classes.parents[1])
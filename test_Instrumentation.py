@@ -0,0 +1,89 @@
+import tempfile
+from unittest import TestCase
+
+from franz.openrdf.model import Literal, URI
+from franz.openrdf.vocabulary import RDFS
+
+from AllegroGraphRepositoryInterface import Interface
+from Instrumentation import Statistics
+from KaBOB_SPARQL_QUERY import KaBOBSPARQLQuery
+from TripleStore import LocalTripleStore
+
+EX = "http://example.org/"
+
+
+class TestStatistics(TestCase):
+    def test_record(self):
+        stats = Statistics()
+        for seconds in [0.00005] * 98 + [0.05, 0.2]:
+            stats.record("get_statements", "s??", seconds, statements=2)
+        with stats.timer("query") as call:
+            call.statements = 3
+            stats.add_bytes(100)
+        # Bytes received outside of a timed call aren't counted anywhere
+        stats.add_bytes(50)
+
+        calls = stats.to_dict()["calls"]
+        self.assertEqual(100, calls["get_statements s??"]["calls"])
+        self.assertEqual(200, calls["get_statements s??"]["statements"])
+        self.assertEqual(0.0001, calls["get_statements s??"]["p50"])
+        self.assertLessEqual(0.05, calls["get_statements s??"]["p99"])
+        self.assertEqual((1, 3, 100), (calls["query"]["calls"], calls["query"]["statements"], calls["query"]["bytes"]))
+
+    def test_iterate_timed(self):
+        stats = Statistics()
+
+        def fetch_pages():
+            for page in ([1, 2, 3], [4]):
+                stats.add_bytes(10 * len(page))
+                yield page
+
+        with stats.timer("caller") as call:
+            self.assertEqual([[1, 2, 3], [4]], list(stats.iterate_timed(fetch_pages(), "query_stream")))
+        self.assertEqual(0, call.bytes)
+
+        calls = stats.to_dict()["calls"]
+        self.assertEqual((2, 4, 40), (calls["query_stream"]["calls"], calls["query_stream"]["statements"],
+                                      calls["query_stream"]["bytes"]))
+
+    def test_record_cache(self):
+        stats = Statistics()
+        stats.record_cache("labels", hits=3)
+        stats.record_cache("labels", misses=1)
+
+        self.assertEqual(0.75, stats.get_hit_rate("labels"))
+        self.assertIsNone(stats.get_hit_rate("statements"))
+        self.assertIn("labels cache: 3/4 hits (75.0%)", stats.summary())
+
+        stats.reset()
+        self.assertEqual({"calls": {}, "caches": {}}, stats.to_dict())
+
+    def test_interface(self):
+        store = LocalTripleStore(release="test")
+        for i in range(10):
+            store.add(URI(EX + "class_%d" % i), RDFS.LABEL, Literal("class %d" % i))
+            store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % (i // 2)))
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with Interface(None, store=store, cache_dir=cache_dir) as interface:
+                with self.assertLogs("Interface", level="INFO") as logs:
+                    interface.mopify_and_cache([URI(EX + "class_%d" % i) for i in range(10)], report_every_iter=5)
+                # After 5 and 10 nodes, and at the end
+                self.assertEqual(3, sum("Statistics after" in line for line in logs.output))
+
+                query = KaBOBSPARQLQuery(interface)
+                query.make_triple("cls", RDFS.SUBCLASSOF, URI(EX + "class_0"))
+                query.set_selections(["cls"])
+                query.run()
+                query.run()
+                streamed = list(query.run(stream=True, use_cache=False))
+
+                stats = interface.stats.to_dict()
+                self.assertEqual(10, stats["calls"]["get_statements s??"]["calls"])
+                self.assertEqual(1, stats["calls"]["query"]["calls"])
+                self.assertEqual(len(streamed), stats["calls"]["query_stream"]["statements"])
+                self.assertEqual({"hits": 1, "misses": 1}, stats["caches"]["query_results"])
+                self.assertEqual(10, stats["caches"]["restrictions"]["misses"])
+
+                interface.load_restriction_index()
+                self.assertEqual(1, interface.stats.to_dict()["calls"]["get_restrictions"]["calls"])
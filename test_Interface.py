@@ -0,0 +1,146 @@
+import sys
+import tempfile
+from unittest import TestCase
+
+import networkx as nx
+from franz.openrdf.model import Literal, URI
+from franz.openrdf.vocabulary import OWL, RDF, RDFS
+
+from AllegroGraphRepositoryInterface import Interface
+from TripleStore import LocalTripleStore
+
+EX = "http://example.org/"
+
+
+class TestInterface(TestCase):
+    depth = sys.getrecursionlimit() * 2
+
+    def test_mopify_deep_hierarchy(self):
+        store = LocalTripleStore()
+        for i in range(self.depth):
+            store.add(URI(EX + "class_%d" % i), RDFS.LABEL, Literal("class %d" % i))
+            store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % (i + 1)))
+
+        with Interface(None, store=store) as interface:
+            interface.mopify(URI(EX + "class_0"))
+
+            self.assertEqual(self.depth + 1, interface.mops.abstractions.number_of_nodes())
+            self.assertTrue(interface.mops.abstractions.has_edge(URI(EX + "class_%d" % (self.depth - 1)),
+                                                                 URI(EX + "class_%d" % self.depth)))
+
+    def test_mopify_long_list(self):
+        store = LocalTripleStore()
+        members = URI(EX + "members")
+        cells = [URI(EX + "cell_%d" % i) for i in range(self.depth)]
+        store.add(URI(EX + "group"), members, cells[0])
+        store.add(cells[0], RDF.TYPE, RDF.LIST)
+        for i, cell in enumerate(cells):
+            store.add(cell, RDF.FIRST, URI(EX + "member_%d" % i))
+            store.add(cell, RDF.REST, cells[i + 1] if i + 1 < len(cells) else RDF.NIL)
+
+        with Interface(None, store=store) as interface:
+            interface.mopify(URI(EX + "group"))
+
+            list_node = "%s %s - list" % (URI(EX + "group"), members)
+            filler = interface.mops.slots.nodes[list_node]["list"]
+            self.assertEqual([URI(EX + "member_%d" % i) for i in range(self.depth)], filler)
+
+    def test_mopify_concurrently(self):
+        store = LocalTripleStore()
+        for i in range(100):
+            store.add(URI(EX + "class_%d" % i), RDFS.LABEL, Literal("class %d" % i))
+            for parent in (i // 2, i // 3):
+                if parent != i:
+                    store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % parent))
+        store.statement_batch_size = 4
+        nodes = [URI(EX + "class_%d" % i) for i in range(99, 49, -1)]
+
+        with Interface(None, store=store) as serial:
+            expected = [serial.mopify(node) for node in nodes]
+        with Interface(None, store=store, connections=4) as concurrent:
+            actual = concurrent.mopify_batched(nodes)
+
+        self.assertEqual(expected, actual)
+        self.assertTrue(nx.utils.graphs_equal(serial.mops.abstractions, concurrent.mops.abstractions))
+
+    def test_mopify_batched(self):
+        store = LocalTripleStore()
+        part_of, members = URI(EX + "part_of"), URI(EX + "members")
+        store.add(part_of, RDFS.LABEL, Literal("part of"))
+        for i in range(30):
+            store.add(URI(EX + "class_%d" % i), RDFS.LABEL, Literal("class %d" % i))
+            if i:
+                store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % ((i - 1) // 2)))
+            if i % 3 == 0:
+                restriction = URI(EX + "restriction_%d" % i)
+                store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, restriction)
+                store.add(restriction, RDF.TYPE, OWL.RESTRICTION)
+                store.add(restriction, OWL.ONPROPERTY, part_of)
+                store.add(restriction, OWL.SOMEVALUESFROM, URI(EX + "class_%d" % (29 - i)))
+        cells = [URI(EX + "cell_%d" % i) for i in range(3)]
+        store.add(URI(EX + "class_7"), members, cells[0])
+        store.add(cells[0], RDF.TYPE, RDF.LIST)
+        for i, cell in enumerate(cells):
+            store.add(cell, RDF.FIRST, URI(EX + "class_%d" % (20 + i)))
+            store.add(cell, RDF.REST, cells[i + 1] if i + 1 < len(cells) else RDF.NIL)
+        nodes = [URI(EX + "class_%d" % i) for i in range(29, 19, -1)]
+
+        with Interface(None, store=store) as plain:
+            expected = [plain.mopify(node) for node in nodes]
+        with Interface(None, store=store) as batched:
+            batched.prefetch_statements(nodes)
+            prefetched = batched.stats.to_dict()["calls"]
+            actual = [batched.mopify(node) for node in nodes]
+
+            # Mopifying after prefetching doesn't go back to the store for statements
+            self.assertEqual(prefetched, batched.stats.to_dict()["calls"])
+
+        self.assertEqual(expected, actual)
+        self.assertTrue(nx.utils.graphs_equal(plain.mops.abstractions, batched.mops.abstractions))
+        self.assertTrue(nx.utils.graphs_equal(plain.mops.slots, batched.mops.slots))
+
+    def test_get_labels(self):
+        store = LocalTripleStore(release="test")
+        store.add(URI(EX + "part_of"), RDFS.LABEL, Literal("Part Of"))
+        store.add(URI(EX + "part_of"), RDFS.LABEL, Literal("part of"))
+        store.add(URI(EX + "GO_0000000000001"), RDFS.SUBCLASSOF, URI(EX + "part_of"))
+        nodes = [URI(EX + "part_of"), URI(EX + "GO_0000000000001"), URI(EX + "has_part")]
+        expected = ["part of", "subclass of part of", "has_part"]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with Interface(None, store=store, cache_dir=cache_dir) as interface:
+                self.assertEqual(expected, [interface.get_labels(nodes)[node] for node in nodes])
+
+            with Interface(None, store=LocalTripleStore(release="test"), cache_dir=cache_dir) as interface:
+                self.assertEqual(expected, [interface.get_label(node) for node in nodes])
+
+            # Labels cached for another release are discarded
+            with Interface(None, store=LocalTripleStore(release="other"), cache_dir=cache_dir) as interface:
+                self.assertNotIn(URI(EX + "part_of"), interface.labels)
+
+    def test_mopify_and_cache_stream(self):
+        store = LocalTripleStore()
+        denotes = URI(EX + "denotes")
+        for i in range(20):
+            store.add(URI(EX + "class_%d" % i), RDFS.LABEL, Literal("class %d" % i))
+            store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % (i // 2)))
+            store.add(URI(EX + "ice_%d" % i), denotes, URI(EX + "class_%d" % i))
+        consumed = []
+
+        def stream(interface):
+            for node in interface.iterate_objects(None, denotes, page_size=3):
+                consumed.append(node)
+                yield node
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with Interface(None, store=store, cache_dir=cache_dir) as interface:
+                interface.mopify_and_cache(stream(interface), number_of_nodes_to_mopify=10, batch_size=4)
+                # Nodes past the limit are never read
+                self.assertEqual(10, len(consumed))
+                self.assertEqual(9, interface.last_commit[0])
+
+            with Interface(None, store=store, cache_dir=cache_dir) as interface:
+                interface.mopify_and_cache(stream(interface), batch_size=4)
+                self.assertEqual(19, interface.last_commit[0])
+                for i in range(20):
+                    self.assertIn(URI(EX + "class_%d" % i), interface.mops)
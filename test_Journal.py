@@ -0,0 +1,107 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import networkx as nx
+from franz.openrdf.model import Literal, URI
+from franz.openrdf.vocabulary import RDFS, OWL
+
+from AllegroGraphRepositoryInterface import Interface
+from EquivalentClasses import EquivalentClasses
+from Journal import Journal
+from MOPs import MOPs
+from TripleStore import LocalTripleStore
+
+EX = "http://example.org/"
+
+
+class TestJournal(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "journal.pickle")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replay(self):
+        journal = Journal(self.path)
+        mops = MOPs()
+        mops.journal = journal.recorder("mops")
+        mops.add_frame("thing", label="thing")
+        mops.add_frame("person", label="person")
+        mops.add_abstraction("person", "thing")
+        journal.commit(0, "person")
+        mops.add_frame("dog", label="dog")
+        journal.close()
+
+        # A record cut short by a crash
+        with open(self.path, "ab") as f:
+            f.write(b"\x80\x05\x95")
+
+        journal = Journal(self.path)
+        replayed = MOPs()
+        self.assertEqual((0, "person"), journal.replay({"mops": replayed}))
+        self.assertEqual({"thing", "person"}, set(replayed.abstractions))
+        self.assertTrue(replayed.is_abstraction("thing", "person"))
+
+        # Uncommitted records are dropped so that new ones follow the last commit
+        replayed.journal = journal.recorder("mops")
+        replayed.add_frame("cat", label="cat")
+        journal.commit(1, "cat")
+        journal.close()
+
+        again = MOPs()
+        self.assertEqual((1, "cat"), Journal(self.path).replay({"mops": again}))
+        self.assertEqual({"thing", "person", "cat"}, set(again.abstractions))
+
+    def test_replay_equivalent_classes(self):
+        journal = Journal(self.path)
+        equivalent_classes = EquivalentClasses()
+        equivalent_classes.journal = journal.recorder("equivalent_classes")
+        equivalent_classes.union("a", "b")
+        equivalent_classes.union("c", "a")
+        journal.commit(0, "c")
+        journal.close()
+
+        replayed = EquivalentClasses()
+        Journal(self.path).replay({"equivalent_classes": replayed})
+        equivalent_classes.journal = None
+        self.assertEqual(equivalent_classes, replayed)
+
+
+class TestResume(TestCase):
+    def setUp(self):
+        self.store = LocalTripleStore()
+        for i in range(30):
+            self.store.add(URI(EX + "class_%d" % i), RDFS.LABEL, Literal("class %d" % i))
+            for parent in (i // 2, i // 3):
+                if parent != i:
+                    self.store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % parent))
+        self.store.add(URI(EX + "class_29"), OWL.EQUIVALENTCLASS, URI(EX + "class_28"))
+        self.nodes = [URI(EX + "class_%d" % i) for i in range(29, -1, -1)]
+
+    def test_resume_after_crash(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with Interface(None, store=self.store, cache_dir=cache_dir) as uninterrupted:
+                uninterrupted.mopify_and_cache(self.nodes)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            crashed = Interface(None, store=self.store, cache_dir=cache_dir)
+            crashed.connect_to_repository()
+            crashed.mopify_and_cache(self.nodes, cache_every_iter=3, number_of_nodes_to_mopify=7)
+            # Mopification of the next node starts but never commits
+            crashed.mopify(self.nodes[7])
+            crashed.journal.close()
+            crashed.cached_statements.close()
+            crashed.labels.close()
+
+            with Interface(None, store=self.store, cache_dir=cache_dir) as resumed:
+                self.assertEqual((6, self.nodes[6]), resumed.last_commit)
+                remaining, start = resumed.skip_committed(iter(self.nodes))
+                self.assertEqual((7, self.nodes[7]), (start, next(remaining)))
+                self.assertNotIn(self.nodes[7], resumed.mops)
+                resumed.mopify_and_cache(self.nodes)
+
+        for graph in ("abstractions", "slots"):
+            self.assertTrue(nx.utils.graphs_equal(getattr(uninterrupted.mops, graph), getattr(resumed.mops, graph)))
+        self.assertEqual(uninterrupted.equivalent_classes, resumed.equivalent_classes)
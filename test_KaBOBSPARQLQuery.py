@@ -0,0 +1,94 @@
+import tempfile
+from unittest import TestCase
+
+from franz.openrdf.model import Literal, URI
+from franz.openrdf.vocabulary import OWL, RDF, RDFS
+
+from AllegroGraphRepositoryInterface import Interface
+from KaBOB_SPARQL_QUERY import KaBOBSPARQLQuery
+from TripleStore import LocalTripleStore
+
+EX = "http://example.org/"
+
+
+class TestKaBOBSPARQLQuery(TestCase):
+    def setUp(self):
+        self.store = LocalTripleStore(release="test")
+        for cls, filler in (("C", "D"), ("F", "G")):
+            restriction = URI(EX + "R_" + cls)
+            self.store.add(restriction, RDF.TYPE, OWL.RESTRICTION)
+            self.store.add(restriction, OWL.SOMEVALUESFROM, URI(EX + filler))
+            self.store.add(URI(EX + cls), RDFS.SUBCLASSOF, restriction)
+            self.store.add(URI(EX + cls), RDFS.LABEL, Literal("what? " + cls))
+
+    @staticmethod
+    def make_query(cls, filler, restrictions=0):
+        query = KaBOBSPARQLQuery(None)
+        query.restrictions = restrictions
+        query.apply_restriction(filler, URI(EX + "part_of"), [cls])
+        query.make_triple(cls, RDFS.LABEL, Literal("what? ?x"))
+        query.set_selections([cls])
+        return query
+
+    def test_canonical(self):
+        query = self.make_query("cls", "filler")
+        other = self.make_query("node", "value", restrictions=5)
+
+        self.assertNotEqual(query.make_query_string(), other.make_query_string())
+        self.assertEqual(query.make_query_string(canonical=True), other.make_query_string(canonical=True))
+        self.assertIn('"what? ?x"', query.make_query_string(canonical=True))
+        self.assertEqual(query.get_cache_key({"filler": URI(EX + "D")}),
+                         other.get_cache_key({"value": URI(EX + "D")}))
+        self.assertNotEqual(query.get_cache_key({"filler": URI(EX + "D")}),
+                            query.get_cache_key({"filler": URI(EX + "G")}))
+
+    def test_run_with_bindings(self):
+        query = KaBOBSPARQLQuery(None)
+        query.make_triple("restriction", OWL.SOMEVALUESFROM, "filler")
+        query.make_triple("cls", RDFS.SUBCLASSOF, "restriction")
+        query.set_selections(["cls"])
+
+        self.assertEqual([URI(EX + "C")], [binding_set.getValue("cls") for binding_set in
+                                           query.run(self.store, bindings={"filler": URI(EX + "D")})])
+        self.assertEqual([URI(EX + "F")], [binding_set.getValue("cls") for binding_set in
+                                           query.run(self.store, bindings={"filler": URI(EX + "G")})])
+
+    def test_cached_results(self):
+        def run(interface):
+            query = KaBOBSPARQLQuery(interface)
+            query.make_triple("restriction", OWL.SOMEVALUESFROM, "filler")
+            query.make_triple("cls", RDFS.SUBCLASSOF, "restriction")
+            query.make_triple("cls", RDFS.LABEL, "label")
+            query.set_selections(["cls", "label"])
+            return [(binding_set.getValue("cls"), binding_set.getValue("label"))
+                    for binding_set in query.run(bindings={"filler": URI(EX + "D")})]
+
+        expected = [(URI(EX + "C"), Literal("what? C"))]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with Interface(None, store=self.store, cache_dir=cache_dir) as interface:
+                self.assertEqual(expected, run(interface))
+
+            # The results come from the cache, not the empty store
+            with Interface(None, store=LocalTripleStore(release="test"), cache_dir=cache_dir) as interface:
+                self.assertEqual(expected, run(interface))
+
+            # Results for one release aren't used for another, or for a store whose release is unknown
+            for release in ("other", None):
+                with Interface(None, store=LocalTripleStore(release=release), cache_dir=cache_dir) as interface:
+                    self.assertEqual([], run(interface))
+
+    def test_stream(self):
+        query = KaBOBSPARQLQuery(None)
+        query.make_triple("cls", RDFS.LABEL, "label")
+        query.set_selections(["cls", "label"])
+        expected = [(binding_set.getValue("cls"), binding_set.getValue("label")) for binding_set in query.run(self.store)]
+
+        result = query.run(self.store, stream=True)
+        self.assertNotIsInstance(result, list)
+        self.assertEqual(expected, [(binding_set.getValue("cls"), binding_set.getValue("label"))
+                                    for binding_set in result])
+
+        query.set_limit(1, offset=1)
+        self.assertIn("} ORDER BY ?cls ?label LIMIT 1 OFFSET 1", query.make_query_string())
+        self.assertEqual(expected[1:2], [(binding_set.getValue("cls"), binding_set.getValue("label"))
+                                         for binding_set in query.run(self.store, stream=True)])
@@ -1,5 +1,11 @@
+import gzip
+import os
+import pickle
+import tempfile
 from unittest import TestCase
 
+import networkx as nx
+
 from MOPs import MOPs
 
 
@@ -43,3 +49,105 @@ class TestMOPsManager(TestCase):
         manager.add_frame("thing")
 
         manager.draw_mops("E:/Documents/Test")
+
+    def test_is_abstraction(self):
+        manager = MOPs()
+        for frame in ["thing", "animate-thing", "person", "male-person", "dog"]:
+            manager.add_frame(frame)
+        manager.add_abstraction("person", "animate-thing")
+        manager.add_abstraction("male-person", "person")
+        manager.add_abstraction("dog", "animate-thing")
+
+        # Joining an existing subtree to a new root updates every frame below it
+        manager.add_abstraction("animate-thing", "thing")
+
+        self.assertTrue(manager.is_abstraction("thing", "male-person"))
+        self.assertTrue(manager.is_abstraction("animate-thing", "dog"))
+        self.assertTrue(manager.is_abstraction("person", "person"))
+        self.assertFalse(manager.is_abstraction("male-person", "thing"))
+        self.assertFalse(manager.is_abstraction("person", "dog"))
+
+        # Cycles are rejected
+        manager.add_abstraction("thing", "male-person")
+        self.assertFalse(manager.abstractions.has_edge("thing", "male-person"))
+
+    def test_is_abstraction_after_unpickling(self):
+        manager = MOPs()
+        for frame in ["thing", "animate-thing", "person"]:
+            manager.add_frame(frame)
+        manager.add_abstraction("person", "animate-thing")
+        manager.add_abstraction("animate-thing", "thing")
+
+        # MOPs pickled before the reachability index existed rebuild it when loaded
+        state = dict(manager.__dict__)
+        del state["reachability"]
+        old_manager = MOPs.__new__(MOPs)
+        old_manager.__setstate__(state)
+        self.assertTrue(old_manager.is_abstraction("thing", "person"))
+
+        loaded_manager = pickle.loads(pickle.dumps(manager))
+        self.assertTrue(loaded_manager.is_abstraction("thing", "person"))
+        self.assertFalse(loaded_manager.is_abstraction("person", "thing"))
+
+    @staticmethod
+    def make_pathway_mops():
+        manager = MOPs()
+        for frame, abstraction in [("pathway", None), ("apoptosis", "pathway"), ("protein", None),
+                                   ("p53", "protein"), ("p38", "protein"), ("cell", None), ("neuron", "cell")]:
+            manager.add_frame(frame, label=frame.upper())
+            if abstraction:
+                manager.add_abstraction(frame, abstraction)
+        manager.add_slot("apoptosis", "has_participant", "has participant", "p53")
+        manager.add_slot("apoptosis", "occurs_in", "occurs in", "neuron")
+        manager.add_slot("p53", "regulates", "regulates <&>", "p38")
+        manager.add_slot("apoptosis", "steps", "steps", ["p53", "p38"])
+        return manager
+
+    def test_export_graph(self):
+        manager = self.make_pathway_mops()
+        list_node = "apoptosis steps - list"
+
+        with tempfile.TemporaryDirectory() as directory:
+            manager.export_graph(os.path.join(directory, "mops.graphml"))
+            graph = nx.read_graphml(os.path.join(directory, "mops.graphml"))
+            self.assertEqual(8, graph.number_of_nodes())
+            self.assertEqual(8, graph.number_of_edges())
+            self.assertEqual("P53", graph.nodes["p53"]["label"])
+            self.assertEqual("['p53', 'p38']", graph.nodes[list_node]["list"])
+            self.assertEqual({"type": "slot", "role": "regulates", "label": "regulates <&>"},
+                             graph.edges["p53", "p38"])
+            self.assertEqual({"type": "abstraction"}, graph.edges["p53", "protein"])
+
+            manager.export_graph(os.path.join(directory, "mops.gexf"))
+            graph = nx.read_gexf(os.path.join(directory, "mops.gexf"))
+            self.assertEqual(8, graph.number_of_nodes())
+            self.assertEqual(8, graph.number_of_edges())
+            self.assertEqual("NEURON", graph.nodes["neuron"]["label"])
+            self.assertEqual("occurs in", graph.edges["apoptosis", "neuron"]["label"])
+
+            manager.export_graph(os.path.join(directory, "mops.tsv.gz"))
+            with gzip.open(os.path.join(directory, "mops.tsv.gz"), "rt") as f:
+                lines = f.read().splitlines()
+            self.assertEqual(8, len(lines))
+            self.assertIn("apoptosis\tpathway\tabstraction\t\t", lines)
+            self.assertIn("apoptosis\t%s\tslot\tsteps\tsteps" % list_node, lines)
+
+            self.assertRaises(ValueError, manager.export_graph, os.path.join(directory, "mops.png"))
+
+    def test_get_ego_graph(self):
+        manager = self.make_pathway_mops()
+
+        ego_graph = manager.get_ego_graph("p53")
+        self.assertEqual({"p53", "protein", "apoptosis", "p38"}, set(ego_graph))
+        self.assertTrue(ego_graph.has_edge("p53", "p38", "regulates"))
+        self.assertTrue(ego_graph.has_edge("p38", "protein"))
+        self.assertEqual("P53", ego_graph.nodes["p53"]["label"])
+
+        self.assertEqual({"p53", "protein", "apoptosis", "p38", "pathway", "neuron", "apoptosis steps - list"},
+                         set(manager.get_ego_graph("p53", radius=2)))
+        self.assertEqual({"cell"}, set(manager.get_ego_graph("cell", radius=0)))
+        self.assertRaises(ValueError, manager.get_ego_graph, "p63")
+
+        with tempfile.TemporaryDirectory() as directory:
+            manager.draw_mops(directory, center="p53")
+            self.assertTrue(os.path.exists(os.path.join(directory, "slot_graph.png")))
@@ -0,0 +1,69 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import networkx as nx
+from franz.openrdf.model import Literal, URI
+from franz.openrdf.vocabulary import RDFS, OWL
+
+from AllegroGraphRepositoryInterface import Interface
+from Mopify_Bio_World import merge_shards
+from TripleStore import LocalTripleStore
+
+EX = "http://example.org/"
+
+
+class TestMergeShards(TestCase):
+    def setUp(self):
+        self.store = LocalTripleStore()
+        part_of = URI(EX + "part_of")
+        self.store.add(part_of, RDFS.LABEL, Literal("part of"))
+        for i in range(40):
+            self.store.add(URI(EX + "class_%d" % i), RDFS.LABEL, Literal("class %d" % i))
+            for parent in (i // 2, i // 3):
+                if parent != i:
+                    self.store.add(URI(EX + "class_%d" % i), RDFS.SUBCLASSOF, URI(EX + "class_%d" % parent))
+            if i > 20:
+                self.store.add(URI(EX + "class_%d" % i), part_of, URI(EX + "class_%d" % (i - 20)))
+        self.nodes = [URI(EX + "class_%d" % i) for i in range(39, 19, -1)]
+
+    def mopify_shards(self, directory, shards):
+        shard_dirs = []
+        for shard in range(shards):
+            shard_dir = os.path.join(directory, "shard_%d" % shard)
+            os.makedirs(shard_dir)
+            with Interface(None, store=self.store, cache_dir=shard_dir) as interface:
+                interface.mopify_and_cache(self.nodes[shard::shards])
+            shard_dirs.append(shard_dir)
+        return shard_dirs
+
+    def test_merge_shards(self):
+        with Interface(None, store=self.store) as serial:
+            for node in self.nodes:
+                serial.mopify(node)
+
+        with tempfile.TemporaryDirectory() as directory:
+            mops, _ = merge_shards(directory, self.mopify_shards(directory, 3))
+            with Interface(None, store=LocalTripleStore(), cache_dir=directory) as cached:
+                cached_mops = cached.mops
+
+        for graph in ("abstractions", "slots"):
+            self.assertTrue(nx.utils.graphs_equal(getattr(serial.mops, graph), getattr(mops, graph)))
+            self.assertTrue(nx.utils.graphs_equal(getattr(mops, graph), getattr(cached_mops, graph)))
+
+    def test_merge_equivalent_frames(self):
+        # Each shard only sees one side of the equivalence, so they mopify it under different representatives
+        self.store.add(URI(EX + "class_39"), OWL.EQUIVALENTCLASS, URI(EX + "alias"))
+        self.store.add(URI(EX + "alias"), RDFS.LABEL, Literal("alias"))
+        self.store.add(URI(EX + "class_38"), RDFS.SUBCLASSOF, URI(EX + "alias"))
+        self.nodes = [URI(EX + "class_39"), URI(EX + "class_38")]
+
+        with tempfile.TemporaryDirectory() as directory:
+            shard_dirs = self.mopify_shards(directory, 2)
+            mops, equivalent_classes = merge_shards(directory, shard_dirs)
+            merged_again, _ = merge_shards(directory, shard_dirs)
+
+        self.assertEqual(URI(EX + "class_39"), equivalent_classes.canonical(URI(EX + "alias")))
+        self.assertNotIn(URI(EX + "alias"), mops)
+        self.assertTrue(mops.is_abstraction(URI(EX + "class_39"), URI(EX + "class_38")))
+        self.assertTrue(nx.utils.graphs_equal(mops.abstractions, merged_again.abstractions))
@@ -0,0 +1,96 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from franz.openrdf.model import Literal, Statement, URI
+from franz.openrdf.vocabulary import RDFS
+
+from StatementCache import SQLiteStatementCache, LRUStatementCache
+
+
+class TestSQLiteStatementCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "statements.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_persistence(self):
+        a, b = URI("http://example.org/A"), URI("http://example.org/B")
+        statements = [Statement(a, RDFS.SUBCLASSOF, b),
+                      Statement(a, RDFS.LABEL, Literal("a \"quoted\" label", language="en"))]
+
+        cache = SQLiteStatementCache(self.path, commit_every=1)
+        self.assertTrue(cache.is_empty())
+        cache[a] = statements
+        cache[b] = []
+        cache.close()
+
+        cache = SQLiteStatementCache(self.path)
+        self.assertEqual(2, len(cache))
+        self.assertIn(b, cache)
+        self.assertEqual([], cache[b])
+        self.assertEqual(statements, cache.get(a))
+        self.assertEqual("a \"quoted\" label", cache.get(a)[1].getObject().getLabel())
+        self.assertIsNone(cache.get(URI("http://example.org/C")))
+        cache.close()
+
+
+class TestLRUStatementCache(TestCase):
+    a, b, c = URI("http://example.org/A"), URI("http://example.org/B"), URI("http://example.org/C")
+
+    def test_patterns(self):
+        cache = LRUStatementCache()
+        statements = [Statement(self.a, RDFS.SUBCLASSOF, self.b), Statement(self.a, RDFS.LABEL, Literal("a"))]
+
+        self.assertIsNone(cache.get(o=self.b, p=RDFS.SUBCLASSOF))
+        cache.put(None, RDFS.SUBCLASSOF, self.b, statements[:1])
+        cache.put(self.a, None, None, statements)
+
+        self.assertEqual(statements[:1], cache.get(p=RDFS.SUBCLASSOF, o=self.b))
+        self.assertEqual(statements[1:], cache.get(self.a, RDFS.LABEL))
+        self.assertEqual([], cache.get(self.a, RDFS.COMMENT))
+        self.assertIsNone(cache.get(self.b, RDFS.LABEL))
+        self.assertEqual(3, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+    def test_eviction(self):
+        cache = LRUStatementCache(max_entries=2, max_statements=3)
+        cache.put(self.a, None, None, [Statement(self.a, RDFS.LABEL, Literal("a"))])
+        cache.put(self.b, None, None, [Statement(self.b, RDFS.LABEL, Literal("b"))])
+        cache.get(self.a)
+        cache.put(self.c, None, None, [Statement(self.c, RDFS.LABEL, Literal("c"))])
+
+        self.assertIn(self.a, cache)
+        self.assertNotIn(self.b, cache)
+
+        cache.put(self.b, None, None, [Statement(self.b, RDFS.LABEL, Literal(label)) for label in "bb"])
+        self.assertEqual(["b", "c"], [key for key in "abc" if URI("http://example.org/" + key.upper()) in cache])
+        self.assertEqual(2, cache.get_statistics()["evictions"])
+
+    def test_backing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backing = SQLiteStatementCache(os.path.join(directory, "statements.sqlite"))
+            backing[self.a] = [Statement(self.a, RDFS.LABEL, Literal("a"))]
+            cache = LRUStatementCache(backing=backing)
+
+            self.assertEqual("a", cache.get(self.a, RDFS.LABEL)[0].getObject().getLabel())
+            self.assertEqual(1, len(cache.get(self.a)))
+            self.assertEqual((1, 1, 0), (cache.backing_hits, cache.hits, cache.misses))
+            cache.close()
+
+    def test_backing_too_large(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backing = SQLiteStatementCache(os.path.join(directory, "statements.sqlite"))
+            backing[self.a] = [Statement(self.a, predicate, Literal(label))
+                               for predicate, label in ((RDFS.LABEL, "a"), (RDFS.COMMENT, "b"), (RDFS.COMMENT, "c"))]
+            cache = LRUStatementCache(max_statements=2, backing=backing)
+
+            # Answered from the backing cache every time without being kept in memory
+            self.assertEqual(["b", "c"], sorted(statement.getObject().getLabel()
+                                                for statement in cache.get(self.a, RDFS.COMMENT)))
+            self.assertEqual(3, len(cache.get(self.a)))
+            self.assertEqual((0, 0, 2, 0), (cache.backing_hits, cache.hits, cache.bypasses, cache.misses))
+            self.assertEqual(0, cache.get_statistics()["entries"])
+            cache.close()
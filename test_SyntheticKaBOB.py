@@ -0,0 +1,54 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from franz.openrdf.vocabulary import OWL, RDF, RDFS
+
+from Benchmarks import benchmark_kabob
+from KaBOBInterface import KaBOBInterface
+from SyntheticKaBOB import SyntheticKaBOB
+from TripleStore import LocalTripleStore
+
+
+class TestSyntheticKaBOB(TestCase):
+    def setUp(self):
+        self.kabob = SyntheticKaBOB(classes=100, proteins=20, drugs=5, equivalent_fraction=0.2, list_fraction=0.2)
+
+    def test_generate(self):
+        statements = list(self.kabob.generate())
+        self.assertEqual(statements, list(self.kabob.generate()))
+        self.assertNotEqual(statements, list(SyntheticKaBOB(classes=100, proteins=20, drugs=5, seed=1).generate()))
+
+        store = self.kabob.to_store()
+        self.assertEqual(len(statements), store.size)
+        self.assertTrue(store.get_statements(p=OWL.EQUIVALENTCLASS))
+        self.assertTrue(store.get_statements(p=RDF.TYPE, o=RDF.LIST))
+        self.assertLessEqual(100, len(store.get_restrictions()))
+        for cls in self.kabob.get_classes()[1:]:
+            self.assertTrue(store.get_statements(s=cls, p=RDFS.SUBCLASSOF))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kabob.nt.gz")
+            self.kabob.write(path)
+            self.assertEqual(store.size, LocalTripleStore(path).size)
+
+    def test_kabob_interface(self):
+        with KaBOBInterface(None, store=self.kabob.to_store()) as kabob:
+            self.assertEqual(self.kabob.get_class(3), kabob.get_bio_node("ice:CLASS_3"))
+            self.assertEqual(self.kabob.get_drug(2), kabob.get_drugbank_drug(self.kabob.get_drugbank_id(2)))
+
+            targets = kabob.get_drug_targets(self.kabob.get_drugbank_id(0))
+            self.assertTrue(targets)
+            self.assertEqual(set(targets), set(kabob.get_all_drug_targets().get_row(self.kabob.get_drug(0))))
+
+            for cls in self.kabob.get_classes():
+                kabob.mopify(cls)
+                self.assertIn(cls, kabob.mops)
+
+    def test_benchmark(self):
+        timings = benchmark_kabob(self.kabob, number_of_nodes=20, number_of_walks=5)
+
+        self.assertEqual(["generate", "add_abstraction", "mopify", "get_drug_targets", "get_all_drug_targets",
+                          "Collapser", "Walker.walk"], list(timings))
+        self.assertEqual(20, timings["mopify"][0])
+        self.assertEqual(5, timings["get_drug_targets"][0])
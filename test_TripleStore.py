@@ -0,0 +1,133 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import networkx as nx
+from franz.openrdf.model import Literal, URI
+from franz.openrdf.vocabulary import RDF, RDFS, OWL, XMLSchema
+
+from AllegroGraphRepositoryInterface import Interface
+from KaBOB_SPARQL_QUERY import KaBOBSPARQLQuery
+from TripleStore import AllegroGraphStore, LocalTripleStore, TripleStore
+from Walker import Automata
+
+EX = "http://example.org/"
+
+TRIPLES = """
+<http://example.org/A> <http://www.w3.org/2000/01/rdf-schema#label> "thing a" .
+<http://example.org/B> <http://www.w3.org/2000/01/rdf-schema#label> "thing b" .
+<http://example.org/B> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <http://example.org/A> .
+<http://example.org/C> <http://www.w3.org/2000/01/rdf-schema#label> "thing c"@en <http://example.org/graph> .
+<http://example.org/C> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <http://example.org/B> .
+<http://example.org/C> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <http://example.org/R1> .
+<http://example.org/R1> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2002/07/owl#Restriction> .
+<http://example.org/R1> <http://www.w3.org/2002/07/owl#onProperty> <http://example.org/part_of> .
+<http://example.org/R1> <http://www.w3.org/2002/07/owl#someValuesFrom> <http://example.org/D> .
+<http://example.org/part_of> <http://www.w3.org/2000/01/rdf-schema#label> "part of" .
+<http://example.org/D> <http://www.w3.org/2000/01/rdf-schema#label> "thing \\"d\\"" .
+<http://example.org/D> <http://www.w3.org/2000/01/rdf-schema#subClassOf> <http://example.org/A> .
+<http://example.org/E> <http://www.w3.org/2002/07/owl#equivalentClass> <http://example.org/D> .
+"""
+
+
+class TestLocalTripleStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.directory.name, "kabob.nq")
+        with open(self.file, "w") as f:
+            f.write(TRIPLES)
+        self.store = LocalTripleStore(self.file, release="test")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_statements(self):
+        a, b, c = URI(EX + "A"), URI(EX + "B"), URI(EX + "C")
+
+        self.assertEqual(13, self.store.size)
+        self.assertEqual(3, len(self.store.get_statements(s=c)))
+        self.assertEqual([b], [st.getObject() for st in self.store.get_statements(s=c, p=RDFS.SUBCLASSOF, o=b)])
+        self.assertEqual({b, URI(EX + "D")}, {st.getSubject() for st in self.store.get_statements(p=RDFS.SUBCLASSOF,
+                                                                                                    o=a)})
+        self.assertEqual(2, len(self.store.get_statements(o=a)))
+        self.assertEqual(1, len(self.store.get_statements(s=c, o=b)))
+        self.assertEqual("thing \"d\"", self.store.get_statements(s=URI(EX + "D"), p=RDFS.LABEL)[0].getObject().getLabel())
+        self.assertEqual(13, len(self.store.get_statements()))
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            TripleStore()
+
+    def test_evaluate_query(self):
+        query = KaBOBSPARQLQuery(None)
+        query.make_triple("restriction", RDF.TYPE, OWL.RESTRICTION)
+        query.make_triple("restriction", OWL.SOMEVALUESFROM, "filler")
+        query.make_triple("cls", RDFS.SUBCLASSOF, "restriction")
+        query.make_triple("cls", RDFS.SUBCLASSOF, "parent")
+        query.add_filter("parent", "!=", "restriction")
+        query.set_selections(["cls", "filler", "parent"])
+
+        result = query.run(self.store)
+
+        self.assertEqual([(URI(EX + "C"), URI(EX + "D"), URI(EX + "B"))],
+                         [tuple(binding_set.getValue(selection) for selection in query.selections)
+                          for binding_set in result])
+
+    def test_evaluate_path(self):
+        automaton = Automata(None, [RDFS.SUBCLASSOF], [])
+        automaton.add_transition(RDFS.SUBCLASSOF, RDFS.SUBCLASSOF)
+        query = KaBOBSPARQLQuery(None)
+        query.make_path("cls", automaton, URI(EX + "A"))
+        query.set_selections(["cls"])
+
+        self.assertEqual({URI(EX + "B"), URI(EX + "C"), URI(EX + "D")},
+                         {binding_set.getValue("cls") for binding_set in query.run(self.store)})
+
+    def test_parse_tsv(self):
+        text = ('?cls\t?label\t?count\t?weight\t?score\t?deprecated\n'
+                '<%sC>\t"line\\tone\\nline two"@en\t3\t-0.5\t1.0e3\ttrue\n'
+                '<%sD>\t"\\"quoted\\""\t\t.5\t\tfalse\n' % (EX, EX))
+
+        result = AllegroGraphStore.parse_tsv(text)
+        self.assertEqual({"cls": URI(EX + "C"), "label": Literal("line\tone\nline two", language="en"),
+                          "count": Literal("3", datatype=XMLSchema.INTEGER),
+                          "weight": Literal("-0.5", datatype=XMLSchema.DECIMAL),
+                          "score": Literal("1.0e3", datatype=XMLSchema.DOUBLE),
+                          "deprecated": Literal("true", datatype=XMLSchema.BOOLEAN)}, result[0])
+        self.assertEqual({"cls": URI(EX + "D"), "label": Literal('"quoted"'), "count": None,
+                          "weight": Literal(".5", datatype=XMLSchema.DECIMAL), "score": None,
+                          "deprecated": Literal("false", datatype=XMLSchema.BOOLEAN)}, result[1])
+        self.assertEqual(2, len(result))
+
+    def test_restriction_index(self):
+        restriction = URI(EX + "R1")
+        self.assertEqual({restriction: (URI(EX + "part_of"), URI(EX + "D"))}, self.store.get_restrictions())
+
+        with Interface(None, store=self.store, cache_dir=self.directory.name) as interface:
+            interface.load_restriction_index()
+            self.assertEqual((True, URI(EX + "part_of"), URI(EX + "D")), interface.check_restriction(restriction))
+            self.assertEqual((False, None, None), interface.check_restriction(URI(EX + "C")))
+            self.assertEqual(0, interface.cached_statements.misses)
+
+        with Interface(None, store=LocalTripleStore(release="test"), cache_dir=self.directory.name) as interface:
+            self.assertIn(restriction, interface.restrictions)
+        # Restrictions collected from another release are ignored
+        with Interface(None, store=LocalTripleStore(release="other"), cache_dir=self.directory.name) as interface:
+            self.assertEqual({}, interface.restrictions)
+
+            # An index collected elsewhere, as by the coordinator of a sharded run, is used as is
+            interface.load_restriction_index(self.store.get_restrictions())
+            self.assertEqual((True, URI(EX + "part_of"), URI(EX + "D")), interface.check_restriction(restriction))
+
+    def test_mopify_batched(self):
+        nodes = [URI(EX + "C"), URI(EX + "E")]
+        with Interface(None, store=LocalTripleStore(self.file)) as recursive:
+            recursive_result = [recursive.mopify(node) for node in nodes]
+        with Interface(None, store=self.store) as batched:
+            batched_result = batched.mopify_batched(nodes)
+
+        self.assertEqual(recursive_result, batched_result)
+        for graph in ("abstractions", "slots"):
+            expected, actual = getattr(recursive.mops, graph), getattr(batched.mops, graph)
+            self.assertTrue(nx.utils.graphs_equal(expected, actual))
+        self.assertEqual(recursive.equivalent_classes, batched.equivalent_classes)
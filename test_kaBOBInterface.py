@@ -1,6 +1,54 @@
+import os
+import tempfile
+from itertools import islice
 from unittest import TestCase
 
+from franz.openrdf.model import URI
+from franz.openrdf.vocabulary import OWL, RDF, RDFS
+
 from KaBOBInterface import KaBOBInterface
+from KaBOB_SPARQL_QUERY import KaBOBSPARQLQuery
+from TripleStore import LocalTripleStore
+from Walker import Automata
+
+EX = "http://example.org/"
+BIO = "http://ccp.ucdenver.edu/kabob/bio/"
+ICE = "http://ccp.ucdenver.edu/kabob/ice/"
+OBO = "http://purl.obolibrary.org/obo/"
+DRUGBANK_IDENTIFIER = URI("http://ccp.ucdenver.edu/obo/ext/IAO_EXT_0001309")
+DENOTES = URI(OBO + "IAO_0000219")
+
+
+def make_drug_store(release: str = None) -> LocalTripleStore:
+    """
+    :return: Drugs drug_1 binding protein_1 and protein_2, drug_2 binding protein_2 and drug_3 binding nothing
+    """
+    store = LocalTripleStore(release=release)
+    for name in ("GO_0005488", "RO_0000057", "RO_0000052"):
+        store.add(URI(ICE + name), DENOTES, URI(OBO + name))
+        store.add(URI(ICE + name), DENOTES, URI(BIO + name))
+
+    def restriction(svf, op, cls):
+        node = URI(EX + "restriction_%d" % len(store.get_statements(p=RDF.TYPE, o=OWL.RESTRICTION)))
+        store.add(node, RDF.TYPE, OWL.RESTRICTION)
+        store.add(node, OWL.ONPROPERTY, URI(BIO + op))
+        store.add(node, OWL.SOMEVALUESFROM, svf)
+        store.add(cls, RDFS.SUBCLASSOF, node)
+
+    for drug, targets in (("1", ["1", "2"]), ("2", ["2"]), ("3", [])):
+        drug_node, drug_sc = URI(BIO + "drug_" + drug), URI(EX + "drug_sc_" + drug)
+        store.add(URI(ICE + "DRUGBANK_DB" + drug), RDFS.SUBCLASSOF, DRUGBANK_IDENTIFIER)
+        store.add(URI(ICE + "DRUGBANK_DB" + drug), DENOTES, drug_node)
+        store.add(drug_sc, RDFS.SUBCLASSOF, drug_node)
+        restriction(drug_sc, "RO_0000052", URI(EX + "inheres_" + drug))
+        for target in targets:
+            interaction, target_sc = URI(EX + "interaction_%s_%s" % (drug, target)), URI(EX + "target_sc_" + target)
+            store.add(interaction, RDFS.SUBCLASSOF, URI(BIO + "GO_0005488"))
+            restriction(drug_sc, "RO_0000057", interaction)
+            restriction(target_sc, "RO_0000057", interaction)
+    for target in ("1", "2"):
+        store.add(URI(EX + "target_sc_" + target), RDFS.SUBCLASSOF, URI(BIO + "protein_" + target))
+    return store
 
 
 class TestKaBOBInterface(TestCase):
@@ -20,3 +68,113 @@ class TestKaBOBInterface(TestCase):
             bio_p53 = kabob.get_bio_node(p53)
 
             kabob.mopify(bio_p53)
+
+    def test_get_path_ends(self):
+        targets, participates_in = URI(EX + "targets"), URI(EX + "participates_in")
+        store = LocalTripleStore()
+        store.add(URI(BIO + "drug"), targets, URI(BIO + "protein"))
+        store.add(URI(BIO + "protein"), participates_in, URI(BIO + "pathway"))
+        store.add(URI(BIO + "protein"), targets, URI(BIO + "other"))
+        store.add(URI(BIO + "pathway"), participates_in, URI(BIO + "process"))
+        automaton = Automata(None, [targets, participates_in], [])
+        automaton.add_transition(targets, participates_in)
+        expected = {URI(BIO + "protein"), URI(BIO + "pathway")}
+
+        for compact_mops in (False, True):
+            with KaBOBInterface(None, store=store, compact_mops=compact_mops) as kabob:
+                # Evaluated by the store before the source is mopified, and over the mops after
+                for evaluate_locally in (False, None):
+                    self.assertEqual(expected, kabob.get_path_ends(URI(BIO + "drug"), automaton,
+                                                                   evaluate_locally=evaluate_locally))
+                    self.assertEqual({URI(BIO + "pathway")}, kabob.get_path_ends(
+                        URI(BIO + "drug"), automaton, targets=[URI(BIO + "pathway")], evaluate_locally=evaluate_locally))
+                    kabob.mopify(URI(BIO + "drug"))
+
+            query = KaBOBSPARQLQuery(kabob)
+            query.make_path(URI(BIO + "drug"), automaton, "end")
+            query.set_selections(["end"])
+            self.assertIn("<%s> <%s>|<%s>/<%s>? ?end" % (BIO + "drug", EX + "participates_in", EX + "targets",
+                                                          EX + "participates_in"),
+                          query.make_query_string())
+
+    def test_get_drug_targets(self):
+        drugs = [URI(BIO + "drug_%d" % i) for i in range(1, 4)]
+        proteins = [URI(BIO + "protein_%d" % i) for i in range(1, 3)]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with KaBOBInterface(None, store=make_drug_store("test"), cache_dir=cache_dir) as kabob:
+                self.assertEqual(proteins, sorted(kabob.get_drug_targets("DB1"), key=str))
+                self.assertEqual([], kabob.get_drug_targets("DB3"))
+                self.assertEqual([], kabob.get_drug_targets("DB4"))
+
+                drug_targets = kabob.get_all_drug_targets(drugs[1:])
+                self.assertEqual({drugs[1]: {proteins[1]}, drugs[2]: set()}, drug_targets.to_dict())
+
+                drug_targets = kabob.get_all_drug_targets()
+                self.assertEqual((2, 2), drug_targets.shape)
+                self.assertEqual(3, len(drug_targets))
+                self.assertEqual(drugs[:2], sorted(drug_targets.get_column(proteins[1]), key=str))
+                self.assertIn((drugs[0], proteins[0]), drug_targets)
+                self.assertNotIn((drugs[1], proteins[0]), drug_targets)
+                self.assertTrue(os.path.exists(os.path.join(cache_dir, "drug_targets.pickle")))
+
+            with KaBOBInterface(None, store=LocalTripleStore(release="test"), cache_dir=cache_dir) as kabob:
+                self.assertEqual(drug_targets, kabob.get_all_drug_targets())
+
+            # Targets cached for another release are read again
+            with KaBOBInterface(None, store=LocalTripleStore(release="other"), cache_dir=cache_dir) as kabob:
+                self.assertEqual({}, kabob.get_all_drug_targets().to_dict())
+
+    def test_iterate_bio_world(self):
+        nodes = [URI(BIO + "class_%d" % i) for i in range(10)]
+
+        def make_store(release, replaced=0):
+            store = LocalTripleStore(release=release)
+            for i, node in enumerate(nodes):
+                store.add(URI(ICE + "CLASS_%d" % i), DENOTES, URI(BIO + "other_%d" % i) if i < replaced else node)
+            store.statement_page_size = 3
+            return store
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with KaBOBInterface(None, store=make_store("test"), cache_dir=cache_dir) as kabob:
+                self.assertEqual(nodes[:4], list(islice(kabob.iterate_bio_world(), 4)))
+
+            # The nodes read before the stream was dropped come from the cache and the rest from the store
+            with KaBOBInterface(None, store=make_store("test", replaced=4), cache_dir=cache_dir) as kabob:
+                self.assertEqual(nodes, list(kabob.iterate_bio_world()))
+
+            with KaBOBInterface(None, store=LocalTripleStore(release="test"), cache_dir=cache_dir) as kabob:
+                self.assertEqual(nodes, kabob.get_bio_world())
+
+            # Nodes cached for another release are read again
+            with KaBOBInterface(None, store=make_store("other", replaced=4), cache_dir=cache_dir) as kabob:
+                self.assertEqual([URI(BIO + "other_%d" % i) for i in range(4)] + nodes[4:], kabob.get_bio_world())
+
+    def test_get_bio_nodes(self):
+        names = ["GO_0005488", URI(OBO + "RO_0000057"), "ice:DRUGBANK_DB1", URI(ICE + "DRUGBANK_DB4"), "GO_0000000"]
+        expected = {"GO_0005488": URI(BIO + "GO_0005488"), URI(OBO + "RO_0000057"): URI(BIO + "RO_0000057"),
+                    "ice:DRUGBANK_DB1": URI(BIO + "drug_1"), URI(ICE + "DRUGBANK_DB4"): None, "GO_0000000": None}
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with KaBOBInterface(None, store=make_drug_store("test"), cache_dir=cache_dir) as kabob:
+                self.assertEqual(expected, kabob.get_bio_nodes(names))
+                self.assertEqual(URI(BIO + "drug_2"), kabob.get_drugbank_drug("DB2"))
+                self.assertEqual([URI(BIO + "drug_%d" % i) for i in range(1, 4)], sorted(kabob.get_all_drugs(), key=str))
+
+            # Resolved from the denotes index rather than the empty store
+            with KaBOBInterface(None, store=LocalTripleStore(release="test"), cache_dir=cache_dir) as kabob:
+                self.assertEqual(expected, kabob.get_bio_nodes(names))
+                self.assertEqual({URI(ICE + "GO_0005488")}, kabob.denotes.get_denoters(URI(BIO + "GO_0005488")))
+
+            # A non-ICE denoter found while resolving another node still has its own denoters looked up
+            store = make_drug_store()
+            store.add(URI(EX + "denoter"), DENOTES, URI(OBO + "GO_0005488"))
+            store.add(URI(ICE + "DENOTER"), DENOTES, URI(EX + "denoter"))
+            store.add(URI(ICE + "DENOTER"), DENOTES, URI(BIO + "denoter"))
+            with KaBOBInterface(None, store=store) as kabob:
+                self.assertEqual(URI(BIO + "GO_0005488"), kabob.get_bio_node("GO_0005488"))
+                self.assertEqual(URI(BIO + "denoter"), kabob.get_bio_node(URI(EX + "denoter")))
+
+            # The index is discarded for another release
+            with KaBOBInterface(None, store=LocalTripleStore(release="other"), cache_dir=cache_dir) as kabob:
+                self.assertEqual(dict.fromkeys(names), kabob.get_bio_nodes(names))
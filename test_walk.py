@@ -1,8 +1,13 @@
+import itertools
+import random
+import re
 from unittest import TestCase
 from Walker import *
 from networkx import MultiDiGraph
 from logging import Logger
 
+from MOPs import MOPs
+
 
 class TestWalk(TestCase):
     log = Logger("TestWalk")
@@ -19,3 +24,99 @@ class TestWalk(TestCase):
 
         walker = EdgeWalker(G, A, 'filler', ["e"])
         self.log.warning("Path: " + str(walker.walk("a")))
+        self.assertEqual(["a", "b", "d", "e"], walker.walk("a"))
+
+    def test_path_query(self):
+        # Any number of 1s followed by a 2. Starting from 1 means the first symbol has to follow 1 too
+        A = Automata(1, [1, 2], [])
+        A.add_transition(1, 1)
+        A.add_transition(1, 2)
+        G = MultiDiGraph()
+        G.add_edge("a", "b", filler=1)
+        G.add_edge("b", "c", filler=1)
+        G.add_edge("c", "a", filler=1)
+        G.add_edge("c", "e", filler=2)
+        G.add_edge("a", "d", filler=1)
+        G.add_edge("d", "c", filler=1)
+        G.add_edge("b", "e", filler=3)
+        G.add_edge("a", "f", filler=2)
+
+        query = PathQuery(G, A, edge_attribute="filler", targets=["e", "f"])
+
+        self.assertEqual(["a", "f"], query.shortest_path("a"))
+        self.assertEqual(["b", "c", "e"], query.shortest_path("b"))
+        self.assertEqual(["e"], query.shortest_path("e"))
+        self.assertIsNone(query.shortest_path("g"))
+        self.assertEqual({"e", "f"}, query.reachable("a"))
+        self.assertEqual({"f"}, query.reachable("a", max_length=2))
+        self.assertEqual([["a", "b", "c", "e"], ["a", "d", "c", "e"], ["a", "f"]],
+                         sorted(query.all_paths("a", 3)))
+        self.assertEqual([["a", "f"]], list(query.all_paths("a", 2)))
+        self.assertEqual([["b", "c", "e"], ["b", "c", "a", "f"]], sorted(query.all_paths("b", 10), key=len))
+
+    def test_path_query_over_nodes(self):
+        A = Automata(None, ["a", "b", "c"], ["c"])
+        A.add_transition("a", "b")
+        A.add_transition("b", "c")
+        G = MultiDiGraph()
+        G.add_edge("start", "a")
+        G.add_edge("a", "c")
+        G.add_edge("a", "b")
+        G.add_edge("b", "c")
+
+        self.assertEqual(["start", "a", "b", "c"], Walker(G, A).walk("start"))
+
+    def test_path_query_leaving_automaton(self):
+        A = Automata(None, ["a", "b"], [])
+        A.add_transition("a", "b")
+        G = MultiDiGraph()
+        G.add_edge("start", "x", label="other")
+        G.add_edge("x", "end", label="a")
+
+        query = PathQuery(G, A, edge_attribute="label", targets=["end"])
+
+        self.assertEqual({("start", None): 0, ("x", "other"): 1}, query.reachable_states("start"))
+        self.assertIsNone(query.shortest_path("start"))
+
+    def test_path_query_over_mops(self):
+        mops = MOPs()
+        for frame in ["drug", "protein", "pathway"]:
+            mops.add_frame(frame, label=frame)
+        mops.add_slot("drug", "targets", "targets", "protein")
+        mops.add_slot("protein", "participates_in", "participates in", "pathway")
+        A = Automata(None, ["targets", "participates in"], [])
+        A.add_transition("targets", "participates in")
+
+        query = PathQuery.for_mops(mops, A, targets=["pathway"])
+
+        self.assertEqual(["drug", "protein", "pathway"], query.shortest_path("drug"))
+
+    def test_to_property_path(self):
+        A = Automata(None, [1, 3, 2], [])
+        A.add_transition(1, 3)
+        A.add_transition(3, 2)
+
+        self.assertEqual("1|2|(3|1/3)/2?", A.to_property_path())
+
+    def test_to_property_path_language(self):
+        # The property path, read as a regular expression over single letter predicates, accepts the same sequences
+        symbols = "abcd"
+        generator = random.Random(0)
+        for _ in range(50):
+            start = generator.choice([None] + list(symbols))
+            A = Automata(start, symbols, [])
+            for u, v in itertools.product(symbols, repeat=2):
+                if generator.random() < 0.3:
+                    A.add_transition(u, v)
+
+            try:
+                pattern = re.compile(A.to_property_path().replace("/", ""))
+            except ValueError:
+                self.assertEqual([], list(A.successors(start)))
+                continue
+
+            for length in range(1, 6):
+                for sequence in itertools.product(symbols, repeat=length):
+                    accepted = (start is None or A.has_edge(start, sequence[0])) and \
+                               all(A.has_edge(u, v) for u, v in zip(sequence, sequence[1:]))
+                    self.assertEqual(accepted, pattern.fullmatch("".join(sequence)) is not None)